@@ -1,20 +1,83 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import json
+import os
+import secrets
+import time
 import httpx
-from app.core.task_manager import State, Task
-from app.core.downloader import download_video
+from typing import Optional
+from app.core.task_manager import AsyncState, Task, LIST_FIELDS
+from app.core.downloader import (
+    download_video, get_video_info, select_formats, allowed_external_downloaders, connections_per_download,
+    DOWNLOAD_OPTION_KEYS
+)
+from app.core.info_cache import info_cache, info_cache_key
+from app.core.task_cache import task_cache
+from app.core.host_limiter import host_limiter, limit_key
+from app.core.bandwidth import bandwidth
+from app.core.file_reuse import describe_files, final_files, materialize, needs_reuse
+from app.core.disk_space import disk_space, estimate_size
+from app.core.scheduler import DownloadScheduler, DownloadJob, QueueFullError, JobDeferred
+from app.core.worker_pool import ProcessDownloadPool
+from app.core.progress import progress_store, task_timings, TERMINAL_PHASES
+from app.core.profiling import NEXT_TASK, profile_path, profile_requests, run_profiled, summarize
+from app.core.warmup import warmup
 from app.config import settings
 from app.utils.logger import logger
+from app.utils.metrics import (
+    ACTIVE_DOWNLOADS, DOWNLOAD_SPEED, DOWNLOADED_BYTES, EXECUTOR_BUSY, EXECUTOR_SIZE, QUEUED_DOWNLOADS,
+    observe_phases
+)
 
 router = APIRouter()
 
-state = State()
+state = AsyncState()
 
 # 使用配置的线程池大小创建全局线程池
 executor = ThreadPoolExecutor(max_workers=settings.thread_pool_size)
+EXECUTOR_SIZE.set(settings.thread_pool_size)
+
+
+async def run_in_executor(func):
+    """在全局线程池中执行阻塞函数（统计正在执行的线程数）"""
+    def tracked():
+        EXECUTOR_BUSY.inc()
+        try:
+            return func()
+        finally:
+            EXECUTOR_BUSY.dec()
+
+    return await asyncio.get_event_loop().run_in_executor(executor, tracked)
+
+# 可选的多进程执行器（DOWNLOAD_EXECUTOR=process 时启用）
+process_pool = None
+
+
+def report_progress(task_id: str, data: dict) -> None:
+    """下载进度回调（在下载线程或进程池事件线程中调用）"""
+    progress_store.update(task_id, data)
+    # 任务仍在本进程中执行，缓存的状态不会过期
+    task_cache.touch(task_id)
+    if disk_space is not None:
+        # 已写入磁盘的字节不再重复预留
+        disk_space.progress(task_id, data)
+
+
+def on_worker_event(task_id: str, kind: str, data: dict):
+    """worker 进程事件回调"""
+    if kind == "progress":
+        report_progress(task_id, data)
+
+
+if settings.download_executor == "process":
+    process_pool = ProcessDownloadPool(
+        max_workers=settings.process_pool_size or os.cpu_count() or 1,
+        max_jobs_per_worker=settings.process_max_jobs_per_worker,
+        on_event=on_worker_event
+    )
 
 class BatchTaskQueryRequest(BaseModel):
     task_ids: list[str]
@@ -24,102 +87,437 @@ class DownloadRequest(BaseModel):
     output_path: str = settings.default_download_path
     format: str = "bestvideo+bestaudio/best"
     quiet: bool = False
+    priority: int = 0  # 数值越大越先执行
+    # 传输参数，未提供时使用全局配置；并发分片数会被限制在每个下载的连接数上限内
+    concurrent_fragments: Optional[int] = Field(None, ge=1)
+    http_chunk_size: Optional[int] = Field(None, ge=1024)
+    buffer_size: Optional[int] = Field(None, ge=1024)
+    external_downloader: Optional[str] = None  # native 或 ALLOWED_EXTERNAL_DOWNLOADERS 中的下载器
+
+    def download_options(self) -> Optional[dict]:
+        """请求中显式提供的传输参数"""
+        options = {key: getattr(self, key) for key in DOWNLOAD_OPTION_KEYS if getattr(self, key) is not None}
+        return options or None
 
 
 class BatchDownloadRequest(BaseModel):
     tasks: list[DownloadRequest]
 
 
-async def process_download_task(task_id: str, url: str, output_path: str, format: str, quiet: bool):
+class ProfileRequest(BaseModel):
+    task_id: str = NEXT_TASK  # 要分析的任务ID，默认分析下一个开始执行的任务
+
+
+class BandwidthUpdateRequest(BaseModel):
+    limit: Optional[float] = Field(None, ge=0)  # 总带宽预算（字节/秒），0 表示不限制
+    priority_weighting: Optional[bool] = None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """管理接口鉴权：校验请求头 X-Admin-Token，未配置 ADMIN_TOKEN 时管理接口不可用"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_TOKEN not configured)")
+    if not secrets.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def downloaded_size(result: Optional[dict]) -> Optional[int]:
+    """下载结果的字节数（合并音视频时为各格式之和，视频信息中没有大小时取最终文件的大小）"""
+    formats = (result or {}).get("requested_formats") or [result or {}]
+    size = sum(f.get("filesize") or f.get("filesize_approx") or 0 for f in formats)
+    if not size and result:
+        size = sum(os.path.getsize(path) for path in final_files(result))
+    return size or None
+
+
+async def process_download_task(
+    task_id: str,
+    url: str,
+    output_path: str,
+    format: str,
+    quiet: bool,
+    options: Optional[dict] = None,
+    priority: int = 0,
+    lease_owner: Optional[str] = None
+):
+    """
+    执行单个下载任务并写入结果
+
+    Args:
+        lease_owner: 分布式 worker 的ID，结束状态只在任务租约仍属于该 worker 时写入
+
+    以新的 output_path 重新打开的已完成任务先从已下载的文件生成副本，没有可用文件时才下载
+    """
     result = None
+    profile = None
+    started = time.monotonic()
+    key = await asyncio.to_thread(limit_key, url) if host_limiter is not None else None
     try:
+        if await reuse_task_files(task_id, output_path):
+            timings = task_timings(progress_store.pop_timeline(task_id), time.time())
+            await state.update_task(task_id, "completed", timings=timings, lease_owner=lease_owner)
+            progress_store.set_phase(task_id, "completed")
+            return
         logger.info("Starting download task", extra={
             "task_id": task_id,
             "url": url,
             "output_path": output_path,
             "format": format
         })
-
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            executor,
-            lambda: download_video(
+        progress_store.set_phase(task_id, "extracting")
+        if disk_space is not None:
+            # 准入控制需要先按下载的格式提取信息估算大小，下载时直接使用提取结果
+            info = await extract_download_info(task_id, url, format)
+            size = estimate_size(info)
+            if disk_space.exceeds_capacity(output_path, size):
+                raise RuntimeError(f"Estimated size {size} bytes exceeds the capacity of the volume")
+            if not disk_space.try_reserve(task_id, output_path, size):
+                raise JobDeferred("Not enough disk space", size=size)
+        else:
+            # 预览时已提取过信息则直接复用，跳过再次提取
+            info = info_cache.get(await info_cache_key(url))
+        if info is not None:
+            progress_store.mark(task_id, "extracted")
+
+        profile = profile_requests.take(task_id)
+        # 提取和准入通过后才参与带宽分配，被推迟或提取失败的任务不占用份额
+        bandwidth.register(task_id, priority)
+        if process_pool is not None:
+            result = await process_pool.run(
+                task_id,
                 url=url,
                 output_path=output_path,
                 format=format,
                 quiet=quiet,
+                info=info,
+                options=options,
+                rate_limit=bandwidth.share(task_id),
+                profile_path=profile,
             )
-        )
-        state.update_task(task_id, "completed", result=result)
+        else:
+            result = await run_in_executor(lambda: run_profiled(
+                profile,
+                lambda: download_video(
+                    url=url,
+                    output_path=output_path,
+                    format=format,
+                    quiet=quiet,
+                    progress_callback=lambda data: report_progress(task_id, data),
+                    info=info,
+                    options=options,
+                    throttle=lambda nbytes: bandwidth.consume(task_id, nbytes),
+                    rate_limit=bandwidth.share(task_id),
+                )
+            ))
+        if profile:
+            logger.info("Task profile saved", extra={"task_id": task_id, "path": profile})
+        timings = task_timings(progress_store.pop_timeline(task_id), time.time())
+        size = downloaded_size(result)
+        if host_limiter is not None:
+            host_limiter.observe(key, size=size, seconds=time.monotonic() - started)
+        extractor = (result or {}).get("extractor_key") or "unknown"
+        observe_phases(extractor, timings)
+        DOWNLOADED_BYTES.labels(extractor).inc(size or 0)
+        # 先记录文件再标记完成，完成后立即到达的复用请求能找到文件
+        await record_task_files(task_id, result)
+        await state.update_task(task_id, "completed", result=result, timings=timings, lease_owner=lease_owner)
+        progress_store.set_phase(task_id, "completed")
 
         logger.info("Download task completed successfully", extra={
             "task_id": task_id,
             "url": url
         })
+    except JobDeferred:
+        progress_store.set_phase(task_id, "queued")
+        raise
     except Exception as e:
-        state.update_task(task_id, "failed", result=result, error=str(e))
+        timings = task_timings(progress_store.pop_timeline(task_id), time.time())
+        if host_limiter is not None:
+            host_limiter.observe(key, error=str(e))
+        await state.update_task(
+            task_id, "failed", result=result, error=str(e), timings=timings, lease_owner=lease_owner
+        )
+        progress_store.set_phase(task_id, "failed", error=str(e))
         logger.error("Download task failed", extra={
             "task_id": task_id,
             "url": url,
             "error": str(e)
         })
+    finally:
+        if profile:
+            profile_requests.finish(task_id)
+        bandwidth.unregister(task_id)
+        if disk_space is not None:
+            disk_space.release(task_id)
+
+
+async def record_task_files(task_id: str, result: dict) -> None:
+    """记录下载完成的文件（大小、校验和），供其他 output_path 复用"""
+    if settings.file_reuse == "off" or not result:
+        return
+    try:
+        files = await asyncio.to_thread(describe_files, result)
+    except Exception as e:
+        logger.warning("Failed to checksum downloaded files", extra={"task_id": task_id, "error": str(e)})
+        return
+    await state.record_files(task_id, files)
+
+
+async def reuse_task_files(task_id: str, output_path: str) -> bool:
+    """
+    从任务已下载的文件在 output_path 生成副本（零网络流量，由调度器在下载之前执行）
+
+    同一文件系统上使用硬链接或 reflink，只有 FILE_REUSE=auto 时才跨文件系统复制；
+    源文件的大小和校验和与记录一致才复用，目标目录已有该文件时不做任何操作
+
+    Returns:
+        True 表示 output_path 下已有全部文件，False 表示没有可复用的文件（需要下载）
+    """
+    if settings.file_reuse == "off":
+        return False
+    files = await state.get_files(task_id)
+    if not files:
+        return False
+    placed = await asyncio.to_thread(materialize, files, output_path, settings.file_reuse)
+    if placed is None:
+        logger.warning("Downloaded files unavailable for reuse", extra={
+            "task_id": task_id,
+            "output_path": output_path
+        })
+        return False
+    if placed:
+        await state.record_files(task_id, placed)
+        logger.info("Reused downloaded files", extra={
+            "task_id": task_id,
+            "output_path": output_path,
+            "files": [file["path"] for file in placed],
+            "methods": sorted({file["method"] for file in placed})
+        })
+    return True
+
+
+async def reopen_for_reuse(task_id: str, output_path: str) -> bool:
+    """
+    已完成的视频以新的 output_path 请求时，把任务重新置为 pending 交给调度器生成副本
+
+    跨文件系统复制整个视频可能需要几分钟，不在请求处理中执行；
+    output_path 下已有全部文件（按记录判断）或任务已被其他请求重新打开时返回 False
+
+    Returns:
+        True 表示由本次调用重新打开，调用方负责调度
+    """
+    if settings.file_reuse == "off":
+        return False
+    files = await state.get_files(task_id)
+    if not files or not needs_reuse(files, output_path):
+        return False
+    return await state.reopen_task(task_id, output_path)
+
+
+async def run_download_job(job: DownloadJob):
+    """调度器回调：执行单个下载任务"""
+    await process_download_task(
+        task_id=job.task_id,
+        url=job.url,
+        output_path=job.output_path,
+        format=job.format,
+        quiet=job.quiet,
+        options=job.options,
+        priority=job.priority
+    )
+
+
+# 全局下载调度器，并发数由 MAX_CONCURRENT_DOWNLOADS 控制
+scheduler = DownloadScheduler(
+    run_download_job,
+    concurrency=settings.max_concurrent_downloads,
+    max_queue_size=settings.max_queue_size,
+    limiter=host_limiter,
+    admission=(lambda job: disk_space.fits(job.output_path, job.size)) if disk_space is not None else None,
+    recheck_interval=settings.disk_recheck_interval
+)
+# 状态缓存只回填本进程排队/执行中的任务
+task_cache.set_owner_check(scheduler.is_scheduled)
+ACTIVE_DOWNLOADS.set_function(lambda: scheduler.active)
+QUEUED_DOWNLOADS.set_function(lambda: scheduler.queued)
+DOWNLOAD_SPEED.set_function(progress_store.total_speed)
+
+
+async def schedule_task(task_id: str, request: "DownloadRequest", reserved: bool = False) -> bool:
+    """
+    将任务交给调度器排队（分布式模式下任务已入库，由 worker 领取）
+
+    Args:
+        reserved: 使用调用方通过 scheduler.reserve 预留的名额
+
+    Returns:
+        True 表示已入队（reserved 时消耗了一个预留名额）
+    """
+    if settings.execution_mode == "distributed":
+        return False
+    if scheduler.is_scheduled(task_id):
+        return False
+    progress_store.set_phase(task_id, "queued")
+    return await scheduler.submit(DownloadJob(
+        task_id=task_id,
+        url=request.url,
+        output_path=request.output_path,
+        format=request.format,
+        quiet=request.quiet,
+        priority=request.priority,
+        key=await asyncio.to_thread(limit_key, request.url),
+        options=request.download_options()
+    ), reserved=reserved)
+
+
+async def fail_unscheduled(task_ids: list[str], error: str) -> None:
+    """
+    已入库但没能交给调度器的任务标记为失败
+
+    否则这些 pending 任务既不会执行，重复提交时又被当作进行中的任务直接返回；
+    标记为失败后再次提交会重新调度
+    """
+    for task_id in dict.fromkeys(task_ids):
+        await state.update_task(task_id, "failed", error=error)
+        progress_store.set_phase(task_id, "failed", error=error)
+    logger.warning("Tasks could not be scheduled", extra={"count": len(task_ids), "error": error})
+
+
+async def recover_pending_tasks() -> int:
+    """
+    启动时恢复上次进程退出时未完成的任务
+
+    调度器只在内存中排队，进程重启后 pending 任务不会再被执行；
+    这里把它们按优先级重新交给调度器，下载时基于 .part 文件断点续传。
+    分布式模式下由 worker 的租约过期机制负责恢复，这里跳过。
+
+    Returns:
+        重新调度的任务数
+    """
+    if not settings.resume_on_startup or settings.execution_mode == "distributed":
+        return 0
+    tasks = await state.get_pending_tasks(limit=scheduler.max_queue_size)
+    recovered = 0
+    for task in tasks:
+        try:
+            await schedule_task(task.id, DownloadRequest(
+                url=task.url,
+                output_path=task.output_path,
+                format=task.format,
+                priority=task.priority,
+                **(task.options or {})
+            ))
+        except QueueFullError:
+            break
+        recovered += 1
+    if tasks:
+        logger.info("Recovered pending tasks", extra={"count": recovered, "found": len(tasks)})
+    return recovered
+
+
+async def recover_after_warmup() -> None:
+    """
+    预热完成后再恢复未完成的任务
+
+    恢复时要解析每个任务的站点和视频ID（limit_key），需要加载 yt-dlp 的全部提取器，
+    在后台等预热完成后执行，不推迟服务开始监听
+    """
+    await warmup.wait()
+    try:
+        await recover_pending_tasks()
+    except Exception as e:
+        logger.error("Failed to recover pending tasks", extra={"error": str(e)})
+
+
+# 启动时在后台恢复未完成任务的协程
+recovery_task: Optional[asyncio.Task] = None
+
+
+async def startup() -> None:
+    """应用启动（lifespan）：初始化数据库，在后台预热 yt-dlp，预热完成后恢复未完成的任务"""
+    global recovery_task
+    await state.initialize()
+    warmup.start()
+    recovery_task = asyncio.create_task(recover_after_warmup(), name="recover-pending-tasks")
 
 
-def create_or_get_task(request: DownloadRequest) -> str:
+async def shutdown() -> None:
+    """应用退出（lifespan）：停止调度器，写完排队中的状态更新，关闭执行器"""
+    if recovery_task is not None:
+        recovery_task.cancel()
+        await asyncio.gather(recovery_task, return_exceptions=True)
+    await scheduler.shutdown()
+    await state.shutdown()
+    if process_pool is not None:
+        process_pool.shutdown(wait=False)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def readiness() -> dict:
+    """就绪状态：数据库已初始化且 yt-dlp 预热完成"""
+    return {
+        "ready": state.initialized and warmup.ready,
+        "database": state.initialized,
+        "warmup": warmup.stats(),
+    }
+
+
+def _check_download_options(request: DownloadRequest) -> None:
+    downloader = request.external_downloader
+    if downloader and downloader != "native" and downloader not in allowed_external_downloaders():
+        raise HTTPException(status_code=400, detail=f"External downloader not allowed: {downloader}")
+
+
+async def create_or_get_task(request: DownloadRequest) -> str:
+    _check_download_options(request)
     # 使用配置化的路径映射处理特殊站点
     request.output_path = settings.get_output_path_for_url(
         request.url,
         request.output_path
     )
 
-    # 从数据库查找已存在任务（只根据URL判断）
-    existing_task = state.task_exists(request.url)
-    if existing_task:
-        # 如果任务已完成，直接返回
-        if existing_task.status == "completed":
-            logger.info("Reusing completed task", extra={
-                "task_id": existing_task.id,
-                "url": request.url,
-                "video_title": existing_task.video_title
-            })
+    try:
+        # 入库前预留排队名额，并发提交不会越过 MAX_QUEUE_SIZE 写入无法调度的任务
+        scheduler.reserve(1)
+    except QueueFullError:
+        # 队列已满时仍允许复用已有任务
+        existing_task = await state.task_exists(request.url)
+        if existing_task and existing_task.status != "failed":
             return existing_task.id
+        raise
 
-        # 如果任务失败，重置状态并重新下载
-        if existing_task.status == "failed":
-            logger.info("Retrying failed task", extra={
-                "task_id": existing_task.id,
-                "url": request.url,
-                "previous_error": existing_task.error
-            })
-            # 重置任务状态为 pending，清除错误信息
-            state.update_task(existing_task.id, "pending", error="")
-            # 重新启动下载任务
-            asyncio.create_task(process_download_task(
-                task_id=existing_task.id,
-                url=request.url,
-                output_path=request.output_path,
-                format=request.format,
-                quiet=request.quiet
-            ))
-            return existing_task.id
+    scheduled = False
+    try:
+        # 原子地创建或获取任务（只根据URL判断）
+        task_id, action = await state.create_or_get(
+            request.url, request.output_path, request.format,
+            priority=request.priority, options=request.download_options()
+        )
 
-        # 如果任务正在进行中，直接返回
-        if existing_task.status == "pending":
-            logger.info("Task already in progress", extra={
-                "task_id": existing_task.id,
-                "url": request.url
+        if action == "completed" and await reopen_for_reuse(task_id, request.output_path):
+            # output_path 不同：任务以 pending 返回，由调度器把已下载的文件放到新目录
+            logger.info("Reusing completed task for a new output path", extra={
+                "task_id": task_id,
+                "url": request.url,
+                "output_path": request.output_path
             })
-            return existing_task.id
-
-    # 创建新任务
-    task_id = state.add_task(request.url, request.output_path, request.format)
-    asyncio.create_task(process_download_task(
-        task_id=task_id,
-        url=request.url,
-        output_path=request.output_path,
-        format=request.format,
-        quiet=request.quiet
-    ))
+            action = "reopened"
+        if action == "completed":
+            # 如果任务已完成，直接返回
+            logger.info("Reusing completed task", extra={"task_id": task_id, "url": request.url})
+        elif action == "pending":
+            # 如果任务正在进行中，直接返回
+            logger.info("Task already in progress", extra={"task_id": task_id, "url": request.url})
+        else:
+            # 新任务、失败重试或重新打开的任务，交给调度器
+            try:
+                scheduled = await schedule_task(task_id, request, reserved=True)
+            except Exception as e:
+                await fail_unscheduled([task_id], f"Failed to schedule task: {e}")
+                raise
+    finally:
+        if not scheduled:
+            scheduler.unreserve(1)
     return task_id
 
 
@@ -127,22 +525,179 @@ def create_or_get_task(request: DownloadRequest) -> str:
 async def api_download_video(request: DownloadRequest):
     """提交单个下载任务"""
     logger.info("Received download request", extra={"url": request.url})
-    task_id = create_or_get_task(request)
+    try:
+        task_id = await create_or_get_task(request)
+    except QueueFullError as e:
+        logger.warning("Download queue full", extra={"url": request.url})
+        raise HTTPException(status_code=503, detail=str(e))
     return {"status": "success", "task_id": task_id}
 
 
 @router.post("/batch_download", response_class=JSONResponse)
 async def batch_download(request: BatchDownloadRequest):
-    """批量提交下载任务"""
+    """批量提交下载任务（单事务入库后再交给调度器）"""
     logger.info("Received batch download request", extra={"count": len(request.tasks)})
-    task_ids = [create_or_get_task(task_req) for task_req in request.tasks]
+    for task_req in request.tasks:
+        _check_download_options(task_req)
+        task_req.output_path = settings.get_output_path_for_url(task_req.url, task_req.output_path)
+
+    try:
+        # 入库前为整批预留排队名额（按最多需要调度的任务数），未用完的最后归还
+        scheduler.reserve(len(request.tasks))
+    except QueueFullError:
+        logger.warning("Download queue full, rejecting batch", extra={"count": len(request.tasks)})
+        raise HTTPException(status_code=503, detail="Download queue is full")
+
+    scheduled = 0
+    try:
+        plan = await state.bulk_create_or_get([
+            (task_req.url, task_req.output_path, task_req.format, task_req.priority, task_req.download_options())
+            for task_req in request.tasks
+        ])
+
+        task_ids = []
+        unscheduled = []
+        schedule_error = None
+        for task_req, (task_id, action) in zip(request.tasks, plan):
+            task_ids.append(task_id)
+            if action == "completed" and await reopen_for_reuse(task_id, task_req.output_path):
+                # output_path 不同的已完成任务由调度器生成副本
+                action = "reopened"
+            if action in ("created", "retried", "reopened"):
+                if schedule_error is None:
+                    try:
+                        scheduled += await schedule_task(task_id, task_req, reserved=True)
+                        continue
+                    except Exception as e:
+                        schedule_error = f"Failed to schedule task: {e}"
+                # 调度失败后剩余的新任务也不再提交，统一标记为失败
+                unscheduled.append(task_id)
+    finally:
+        scheduler.unreserve(len(request.tasks) - scheduled)
+
+    if unscheduled:
+        # 没能调度的任务以 failed 状态返回，重新提交时会再次调度
+        await fail_unscheduled(unscheduled, schedule_error)
     return {"status": "success", "task_ids": task_ids}
 
 
+async def extract_video_info(url: str) -> dict:
+    """获取视频信息（经过缓存，并发请求同一视频只提取一次）"""
+    async def fetch():
+        return await run_in_executor(lambda: get_video_info(url, quiet=True))
+
+    return await info_cache.get_or_fetch(await info_cache_key(url), fetch)
+
+
+async def extract_download_info(task_id: str, url: str, format: str) -> dict:
+    """
+    下载前按下载使用的格式获取视频信息（经过缓存，requested_formats 与下载时一致，用于估算大小）
+
+    /info 已提取过该视频时只基于缓存的信息在本地重新选择格式，不再访问网络；
+    多进程模式下提取和格式选择都在 worker 进程中执行，yt-dlp 的 CPU 开销不回到 API 进程
+    """
+    async def fetch():
+        info = info_cache.get(await info_cache_key(url))
+        if info is not None:
+            if process_pool is not None:
+                return await process_pool.select_formats(task_id, info, format)
+            return await run_in_executor(lambda: select_formats(info, format))
+        if process_pool is not None:
+            return await process_pool.extract(task_id, url, format)
+        return await run_in_executor(lambda: get_video_info(url, quiet=True, format=format))
+
+    return await info_cache.get_or_fetch(await info_cache_key(url, format), fetch)
+
+
+async def fetch_video_info(url: str) -> dict:
+    """获取视频信息，提取失败时返回 400"""
+    try:
+        return await extract_video_info(url)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to extract info: {str(e)}")
+
+
+@router.get("/info", response_class=JSONResponse)
+async def api_video_info(url: str):
+    """获取视频信息"""
+    info = await fetch_video_info(url)
+    return {"status": "success", "data": info}
+
+
+@router.get("/formats", response_class=JSONResponse)
+async def api_video_formats(url: str):
+    """列出可用的视频格式"""
+    info = await fetch_video_info(url)
+    return {"status": "success", "data": info.get("formats") or []}
+
+
+@router.get("/queue", response_class=JSONResponse)
+async def get_queue_stats():
+    """查询下载队列状态"""
+    data = scheduler.stats()
+    data["executor"] = settings.download_executor
+    data["connections_per_download"] = connections_per_download()
+    data["info_cache"] = info_cache.stats()
+    data["task_cache"] = task_cache.stats()
+    if host_limiter is not None:
+        data["host_limits"] = host_limiter.stats()
+    if disk_space is not None:
+        data["disk_space"] = disk_space.stats()
+    data["db_writer"] = state.writer_stats()
+    if process_pool is not None:
+        data["process_pool"] = process_pool.stats()
+    return {"status": "success", "data": data}
+
+
+@router.get("/admin/bandwidth", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def get_bandwidth():
+    """查询带宽预算及各下载分配到的速率"""
+    return {"status": "success", "data": bandwidth.stats()}
+
+
+@router.put("/admin/bandwidth", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def update_bandwidth(request: BandwidthUpdateRequest):
+    """运行时调整带宽预算，立即在进行中的下载之间重新分配"""
+    bandwidth.configure(limit=request.limit, priority_weighting=request.priority_weighting)
+    return {"status": "success", "data": bandwidth.stats()}
+
+
+@router.post("/admin/profile", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+async def request_profile(request: ProfileRequest):
+    """
+    对一个任务的执行做 cProfile 分析（任务尚未开始执行时有效，只在本进程执行的任务上生效）
+
+    任务结束后通过 GET /admin/profile/{task_id} 下载 .prof 文件；
+    同时只允许一个分析，已有请求等待执行或正在分析时返回 409
+    """
+    if settings.execution_mode == "distributed":
+        raise HTTPException(status_code=400, detail="Profiling is only available in local execution mode")
+    if not profile_requests.request(request.task_id):
+        raise HTTPException(status_code=409, detail="Another profile is pending or running")
+    logger.info("Profiling requested", extra={"task_id": request.task_id})
+    return {"status": "success", "data": {"task_id": request.task_id, "pending": profile_requests.pending()}}
+
+
+@router.get("/admin/profile/{task_id}", dependencies=[Depends(require_admin)])
+async def download_profile(task_id: str, format: str = "prof"):
+    """
+    下载任务的性能分析结果
+
+    Args:
+        format: prof 返回 cProfile 原始文件（可用 snakeviz / pstats 查看），text 返回按累计耗时排序的摘要
+    """
+    path = profile_path(task_id)
+    if os.path.basename(path) != f"{task_id}.prof" or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Profile for task {task_id} not found")
+    if format == "text":
+        return PlainTextResponse(await asyncio.to_thread(summarize, path))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{task_id}.prof")
+
+
 @router.get("/task/{task_id}", response_class=JSONResponse)
 async def get_task_status(task_id: str):
     """查询单个任务状态"""
-    task = state.get_task(task_id)
+    task = await state.get_task(task_id)
     if not task:
         logger.warning("Task not found", extra={"task_id": task_id})
         raise HTTPException(status_code=404, detail=f"Task with ID {task_id} not found")
@@ -156,28 +711,54 @@ async def get_task_status(task_id: str):
             "status": task.status
         }
     }
+    if task.timings:
+        response["data"]["timings"] = task.timings
     if task.status == "completed" and task.result:
         response["data"]["result"] = task.result
     elif task.status == "failed" and task.error:
         response["data"]["error"] = task.error
+    elif task.status == "pending":
+        progress = progress_store.get(task_id)
+        if progress:
+            response["data"]["progress"] = progress
     return response
 
 
+@router.get("/task/{task_id}/info", response_class=JSONResponse)
+async def get_task_full_info(task_id: str):
+    """查询任务的完整视频信息（任务记录中的 result 只是摘要）"""
+    info = await state.get_task_info(task_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Full info for task {task_id} not found")
+    return {"status": "success", "data": info}
+
+
+@router.get("/task/{task_id}/files", response_class=JSONResponse)
+async def get_task_files(task_id: str):
+    """查询任务的输出文件（下载得到的和复用生成的副本，含大小和 SHA-256）"""
+    files = await state.get_files(task_id)
+    return {"status": "success", "data": files}
+
+
 @router.get("/tasks", response_class=JSONResponse)
 async def list_all_tasks(
     status: str = None,
     page: int = 1,
     page_size: int = 100,
-    order: str = "desc"
+    order: str = "desc",
+    cursor: str = None,
+    fields: str = None
 ):
     """
     列出任务（支持过滤、分页和排序）
 
     Args:
         status: 任务状态过滤 (pending/completed/failed)
-        page: 页码（从1开始，默认1）
+        page: 页码（从1开始，默认1），提供 cursor 时忽略
         page_size: 每页数量（默认100）
         order: 排序方向 (asc/desc，默认desc)，按时间排序
+        cursor: 上一页返回的 next_cursor（键集分页，深翻页不会变慢）
+        fields: 逗号分隔的返回字段，例如 id,url,status,video_title（不含 result 时不会读取结果列）
     """
     # 参数验证
     if page < 1:
@@ -188,13 +769,24 @@ async def list_all_tasks(
         raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
     if order not in ["asc", "desc"]:
         order = "desc"
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        invalid = [f for f in field_list if f not in LIST_FIELDS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid fields: {','.join(invalid)}")
 
-    tasks, total = state.list_tasks(
-        status=status,
-        page=page,
-        page_size=page_size,
-        order=order
-    )
+    try:
+        tasks, total, next_cursor = await state.list_tasks(
+            status=status,
+            page=page,
+            page_size=page_size,
+            order=order,
+            cursor=cursor,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     logger.debug("Listed tasks", extra={
         "count": len(tasks),
@@ -207,41 +799,99 @@ async def list_all_tasks(
         "status": "success",
         "data": tasks,
         "pagination": {
-            "page": page,
+            "page": None if cursor else page,
             "page_size": page_size,
             "total": total,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor
         }
     }
 
 @router.post("/batch_tasks", response_class=JSONResponse)
 async def batch_get_tasks(request: BatchTaskQueryRequest):
+    """批量查询任务状态（单次 IN 查询）"""
     logger.debug("Batch task query", extra={"count": len(request.task_ids)})
+    tasks = await state.get_tasks(request.task_ids)
     results = []
     all_finished = True
     for task_id in request.task_ids:
-        task = state.get_task(task_id)
-        if not task:
+        task_info = tasks.get(task_id)
+        if not task_info:
             results.append({
                 "id": task_id,
                 "status": "not_found"
             })
             continue
-        task_info = {
-            "id": task.id,
-            "url": task.url,
-            "status": task.status
-        }
-        if task.status == "completed" and task.result:
-            task_info["result"] = task.result
-        elif task.status == "failed" and task.error:
-            task_info["error"] = task.error
-        if task.status not in ("completed", "failed"):
+        if task_info["status"] not in ("completed", "failed"):
             all_finished = False
         results.append(task_info)
     return {"status": "success", "data": results, "all_finished": all_finished}
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("/progress/stream")
+async def stream_progress(task_ids: str):
+    """
+    以 SSE 推送任务进度
+
+    Args:
+        task_ids: 逗号分隔的任务ID
+
+    事件：
+        progress: 进度更新（phase、downloaded_bytes、total_bytes、speed、eta 等）
+        end: 所有任务均已结束
+    """
+    ids = [task_id for task_id in dict.fromkeys(task_ids.split(",")) if task_id]
+    if not ids:
+        raise HTTPException(status_code=400, detail="task_ids is required")
+    if len(ids) > 1000:
+        raise HTTPException(status_code=400, detail="Too many task_ids (max 1000)")
+
+    async def event_stream():
+        versions = {}
+        finished = set()
+        last_db_check = 0.0
+        last_send = time.monotonic()
+        while True:
+            # 内存中没有进度的任务（已结束很久或由其它进程执行）低频回查数据库
+            unknown = [i for i in ids if i not in finished and progress_store.get(i) is None]
+            if unknown and time.monotonic() - last_db_check >= settings.progress_db_check_interval:
+                last_db_check = time.monotonic()
+                for task_id in unknown:
+                    task = await state.get_task(task_id)
+                    status = task.status if task else "not_found"
+                    if status != "pending":
+                        finished.add(task_id)
+                        yield _sse("progress", {"task_id": task_id, "phase": status})
+
+            for task_id, entry in progress_store.get_many(ids).items():
+                if task_id in finished or versions.get(task_id) == entry["version"]:
+                    continue
+                versions[task_id] = entry["version"]
+                if entry.get("phase") in TERMINAL_PHASES:
+                    finished.add(task_id)
+                last_send = time.monotonic()
+                yield _sse("progress", entry)
+
+            if len(finished) == len(ids):
+                yield _sse("end", {"task_ids": ids})
+                return
+            if time.monotonic() - last_send >= 15:
+                # 保活注释，防止代理断开空闲连接
+                last_send = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.progress_interval)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/fetch", response_class=JSONResponse)
 async def fetch_91porn_page(page: int = 1):
     """获取91porn页面内容"""
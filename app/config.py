@@ -23,6 +23,13 @@ class Settings(BaseSettings):
 
     # SQLite配置（当database_type为sqlite时使用）
     sqlite_db_file: str = "tasks.db"
+    sqlite_wal: bool = True  # WAL 日志模式 + synchronous=NORMAL，读不阻塞写
+    sqlite_cache_size_kb: int = 65536  # 页缓存大小（KB，每个连接）
+    sqlite_mmap_size_mb: int = 256  # 内存映射大小（MB，0 表示禁用）
+    sqlite_busy_timeout_ms: int = 5000  # 等待写锁的超时时间（毫秒）
+    sqlite_batch_writes: bool = True  # 由单个写入协程合并多个任务的状态更新
+    write_batch_interval_ms: float = 5.0  # 合并写入的等待窗口（毫秒）
+    write_batch_max_size: int = 256  # 单个事务最多合并的更新数
 
     # 应用配置
     app_host: str = "0.0.0.0"
@@ -31,7 +38,59 @@ class Settings(BaseSettings):
     # 下载配置
     default_download_path: str = "./downloads"
     max_concurrent_downloads: int = 5
+    max_queue_size: int = 0  # 排队任务上限，0 表示不限制
     thread_pool_size: int = 10
+    canonical_dedup: bool = True  # 按 yt-dlp 识别出的 (extractor, video_id) 去重
+    task_cache_size: int = 10000  # 进行中任务状态缓存条数（0 表示禁用）
+    task_cache_ttl: float = 30.0  # 任务状态缓存有效期（秒，下载进度会刷新），多进程未接入失效广播时的陈旧上限
+    task_count_cache_ttl: float = 30.0  # /tasks 返回的总数缓存时间（秒）
+    info_compression: str = "zstd"  # 完整视频信息的压缩格式（zstd 或 gzip，未安装 zstandard 时使用 gzip）
+
+    # 视频信息缓存配置
+    info_cache_size: int = 256  # 最多缓存的视频信息条数，0 表示禁用
+    info_cache_ttl: float = 300.0  # 缓存有效期（秒），格式直链通常带签名会过期，不宜过长
+    resume_on_startup: bool = True  # 启动时重新调度上次未完成的 pending 任务（断点续传）
+    ytdlp_warmup: bool = True  # 服务开始监听后在后台预先加载 yt-dlp 提取器，完成前 /ready 返回 503
+    # 已下载的视频以其他 output_path 再次请求时复用文件
+    # auto: 硬链接 → reflink → 复制；link: 只用硬链接/reflink（不同文件系统时不复用）；off: 关闭
+    file_reuse: str = "auto"
+    # 磁盘空间准入：下载前按 filesize/filesize_approx 估算大小并预留空间，空间不足的任务在队列中等待
+    disk_admission: bool = True
+    disk_headroom_mb: int = 1024  # 始终保留的空闲空间（MB）
+    disk_recheck_interval: float = 30.0  # 有任务因空间不足等待时重新检查的间隔（秒）
+    # 单个下载的传输参数（可被请求中的同名参数覆盖）
+    concurrent_fragment_downloads: int = 4  # HLS/DASH 并发下载的分片数
+    http_chunk_size: Optional[int] = None  # HTTP 分块下载大小（字节），部分站点对单连接限速时有效
+    download_buffer_size: Optional[int] = None  # 下载缓冲区大小（字节）
+    external_downloader: Optional[str] = None  # 外部下载器（例如 aria2c），为空使用 yt-dlp 内置下载器
+    external_downloader_args: Optional[str] = None  # 外部下载器的额外参数（只能在服务端配置）
+    allowed_external_downloaders: str = "aria2c"  # 请求中允许选择的外部下载器（逗号分隔）
+    max_download_connections: int = 32  # 所有下载的连接总数上限，按 MAX_CONCURRENT_DOWNLOADS 平分给每个下载
+    bandwidth_limit: float = 0  # 所有下载的总带宽预算（字节/秒，0 表示不限制），可通过管理接口调整
+    bandwidth_priority_weighting: bool = True  # 按任务优先级加权分配带宽
+    admin_token: Optional[str] = None  # 管理接口的令牌（请求头 X-Admin-Token），为空时管理接口返回 403
+    profile_dir: str = "profiles"  # 按需性能分析结果（.prof）的保存目录
+    host_limits_enabled: bool = True  # 按站点（提取器/主机名）自适应限制并发
+    host_limit_initial: int = 2  # 新站点的初始并发上限
+    host_limit_min: int = 1
+    host_limit_max: int = 0  # 站点并发上限的最大值（0 表示等于 MAX_CONCURRENT_DOWNLOADS）
+    host_limit_decrease_factor: float = 0.5  # 遇到限流错误时上限乘以该系数
+    host_limit_cooldown: float = 30.0  # 两次降低上限的最小间隔（秒）
+    execution_mode: str = "local"  # local: API 进程执行下载；distributed: API 只入库，由 worker 领取执行
+    worker_id: Optional[str] = None  # worker 标识（默认 主机名-进程号）
+    lease_ttl: float = 60.0  # 任务租约时长（秒），worker 失联超过该时间后任务被重新领取
+    lease_heartbeat_interval: float = 15.0  # worker 续约间隔（秒）
+    lease_max_attempts: int = 3  # 任务最多被领取的次数，超过后标记为失败（防止反复拖垮 worker）
+    worker_poll_interval: float = 1.0  # worker 无任务可领时的轮询间隔（秒）
+    worker_metrics_port: int = 0  # worker 的 Prometheus 指标端口（0 表示不开启）
+    download_executor: str = "thread"  # thread 或 process
+    process_pool_size: int = 0  # worker 进程数，0 表示 CPU 核数
+    process_max_jobs_per_worker: int = 50  # 单个 worker 执行多少任务后被替换，0 表示不限制
+
+    # 进度推送配置
+    progress_interval: float = 0.5  # 下载进度回调的最小间隔（秒）
+    progress_retention: float = 60.0  # 已结束任务的进度在内存中保留的时间（秒）
+    progress_db_check_interval: float = 5.0  # 推送时回查数据库中未知任务状态的间隔（秒）
 
     # 特殊站点路径配置（JSON格式）
     # 格式: {"domain_keyword": "subdirectory"}
@@ -48,6 +107,9 @@ class Settings(BaseSettings):
     log_rotation: str = "100 MB"  # 日志轮转大小
     log_retention: str = "30 days"  # 日志保留时间
     log_compression: str = "zip"  # 日志压缩格式
+    log_background: bool = True  # 由后台线程格式化和写入日志，调用方只把记录放入队列
+    log_debug_sample_interval: float = 1.0  # 同一位置的 DEBUG 日志最多每隔多少秒输出一条（0 表示不采样）
+    app_env: str = "development"  # 运行环境，production 时异常日志不输出变量值（diagnose）
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -70,6 +132,18 @@ class Settings(BaseSettings):
         else:
             return f"sqlite:///{self.sqlite_db_file}"
 
+    def get_async_database_url(self) -> str:
+        """获取异步驱动的数据库连接URL（aiomysql / aiosqlite）"""
+        url = self.get_database_url()
+        for sync_prefix, async_prefix in (
+            ("mysql+pymysql://", "mysql+aiomysql://"),
+            ("mysql://", "mysql+aiomysql://"),
+            ("sqlite:///", "sqlite+aiosqlite:///"),
+        ):
+            if url.startswith(sync_prefix):
+                return async_prefix + url[len(sync_prefix):]
+        return url
+
     def get_site_path_mapping(self) -> Dict[str, str]:
         """获取站点路径映射配置"""
         try:
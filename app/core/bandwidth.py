@@ -0,0 +1,181 @@
+"""
+全局带宽调度模块
+进程级带宽预算在进行中的下载之间动态分配，下载开始/结束或速率变化时重新分配
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.logger import logger
+
+# 重新分配的最小间隔（秒）
+_REBALANCE_INTERVAL = 1.0
+# 令牌桶容量对应的时长（秒），限制突发流量
+_BURST_SECONDS = 0.25
+_MIN_BURST = 64 * 1024
+
+
+def priority_weight(priority: int) -> float:
+    """优先级对应的带宽权重：0 为 1，每高一级多分一份，负优先级按倒数递减"""
+    return 1.0 + priority if priority >= 0 else 1.0 / (1 - priority)
+
+
+class _Share:
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.rate = 0.0  # 当前分配的速率（字节/秒）
+        self.tokens = 0.0
+        self.last_refill = 0.0
+        self.window_start = 0.0  # 第一次读取数据时开始计时（不计入提取信息的时间）
+        self.window_bytes = 0
+        self.measured = 0.0  # 实际速率的滑动平均（字节/秒）
+
+
+class BandwidthScheduler:
+    """
+    带宽调度器（线程安全，consume 在下载线程中调用）
+
+    - 预算按权重在进行中的下载之间分配；实际速率明显低于分配值的下载（源站较慢）
+      只分配其实际需要的带宽，剩余部分分给其他下载（最大最小公平），使总速率接近预算
+    - 每个下载一个令牌桶，consume 在超出分配速率时休眠，从而限制下载线程读取数据的速度
+    - limit 为 0 表示不限制
+    """
+
+    def __init__(self, limit: float = 0, priority_weighting: bool = True):
+        self._limit = float(limit)
+        self._priority_weighting = priority_weighting
+        self._lock = threading.Lock()
+        self._shares: Dict[str, _Share] = {}
+        self._priorities: Dict[str, int] = {}
+        self._last_rebalance = 0.0
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    def register(self, task_id: str, priority: int = 0) -> None:
+        """下载开始"""
+        with self._lock:
+            self._priorities[task_id] = priority
+            self._shares[task_id] = _Share(self._weight(priority))
+            self._rebalance()
+
+    def unregister(self, task_id: str) -> None:
+        """下载结束"""
+        with self._lock:
+            self._priorities.pop(task_id, None)
+            if self._shares.pop(task_id, None) is not None:
+                self._rebalance()
+
+    def configure(self, limit: Optional[float] = None, priority_weighting: Optional[bool] = None) -> None:
+        """运行时调整预算（管理接口）"""
+        with self._lock:
+            if limit is not None:
+                self._limit = float(max(0, limit))
+            if priority_weighting is not None:
+                self._priority_weighting = priority_weighting
+                for task_id, share in self._shares.items():
+                    share.weight = self._weight(self._priorities[task_id])
+            self._rebalance()
+        logger.info("Bandwidth budget updated", extra={
+            "limit": self._limit,
+            "priority_weighting": self._priority_weighting
+        })
+
+    def share(self, task_id: str) -> Optional[float]:
+        """下载当前分配到的速率（字节/秒），不限制时为 None"""
+        with self._lock:
+            share = self._shares.get(task_id)
+            if self._limit <= 0 or share is None:
+                return None
+            return share.rate
+
+    def _weight(self, priority: int) -> float:
+        return priority_weight(priority) if self._priority_weighting else 1.0
+
+    def _rebalance(self) -> None:
+        """按权重做最大最小公平分配（调用方持有锁）"""
+        self._last_rebalance = time.monotonic()
+        if self._limit <= 0 or not self._shares:
+            return
+        # 实际速率明显低于分配值的下载受源站速度限制，只需要略高于实际速率的带宽
+        demand = {
+            task_id: share.measured * 1.5
+            if share.measured and share.rate and share.measured < share.rate * 0.75 else float("inf")
+            for task_id, share in self._shares.items()
+        }
+        remaining = self._limit
+        pending = set(self._shares)
+        while pending:
+            total_weight = sum(self._shares[task_id].weight for task_id in pending)
+            limited = [
+                task_id for task_id in pending
+                if demand[task_id] < remaining * self._shares[task_id].weight / total_weight
+            ]
+            if not limited:
+                break
+            for task_id in limited:
+                self._shares[task_id].rate = demand[task_id]
+                remaining -= demand[task_id]
+                pending.discard(task_id)
+        # 剩余预算按权重分给其余下载；全部受源站限制时分给所有下载，源站变快时能立即用上
+        receivers = pending or set(self._shares)
+        total_weight = sum(self._shares[task_id].weight for task_id in receivers)
+        for task_id in receivers:
+            extra = remaining * self._shares[task_id].weight / total_weight
+            self._shares[task_id].rate = extra if task_id in pending else self._shares[task_id].rate + extra
+
+    def consume(self, task_id: str, nbytes: int) -> None:
+        """记录下载线程读取的字节数，超出分配速率时休眠"""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            share = self._shares.get(task_id)
+            if share is None:
+                return
+            now = time.monotonic()
+            if not share.window_start:
+                share.window_start = share.last_refill = now
+            share.window_bytes += nbytes
+            if now - share.window_start >= _REBALANCE_INTERVAL:
+                rate = share.window_bytes / (now - share.window_start)
+                share.measured = rate if not share.measured else 0.7 * share.measured + 0.3 * rate
+                share.window_start = now
+                share.window_bytes = 0
+            if self._limit <= 0:
+                return
+            if now - self._last_rebalance >= _REBALANCE_INTERVAL:
+                self._rebalance()
+
+            rate = max(share.rate, 1.0)
+            burst = max(rate * _BURST_SECONDS, _MIN_BURST)
+            share.tokens = min(burst, share.tokens + (now - share.last_refill) * rate)
+            share.last_refill = now
+            share.tokens -= nbytes
+            delay = -share.tokens / rate if share.tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self._limit,
+                "priority_weighting": self._priority_weighting,
+                "allocated": round(sum(share.rate for share in self._shares.values())) if self._limit > 0 else None,
+                "measured": round(sum(share.measured for share in self._shares.values())),
+                "downloads": {
+                    task_id: {
+                        "weight": round(share.weight, 3),
+                        "rate": round(share.rate) if self._limit > 0 else None,
+                        "measured": round(share.measured),
+                    }
+                    for task_id, share in self._shares.items()
+                },
+            }
+
+
+# 全局带宽调度器
+bandwidth = BandwidthScheduler(
+    limit=settings.bandwidth_limit,
+    priority_weighting=settings.bandwidth_priority_weighting
+)
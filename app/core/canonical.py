@@ -0,0 +1,159 @@
+"""
+URL 规范化模块
+离线（不访问网络）使用 yt-dlp 的提取器 URL 匹配识别视频，
+使 youtu.be/X、youtube.com/watch?v=X&t=30、m.youtube.com/... 等变体得到相同的 (extractor, video_id)
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from app.config import settings
+
+try:
+    import re._parser as sre_parse
+    from re._constants import LITERAL, SUBPATTERN, BRANCH
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, SUBPATTERN, BRANCH
+
+VideoKey = Tuple[str, str]
+
+# 几乎所有 URL 都包含的片段，不能作为筛选依据
+_TRIVIAL = ("https://www.", "http://www.")
+# 锚点字符串的最短长度，过短的锚点筛选效果差
+_MIN_ANCHOR_LENGTH = 4
+
+
+def _is_trivial(run: str) -> bool:
+    return any(run in trivial for trivial in _TRIVIAL)
+
+
+def _anchors(seq) -> Optional[set]:
+    """
+    从解析后的正则中找出匹配时必然出现的字符串集合（出现其一即可）
+
+    只在顺序结构、无量词分组和所有分支都有锚点的 BRANCH 中寻找，
+    因此结果是必要条件：URL 不包含任何锚点时该正则一定不匹配
+    """
+    best = None
+
+    def consider(candidates):
+        nonlocal best
+        if candidates and (best is None or min(map(len, candidates)) > min(map(len, best))):
+            best = candidates
+
+    run = ""
+    for op, av in seq:
+        if op is LITERAL:
+            run += chr(av)
+            continue
+        if run and not _is_trivial(run):
+            consider({run})
+        run = ""
+        if op is SUBPATTERN:
+            consider(_anchors(av[-1]))
+        elif op is BRANCH:
+            branches = [_anchors(branch) for branch in av[1]]
+            if all(branches):
+                consider(set().union(*branches))
+    if run and not _is_trivial(run):
+        consider({run})
+    return best
+
+
+def _extractor_anchors(ie) -> Optional[FrozenSet[str]]:
+    """计算提取器的锚点（小写），无法计算时返回 None（该提取器总是参与匹配）"""
+    # 重写了 suitable 的提取器可能不只依赖 _VALID_URL
+    owner = next(klass for klass in ie.__mro__ if "suitable" in vars(klass))
+    if owner.__name__ not in ("InfoExtractor", "LazyLoadExtractor"):
+        return None
+    patterns = ie._VALID_URL
+    if isinstance(patterns, str):
+        patterns = (patterns,)
+    if not patterns:
+        return None
+
+    anchors = set()
+    for pattern in patterns:
+        try:
+            found = _anchors(sre_parse.parse(pattern))
+        except Exception:
+            return None
+        if not found or min(map(len, found)) < _MIN_ANCHOR_LENGTH:
+            return None
+        # 统一按小写比较：对区分大小写的正则而言这只会放宽筛选
+        anchors |= {anchor.lower() for anchor in found}
+    return frozenset(anchors)
+
+
+class _ExtractorIndex:
+    """提取器锚点索引，先用子串筛选候选提取器，再按 yt-dlp 的顺序执行正则匹配"""
+
+    def __init__(self):
+        from yt_dlp.extractor import gen_extractor_classes
+
+        self.extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+        by_anchor: Dict[str, List[int]] = {}
+        self.always: List[int] = []
+        for index, ie in enumerate(self.extractors):
+            anchors = _extractor_anchors(ie)
+            if anchors is None:
+                self.always.append(index)
+                continue
+            for anchor in anchors:
+                by_anchor.setdefault(anchor, []).append(index)
+        self.anchors = tuple(by_anchor)
+        self.anchor_indexes = tuple(by_anchor.values())
+
+    def candidates(self, url: str) -> List[int]:
+        lowered = url.lower()
+        indexes = set(self.always)
+        for i in [i for i, anchor in enumerate(self.anchors) if anchor in lowered]:
+            indexes.update(self.anchor_indexes[i])
+        return sorted(indexes)
+
+
+_index: Optional[_ExtractorIndex] = None
+_index_lock = threading.Lock()
+
+
+def _get_index() -> _ExtractorIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _ExtractorIndex()
+    return _index
+
+
+def build_extractor_index() -> None:
+    """提前建立提取器索引（会导入 yt-dlp 的全部提取器，服务启动后在后台调用）"""
+    _get_index()
+
+
+@lru_cache(maxsize=4096)
+def canonical_video_key(url: str) -> Optional[VideoKey]:
+    """
+    识别 URL 对应的 (extractor, video_id)
+
+    与 yt-dlp 一致，取第一个 suitable 的提取器；只有 Generic 能处理
+    或无法从 URL 中解析出 ID 时返回 None（此时按 URL 摘要去重）
+    """
+    if not settings.canonical_dedup:
+        return None
+    try:
+        index = _get_index()
+        for i in index.candidates(url):
+            ie = index.extractors[i]
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                if not video_id:
+                    return None
+                return ie.ie_key(), str(video_id)[:255]
+    except Exception:
+        return None
+    return None
+
+
+def canonical_video_keys(urls: Iterable[str]) -> List[Optional[VideoKey]]:
+    """批量识别，便于在线程中一次完成"""
+    return [canonical_video_key(url) for url in urls]
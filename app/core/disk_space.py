@@ -0,0 +1,153 @@
+"""
+磁盘空间准入控制
+下载开始前按视频信息估算文件大小，在输出目录所在文件系统上预留空间；空间不足的任务回到队列等待
+"""
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.utils.logger import logger
+
+
+def estimate_size(info: Dict[str, Any]) -> Optional[int]:
+    """
+    按已选格式的 filesize / filesize_approx 估算下载需要的磁盘空间
+
+    需要合并音视频时，合并期间原始文件和合并结果同时存在，峰值按两倍计算；
+    任一格式没有大小信息时返回 None（无法估算）
+    """
+    formats = info.get("requested_formats") or [info]
+    sizes = [f.get("filesize") or f.get("filesize_approx") for f in formats]
+    if not sizes or not all(sizes):
+        return None
+    total = sum(sizes)
+    return total * 2 if len(formats) > 1 else total
+
+
+def _existing_dir(path: str) -> str:
+    """输出目录可能尚未创建，取最近的已存在的上级目录"""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+@dataclass
+class _Reservation:
+    device: int
+    size: int
+    written: int = 0  # 已写入磁盘的字节（各文件已下载字节之和）
+    files: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def remaining(self) -> int:
+        """仍需预留的字节：已写入的部分已经体现在 statvfs 的可用空间中，不能重复扣除"""
+        return max(0, self.size - self.written)
+
+
+class DiskSpaceGuard:
+    """
+    磁盘空间准入
+
+    - 可用空间 = statvfs 可用空间 - headroom - 同一文件系统上进行中下载的预留
+    - 下载开始前 try_reserve 预留估算大小，结束时 release；下载过程中 progress 按已写入的字节缩小预留
+    - 无法估算大小的任务只要求可用空间不低于 headroom
+    """
+
+    def __init__(self, headroom: int):
+        self._headroom = headroom
+        self._reservations: Dict[str, _Reservation] = {}
+        self._progress_lock = threading.Lock()
+        self._released: Optional[asyncio.Event] = None
+        self._deferred = 0
+
+    def _usage(self, path: str):
+        directory = _existing_dir(path)
+        stat = os.statvfs(directory)
+        return os.stat(directory).st_dev, stat.f_bavail * stat.f_frsize, stat.f_blocks * stat.f_frsize
+
+    def _available(self, device: int, free: int) -> int:
+        reserved = sum(r.remaining for r in list(self._reservations.values()) if r.device == device)
+        return free - reserved - self._headroom
+
+    def available(self, path: str) -> int:
+        """path 所在文件系统扣除预留和 headroom 后的可用空间（字节，可能为负）"""
+        device, free, _ = self._usage(path)
+        return self._available(device, free)
+
+    def fits(self, path: str, size: Optional[int]) -> bool:
+        return self.available(path) >= (size or 0)
+
+    def exceeds_capacity(self, path: str, size: Optional[int]) -> bool:
+        """文件系统总容量都放不下（等待也没有意义）"""
+        return bool(size) and size + self._headroom > self._usage(path)[2]
+
+    def try_reserve(self, task_id: str, path: str, size: Optional[int]) -> bool:
+        """
+        预留空间
+
+        Returns:
+            False 表示空间不足，调用方应让任务回到队列等待
+        """
+        device, free, _ = self._usage(path)
+        available = self._available(device, free)
+        if available < (size or 0):
+            self._deferred += 1
+            logger.warning("Not enough disk space, deferring download", extra={
+                "task_id": task_id,
+                "output_path": path,
+                "estimated_size": size,
+                "available": available
+            })
+            return False
+        self._reservations[task_id] = _Reservation(device, size or 0)
+        return True
+
+    def progress(self, task_id: str, data: Dict[str, Any]) -> None:
+        """
+        下载进度回调（可在下载线程中调用）：记录已写入的字节，预留相应减少
+
+        Args:
+            data: make_progress_hooks 产生的进度（filename、downloaded_bytes）
+        """
+        reservation = self._reservations.get(task_id)
+        downloaded = data.get("downloaded_bytes")
+        if reservation is None or data.get("phase") != "downloading" or downloaded is None:
+            return
+        name = data.get("filename") or ""
+        with self._progress_lock:
+            reservation.files[name] = downloaded
+            reservation.written = sum(reservation.files.values())
+
+    def release(self, task_id: str) -> None:
+        if self._reservations.pop(task_id, None) is not None and self._released is not None:
+            self._released.set()
+
+    async def wait(self, timeout: float) -> None:
+        """等待有预留被释放（或超时后重新检查，空间也可能被外部释放）"""
+        if self._released is None:
+            self._released = asyncio.Event()
+        self._released.clear()
+        try:
+            await asyncio.wait_for(self._released.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "headroom": self._headroom,
+            "reserved": sum(r.remaining for r in list(self._reservations.values())),
+            "reservations": len(self._reservations),
+            "deferred": self._deferred,
+        }
+
+
+# 全局磁盘空间准入（DISK_ADMISSION=false 时为 None）
+disk_space = DiskSpaceGuard(
+    headroom=settings.disk_headroom_mb * 1024 * 1024
+) if settings.disk_admission else None
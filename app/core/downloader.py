@@ -1,14 +1,126 @@
+import copy
 import os
-import yt_dlp
-from typing import Dict, Any, List
+import shlex
+import shutil
+from typing import Dict, Any, List, Callable, Optional
 from app.core.task_manager import NormalizeString
+from app.core.progress import make_progress_hooks
 from app.utils.logger import logger
 from app.config import settings
 
 
-def download_video(url: str, output_path: str = "./downloads", format: str = "best", quiet: bool = False) -> Dict[
-    str, Any]:
-    """下载视频"""
+def _apply_site_options(ydl_opts: Dict[str, Any], url: str) -> None:
+    """按站点补充 yt-dlp 参数"""
+    # 只有 91porn 的视频才使用 Cookie
+    if '91porn' in url.lower() and settings.porn91_cookie:
+        ydl_opts['http_headers'] = {
+            'Cookie': settings.porn91_cookie
+        }
+
+
+# 请求中可以覆盖的传输参数
+DOWNLOAD_OPTION_KEYS = ("concurrent_fragments", "http_chunk_size", "buffer_size", "external_downloader")
+
+# aria2c 单个下载的连接数上限（-x 参数的最大值）
+_ARIA2C_MAX_CONNECTIONS = 16
+
+
+def connections_per_download() -> int:
+    """
+    单个下载最多使用的连接数
+
+    连接总数 MAX_DOWNLOAD_CONNECTIONS 按并发下载数平分，所有下载同时进行时连接总数也不会超过上限
+    """
+    return max(1, settings.max_download_connections // max(1, settings.max_concurrent_downloads))
+
+
+def allowed_external_downloaders() -> List[str]:
+    return [name.strip() for name in settings.allowed_external_downloaders.split(",") if name.strip()]
+
+
+def _apply_download_options(ydl_opts: Dict[str, Any], options: Optional[Dict[str, Any]]) -> None:
+    """
+    设置分片并发、分块大小、缓冲区和外部下载器
+
+    请求中的参数优先，未提供时使用全局配置；并发分片数和外部下载器的连接数受 connections_per_download 限制
+    """
+    options = options or {}
+    cap = connections_per_download()
+
+    fragments = options.get("concurrent_fragments") or settings.concurrent_fragment_downloads
+    ydl_opts['concurrent_fragment_downloads'] = max(1, min(fragments, cap))
+
+    chunk_size = options.get("http_chunk_size") or settings.http_chunk_size
+    if chunk_size:
+        ydl_opts['http_chunk_size'] = chunk_size
+
+    buffer_size = options.get("buffer_size") or settings.download_buffer_size
+    if buffer_size:
+        ydl_opts['buffersize'] = buffer_size
+        ydl_opts['noresizebuffer'] = True
+
+    external = options.get("external_downloader") or settings.external_downloader
+    if not external or external == "native":
+        return
+    if external != settings.external_downloader and external not in allowed_external_downloaders():
+        logger.warning("External downloader not allowed, using native", extra={"downloader": external})
+        return
+    if shutil.which(external) is None:
+        logger.warning("External downloader not found, using native", extra={"downloader": external})
+        return
+
+    ydl_opts['external_downloader'] = {'default': external}
+    args = shlex.split(settings.external_downloader_args) if settings.external_downloader_args else []
+    if external == "aria2c":
+        connections = str(min(cap, _ARIA2C_MAX_CONNECTIONS))
+        args = ["-x", connections, "-s", connections] + args
+    if args:
+        ydl_opts['external_downloader_args'] = {external: args}
+
+
+# 限速时每次读取的块大小：块越小流量越平滑（yt-dlp 默认会把块增大到 4MB，限速时形成突发）
+_THROTTLED_BLOCK_SIZE = 128 * 1024
+
+
+def _make_throttle_hook(throttle: Callable[[int], None]) -> Callable[[Dict[str, Any]], None]:
+    """把 yt-dlp 每个数据块的进度回调转换为读取字节数的增量"""
+    last: Dict[str, int] = {}
+
+    def hook(d: Dict[str, Any]) -> None:
+        if d.get("status") != "downloading":
+            return
+        name = d.get("tmpfilename") or d.get("filename") or ""
+        downloaded = d.get("downloaded_bytes") or 0
+        delta = downloaded - last.get(name, 0)
+        last[name] = downloaded
+        if delta > 0:
+            throttle(delta)
+
+    return hook
+
+
+def download_video(
+    url: str,
+    output_path: str = "./downloads",
+    format: str = "best",
+    quiet: bool = False,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    info: Optional[Dict[str, Any]] = None,
+    options: Optional[Dict[str, Any]] = None,
+    throttle: Optional[Callable[[int], None]] = None,
+    rate_limit: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    下载视频
+
+    Args:
+        progress_callback: 进度回调，接收节流后的进度字典（phase、downloaded_bytes、total_bytes、speed、eta 等）
+        info: 已提取的视频信息（get_video_info 的结果），提供时跳过提取直接下载
+        options: 传输参数（DOWNLOAD_OPTION_KEYS），未提供的使用全局配置
+        throttle: 带宽控制回调，在下载线程中以每个数据块的字节数调用，超出分配速率时由回调休眠
+        rate_limit: 下载开始时分配到的速率（字节/秒）；无法使用 throttle 的场景
+            （外部下载器、worker 进程）以 yt-dlp 的 ratelimit 固定为该值
+    """
     os.makedirs(output_path, exist_ok=True)
     ydl_opts = {
         'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
@@ -16,23 +128,43 @@ def download_video(url: str, output_path: str = "./downloads", format: str = "be
         'no_warnings': quiet,
         'format': format,
         'no_abort_on_error': True,
+        # 断点续传：保留 .part 文件和分片下载状态（.ytdl），重启后重新执行同一任务时从中断处继续
+        # 输出文件名只由视频信息决定，因此同一任务再次下载时会找到上次的 .part 文件
+        'continuedl': True,
+        'nopart': False,
     }
+    if progress_callback:
+        ydl_opts.update(make_progress_hooks(progress_callback, settings.progress_interval))
 
-    # 只有 91porn 的视频下载才使用 Cookie
-    if '91porn' in url.lower() and settings.porn91_cookie:
-        ydl_opts['http_headers'] = {
-            'Cookie': settings.porn91_cookie
-        }
+    _apply_download_options(ydl_opts, options)
+    _apply_site_options(ydl_opts, url)
+
+    if throttle:
+        ydl_opts.setdefault('progress_hooks', []).append(_make_throttle_hook(throttle))
+    if rate_limit:
+        if 'buffersize' not in ydl_opts:
+            ydl_opts['buffersize'] = _THROTTLED_BLOCK_SIZE
+            ydl_opts['noresizebuffer'] = True
+        if not throttle or 'external_downloader' in ydl_opts:
+            ydl_opts['ratelimit'] = rate_limit
 
     logger.info("Starting video download", extra={
         "url": url,
         "output_path": output_path,
         "format": format
     })
+    # yt-dlp 在第一次使用时才导入（启动后由预热提前加载），不拖慢服务启动
+    import yt_dlp
+
     logger.debug("YTDLP VERSION ============== ", extra={"version": yt_dlp.version.__version__})
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+            if info:
+                # 与 --load-info-json 相同：基于已有信息重新选择格式并下载
+                logger.debug("Downloading with cached info", extra={"url": url})
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
             result = ydl.sanitize_info(info)
             logger.info("Video download completed", extra={
                 "url": url,
@@ -47,15 +179,24 @@ def download_video(url: str, output_path: str = "./downloads", format: str = "be
         raise
 
 
-def get_video_info(url: str, quiet: bool = False) -> Dict[str, Any]:
-    """获取视频信息"""
+def get_video_info(url: str, quiet: bool = False, format: Optional[str] = None) -> Dict[str, Any]:
+    """
+    获取视频信息
+
+    Args:
+        format: 格式选择，提供时 requested_formats 为该格式选中的格式（与下载时一致），否则按 yt-dlp 默认格式选择
+    """
     ydl_opts = {
         'quiet': quiet,
         'no_warnings': quiet,
         'skip_download': True,
     }
+    if format:
+        ydl_opts['format'] = format
+    _apply_site_options(ydl_opts, url)
 
     logger.debug("Fetching video info", extra={"url": url})
+    import yt_dlp
 
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -74,6 +215,25 @@ def get_video_info(url: str, quiet: bool = False) -> Dict[str, Any]:
         raise
 
 
+def select_formats(info: Dict[str, Any], format: str) -> Dict[str, Any]:
+    """
+    基于已提取的视频信息按 format 重新选择格式（与 --load-info-json 相同，不重新提取）
+
+    返回信息的 requested_formats 与按该格式下载时一致，用于下载前估算大小
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'format': format,
+    }
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # process_ie_result 会修改传入的信息，缓存中的信息由多个请求共享
+        return ydl.sanitize_info(ydl.process_ie_result(copy.deepcopy(info), download=False))
+
+
 def list_available_formats(url: str) -> List[Dict[str, Any]]:
     """列出可用的视频格式"""
     logger.debug("Listing available formats", extra={"url": url})
@@ -94,3 +254,18 @@ def list_available_formats(url: str) -> List[Dict[str, Any]]:
             "error": str(e)
         })
         raise
+
+
+def warm_up() -> None:
+    """
+    预热：导入 yt-dlp 的全部提取器并编译它们的 URL 正则
+
+    第一次提取时 yt-dlp 会依次用每个提取器的 _VALID_URL 匹配 URL，上千个正则的编译结果缓存在提取器类上，
+    提前编译后第一个请求不再承担这部分耗时
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+    from app.core.canonical import build_extractor_index
+
+    build_extractor_index()
+    for ie in gen_extractor_classes():
+        ie.suitable("")
@@ -0,0 +1,161 @@
+"""
+已下载文件复用模块
+同一视频以其他 output_path 再次请求时，从已完成任务的文件生成副本（硬链接 / reflink / 复制），不再重新下载
+"""
+import errno
+import hashlib
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.logger import logger
+
+# Linux FICLONE ioctl（btrfs / xfs 等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+_CHUNK_SIZE = 1024 * 1024
+
+
+def final_files(info: Dict[str, Any]) -> List[str]:
+    """下载结果中的最终文件（合并/后处理之后），返回存在的绝对路径"""
+    paths = [download.get("filepath") for download in info.get("requested_downloads") or []]
+    if not any(paths):
+        paths = [info.get("filepath") or info.get("_filename")]
+    return [
+        os.path.abspath(path) for path in dict.fromkeys(paths)
+        if path and os.path.isfile(path)
+    ]
+
+
+def file_checksum(path: str) -> str:
+    """文件内容的 SHA-256（分块读取）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_files(info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """计算最终文件的大小和校验和（读取整个文件，应在线程中调用）"""
+    return [
+        {
+            "path": path,
+            "size": os.path.getsize(path),
+            "checksum": file_checksum(path),
+            "method": "download",
+        }
+        for path in final_files(info)
+    ]
+
+
+def needs_reuse(files: List[Dict[str, Any]], output_path: str) -> bool:
+    """已记录的文件中是否有文件名在 output_path 下还没有副本（只比较记录，不访问文件系统）"""
+    output_dir = os.path.abspath(output_path)
+    names = {os.path.basename(file["path"]) for file in files}
+    present = {os.path.basename(file["path"]) for file in files if os.path.dirname(file["path"]) == output_dir}
+    return bool(names - present)
+
+
+def _verified(candidates: Tuple[Dict[str, Any], ...]) -> Optional[Dict[str, Any]]:
+    """返回内容与记录的校验和一致的第一个源文件（文件被替换或损坏时跳过）"""
+    for file in candidates:
+        if file_checksum(file["path"]) == file["checksum"]:
+            return file
+        logger.warning("Downloaded file checksum mismatch, not reusing", extra={"path": file["path"]})
+    return None
+
+
+def _same_content(target: str, source: Dict[str, Any]) -> bool:
+    if os.path.getsize(target) != source["size"]:
+        return False
+    return os.path.samefile(target, source["path"]) or file_checksum(target) == source["checksum"]
+
+
+def _reflink(source: str, target: str) -> None:
+    import fcntl
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
+
+
+def _place(source: str, target: str, allow_copy: bool) -> str:
+    """在 target 生成 source 的副本，返回使用的方式"""
+    try:
+        os.link(source, target)
+        return "hardlink"
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            raise
+    try:
+        _reflink(source, target)
+        return "reflink"
+    except (OSError, ImportError):
+        pass
+    if not allow_copy:
+        raise OSError(errno.EXDEV, "Hardlink and reflink not supported", target)
+    # 先复制到临时文件再改名，中断时不会留下不完整的目标文件
+    tmp = f"{target}.reuse-{os.getpid()}"
+    try:
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return "copy"
+
+
+def materialize(
+    files: List[Dict[str, Any]],
+    output_path: str,
+    mode: str = "auto"
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    把已下载的文件放到 output_path 下（文件名不变，读取整个源文件校验，应在线程中调用）
+
+    Args:
+        files: 同一任务已记录的文件（path、size、checksum），同名文件任选一份大小和校验和一致的作为源
+        output_path: 目标目录
+        mode: auto 允许跨文件系统复制，link 只使用硬链接/reflink
+
+    Returns:
+        新生成的文件记录（目标已存在且内容一致时不包含在内）；没有可用的源文件时返回 None
+    """
+    output_dir = os.path.abspath(output_path)
+    sources: Dict[str, Tuple[Dict[str, Any], ...]] = {}
+    for file in files:
+        sources.setdefault(os.path.basename(file["path"]), ())
+        if os.path.isfile(file["path"]) and os.path.getsize(file["path"]) == file["size"]:
+            sources[os.path.basename(file["path"])] += (file,)
+    if not sources or not all(sources.values()):
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    placed = []
+    for name, candidates in sources.items():
+        target = os.path.join(output_dir, name)
+        if any(os.path.dirname(file["path"]) == output_dir for file in candidates):
+            continue
+        source = _verified(candidates)
+        if source is None:
+            return None
+        if os.path.isfile(target) and _same_content(target, source):
+            continue
+        try:
+            method = _place(source["path"], target, allow_copy=mode == "auto")
+        except FileExistsError:
+            # 并发请求已生成同一目标
+            continue
+        except OSError as e:
+            logger.warning("Failed to reuse downloaded file", extra={
+                "source": source["path"],
+                "target": target,
+                "error": str(e)
+            })
+            return None
+        placed.append({**source, "path": target, "method": method})
+    return placed
@@ -0,0 +1,180 @@
+"""
+按站点的自适应并发限制
+以提取器（无法识别时为主机名）为键，按 AIMD 规则根据限流错误和吞吐量调整每个站点的并发上限
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from app.config import settings
+from app.core.canonical import canonical_video_key
+from app.utils.logger import logger
+
+# 视为被源站限流的错误
+_THROTTLE_PATTERN = re.compile(
+    r"HTTP Error (429|403|503)|Too Many Requests|rate.?limit|timed out|Connection reset",
+    re.IGNORECASE
+)
+
+
+def limit_key(url: str) -> str:
+    """并发限制的键：能识别出提取器时使用 ie_key（youtu.be 与 youtube.com 共享限制），否则使用主机名"""
+    key = canonical_video_key(url)
+    if key:
+        return key[0]
+    return (urlparse(url).hostname or "").lower() or "unknown"
+
+
+def is_throttle_error(error: str) -> bool:
+    return bool(_THROTTLE_PATTERN.search(error or ""))
+
+
+class _HostState:
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+        self.throughput = 0.0  # 站点总吞吐量（字节/秒）的滑动平均
+        self.last_decrease = 0.0
+
+
+class HostLimiter:
+    """
+    站点并发限制器
+
+    - 加性增：下载成功且站点总吞吐量没有下降时，上限每轮（limit 个成功任务）增加 1
+    - 乘性减：出现限流错误（429/403/超时等）时，上限乘以 decrease_factor，冷却期内只减一次
+    - 上限在 [min_limit, max_limit] 之间，实际并发取上限的整数部分
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float = 0.5,
+        cooldown: float = 30.0
+    ):
+        self._initial = initial
+        self._min = max(1, min_limit)
+        self._max = max(self._min, max_limit)
+        self._decrease_factor = decrease_factor
+        self._cooldown = cooldown
+        self._hosts: Dict[str, _HostState] = {}
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _state(self, key: str) -> _HostState:
+        state = self._hosts.get(key)
+        if state is None:
+            state = _HostState(float(min(max(self._initial, self._min), self._max)))
+            self._hosts[key] = state
+        return state
+
+    def limit(self, key: str) -> int:
+        return int(self._state(key).limit)
+
+    def has_capacity(self, key: str) -> bool:
+        state = self._state(key)
+        return state.active < int(state.limit)
+
+    def acquire_nowait(self, key: str) -> None:
+        """占用一个并发名额（调用方已确认 has_capacity）"""
+        self._state(key).active += 1
+
+    async def acquire(self, key: str) -> None:
+        """等待并占用一个并发名额（不经过调度器的调用方使用，例如分布式 worker）"""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            while not self.has_capacity(key):
+                await self._cond.wait()
+            self.acquire_nowait(key)
+
+    def release(self, key: str) -> None:
+        state = self._state(key)
+        state.active = max(0, state.active - 1)
+        if self._cond is not None:
+            asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def observe(
+        self,
+        key: str,
+        error: Optional[str] = None,
+        size: Optional[int] = None,
+        seconds: Optional[float] = None
+    ) -> None:
+        """
+        记录一次下载的结果并调整上限
+
+        Args:
+            key: limit_key
+            error: 失败时的错误信息
+            size: 下载的字节数
+            seconds: 下载耗时
+        """
+        state = self._state(key)
+        old_limit = state.limit
+        if error is not None:
+            state.failed += 1
+            if not is_throttle_error(error):
+                return
+            state.throttled += 1
+            now = time.monotonic()
+            if now - state.last_decrease < self._cooldown:
+                return
+            state.last_decrease = now
+            state.limit = max(float(self._min), state.limit * self._decrease_factor)
+        else:
+            state.completed += 1
+            improving = True
+            if size and seconds:
+                # 单个任务的速率乘以当前并发数估算站点总吞吐量，增加并发后总吞吐量明显下降时不再增加
+                aggregate = size / seconds * max(1, state.active)
+                improving = not state.throughput or aggregate >= state.throughput * 0.9
+                state.throughput = aggregate if not state.throughput else (
+                    0.8 * state.throughput + 0.2 * aggregate
+                )
+            if improving:
+                state.limit = min(float(self._max), state.limit + 1 / state.limit)
+
+        if int(state.limit) != int(old_limit):
+            logger.info("Host concurrency limit changed", extra={
+                "key": key,
+                "old_limit": int(old_limit),
+                "new_limit": int(state.limit),
+                "throttled": error is not None
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "min": self._min,
+            "max": self._max,
+            "hosts": {
+                key: {
+                    "limit": int(state.limit),
+                    "active": state.active,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "throttled": state.throttled,
+                    "throughput": round(state.throughput),
+                }
+                for key, state in sorted(self._hosts.items())
+            },
+        }
+
+
+# 全局站点并发限制器（HOST_LIMITS_ENABLED=false 时为 None）
+host_limiter = HostLimiter(
+    initial=settings.host_limit_initial,
+    min_limit=settings.host_limit_min,
+    max_limit=settings.host_limit_max or settings.max_concurrent_downloads,
+    decrease_factor=settings.host_limit_decrease_factor,
+    cooldown=settings.host_limit_cooldown
+) if settings.host_limits_enabled else None
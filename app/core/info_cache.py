@@ -0,0 +1,118 @@
+"""
+视频信息缓存模块
+有界的 TTL + LRU 缓存，并对同一 URL 的并发提取做合并（single-flight）
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.core.canonical import canonical_video_key
+
+
+async def info_cache_key(url: str, format: Optional[str] = None) -> str:
+    """
+    缓存键：能识别出视频时使用 (extractor, video_id)，使 URL 变体共享缓存
+
+    按指定格式提取的信息（requested_formats 不同）使用单独的键
+    """
+    key = await asyncio.to_thread(canonical_video_key, url)
+    base = f"{key[0]}:{key[1]}" if key else url
+    return f"{base}|{format}" if format else base
+
+
+class InfoCache:
+    """
+    视频信息缓存
+
+    - 超过 ttl 的条目视为失效（格式直链通常带签名，会过期）
+    - 条目数超过 max_entries 时淘汰最久未使用的条目
+    - 同一个键同时只会有一次提取在进行，其余请求等待同一结果
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的缓存条目"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, info = entry
+            if time.monotonic() - stored_at > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return info
+
+    def put(self, key: str, info: Dict[str, Any]) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        读取缓存，未命中时调用 fetch 提取
+
+        同一个键的并发请求共享一次 fetch，fetch 失败时所有等待者收到同一个异常
+        """
+        info = self.get(key)
+        if info is not None:
+            self._hits += 1
+            return info
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            info = await fetch()
+            self.put(key, info)
+            future.set_result(info)
+            return info
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "ttl": self._ttl,
+            "inflight": len(self._inflight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+        }
+
+
+# 全局视频信息缓存
+info_cache = InfoCache(max_entries=settings.info_cache_size, ttl=settings.info_cache_ttl)
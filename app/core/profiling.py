@@ -0,0 +1,109 @@
+"""
+按需性能分析
+管理员为某个任务（或下一个开始执行的任务）开启后，该任务的下载在 cProfile 下执行，结果保存为 .prof 文件
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+from typing import Any, Callable, List, Optional
+from app.config import settings
+from app.utils.logger import logger
+
+# 表示"下一个开始执行的任务"
+NEXT_TASK = "next"
+
+# 同一进程同时只能有一个 cProfile 在运行（Python 3.12+ 第二个会抛出 ValueError）
+_profiler_lock = threading.Lock()
+
+
+class ProfileRequests:
+    """
+    待分析的任务（线程安全，只在执行下载的进程中有效）
+
+    同时只允许一个分析：已有请求等待执行或正在分析时，新的请求被拒绝
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requested: set = set()
+        self._running: Optional[str] = None
+
+    def request(self, task_id: str = NEXT_TASK) -> bool:
+        """登记分析请求，已有请求等待执行或正在分析时返回 False"""
+        with self._lock:
+            if self._requested or self._running is not None:
+                return False
+            self._requested.add(task_id)
+            return True
+
+    def cancel(self, task_id: str = NEXT_TASK) -> bool:
+        with self._lock:
+            if task_id not in self._requested:
+                return False
+            self._requested.discard(task_id)
+            return True
+
+    def take(self, task_id: str) -> Optional[str]:
+        """任务开始执行时调用：需要分析时取走请求并返回 .prof 文件路径，分析结束后调用 finish"""
+        with self._lock:
+            if task_id in self._requested:
+                self._requested.discard(task_id)
+            elif NEXT_TASK in self._requested:
+                self._requested.discard(NEXT_TASK)
+            else:
+                return None
+            self._running = task_id
+        return profile_path(task_id)
+
+    def finish(self, task_id: str) -> None:
+        with self._lock:
+            if self._running == task_id:
+                self._running = None
+
+    @property
+    def running(self) -> Optional[str]:
+        return self._running
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return sorted(self._requested)
+
+
+def profile_path(task_id: str) -> str:
+    return os.path.join(os.path.abspath(settings.profile_dir), f"{task_id}.prof")
+
+
+def run_profiled(path: Optional[str], func: Callable[[], Any]) -> Any:
+    """
+    执行 func，path 不为空时在 cProfile 下执行并把统计写入 path
+
+    cProfile 只统计当前线程，分片并发下载的子线程不在其中；
+    本进程已有分析在运行时不做分析，直接执行 func
+    """
+    if not path:
+        return func()
+    if not _profiler_lock.acquire(blocking=False):
+        logger.warning("Another profile is running, skipping", extra={"path": path})
+        return func()
+    try:
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func)
+        finally:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profiler.dump_stats(path)
+    finally:
+        _profiler_lock.release()
+
+
+def summarize(path: str, sort: str = "cumulative", limit: int = 50) -> str:
+    """.prof 文件的文本摘要（pstats 输出）"""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+# 全局分析请求
+profile_requests = ProfileRequests()
@@ -0,0 +1,180 @@
+"""
+下载进度模块
+保存正在执行任务的实时进度（仅内存，不写数据库）
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from app.config import settings
+
+# 终止阶段
+TERMINAL_PHASES = ("completed", "failed")
+
+
+def make_progress_hooks(
+    callback: Callable[[Dict[str, Any]], None],
+    min_interval: float = 0.5
+) -> Dict[str, list]:
+    """
+    构造 yt-dlp 的 progress_hooks / postprocessor_hooks
+
+    下载中的回调按 min_interval 节流，阶段变化（开始、完成、后处理）总是立即回调
+
+    Returns:
+        可直接合并进 ydl_opts 的字典
+    """
+    last = {"time": 0.0, "phase": None}
+
+    def emit(data: Dict[str, Any], force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and data["phase"] == last["phase"] and now - last["time"] < min_interval:
+            return
+        last["time"] = now
+        last["phase"] = data["phase"]
+        callback(data)
+
+    def progress_hook(d: Dict[str, Any]) -> None:
+        status = d.get("status")
+        data = {
+            "phase": "downloading",
+            "filename": d.get("filename"),
+            "downloaded_bytes": d.get("downloaded_bytes"),
+            "total_bytes": d.get("total_bytes") or d.get("total_bytes_estimate"),
+            "speed": d.get("speed"),
+            "eta": d.get("eta"),
+            "fragment_index": d.get("fragment_index"),
+            "fragment_count": d.get("fragment_count"),
+        }
+        emit(data, force=status in ("finished", "error"))
+
+    def postprocessor_hook(d: Dict[str, Any]) -> None:
+        status = d.get("status")
+        emit({
+            "phase": "postprocessing",
+            "postprocessor": d.get("postprocessor"),
+            "postprocessor_status": status,
+        }, force=status in ("started", "finished"))
+
+    return {
+        "progress_hooks": [progress_hook],
+        "postprocessor_hooks": [postprocessor_hook],
+    }
+
+
+def task_timings(timeline: Dict[str, float], finished: float) -> Dict[str, float]:
+    """
+    把阶段时间线转换为任务记录中保存的各阶段时间戳
+
+    - queued_at: 进入调度队列
+    - started_at: 开始执行（提取信息）
+    - extracted_at: 信息提取完成（下载前已提取时为 extracted 时间点，否则为开始下载的时间）
+    - downloaded_at: 网络下载完成（开始后处理，或没有后处理时为结束时间）
+    - postprocessed_at: 后处理（合并/修复）完成
+    - finished_at: 执行结束
+    """
+    downloading = timeline.get("downloading")
+    postprocessing = timeline.get("postprocessing")
+    timings = {
+        "queued_at": timeline.get("queued"),
+        "started_at": timeline.get("extracting"),
+        "extracted_at": timeline.get("extracted") or downloading or postprocessing,
+        "downloaded_at": (postprocessing or finished) if downloading else None,
+        "postprocessed_at": finished if postprocessing else None,
+        "finished_at": finished,
+    }
+    return {key: round(value, 3) for key, value in timings.items() if value is not None}
+
+
+class ProgressStore:
+    """
+    线程安全的任务进度存储
+
+    每条记录带有递增的 version，推送端只需比较 version 即可发现变化；
+    终止阶段的记录保留 retention 秒后清除。
+    另外记录每个任务进入各阶段的时间（时间线），回到 queued 时重新开始，由执行方在任务结束时取走
+    """
+
+    def __init__(self, retention: float = 60.0):
+        self._retention = retention
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._timelines: Dict[str, Dict[str, float]] = {}
+        self._version = 0
+
+    def update(self, task_id: str, data: Dict[str, Any]) -> None:
+        """合并更新任务进度"""
+        with self._lock:
+            self._version += 1
+            entry = self._entries.get(task_id)
+            if entry is None or data.get("phase") != entry.get("phase"):
+                # 阶段变化时丢弃上一阶段的字段
+                entry = {"task_id": task_id}
+                self._entries[task_id] = entry
+                phase = data.get("phase")
+                if phase == "queued":
+                    self._timelines[task_id] = {}
+                if phase:
+                    self._timelines.setdefault(task_id, {}).setdefault(phase, time.time())
+            entry.update({k: v for k, v in data.items() if v is not None})
+            entry["version"] = self._version
+            entry["updated_at"] = time.time()
+            if self._version % 256 == 0:
+                self._prune()
+
+    def set_phase(self, task_id: str, phase: str, **fields) -> None:
+        """设置任务阶段"""
+        self.update(task_id, {"phase": phase, **fields})
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            return dict(entry) if entry else None
+
+    def get_many(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                task_id: dict(self._entries[task_id])
+                for task_id in task_ids
+                if task_id in self._entries
+            }
+
+    def mark(self, task_id: str, name: str) -> None:
+        """在时间线上记录一个不改变阶段的时间点（例如信息提取完成）"""
+        with self._lock:
+            self._timelines.setdefault(task_id, {}).setdefault(name, time.time())
+
+    def pop_timeline(self, task_id: str) -> Dict[str, float]:
+        """取走任务的阶段时间线（阶段名 -> 首次进入该阶段的时间戳）"""
+        with self._lock:
+            return self._timelines.pop(task_id, {})
+
+    def total_speed(self) -> float:
+        """下载中任务的当前速率之和（字节/秒）"""
+        with self._lock:
+            return sum(
+                entry.get("speed") or 0 for entry in self._entries.values()
+                if entry.get("phase") == "downloading"
+            )
+
+    def _prune(self) -> None:
+        expire_before = time.time() - self._retention
+        expired = [
+            task_id for task_id, entry in self._entries.items()
+            if entry.get("phase") in TERMINAL_PHASES and entry["updated_at"] < expire_before
+        ]
+        for task_id in expired:
+            del self._entries[task_id]
+        for task_id in [task_id for task_id in self._timelines if task_id not in self._entries]:
+            del self._timelines[task_id]
+
+    def prune(self) -> None:
+        """清除过期的终止阶段记录"""
+        with self._lock:
+            self._prune()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全局进度存储
+progress_store = ProgressStore(retention=settings.progress_retention)
@@ -0,0 +1,317 @@
+"""
+下载调度模块
+按优先级排队下载任务，并使用固定数量的 worker 限制并发下载数
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.utils.logger import logger
+from app.utils.metrics import QUEUE_WAIT
+
+
+@dataclass
+class DownloadJob:
+    """排队中的下载任务"""
+    task_id: str
+    url: str
+    output_path: str
+    format: str
+    quiet: bool = False
+    priority: int = 0
+    key: str = ""  # 站点并发限制的键（host_limiter.limit_key）
+    options: Optional[Dict[str, Any]] = None  # 传输参数，透传给 download_video
+    size: Optional[int] = None  # 估算的磁盘占用（字节），被退回队列时设置（大小未知为 0），None 表示不检查
+    enqueue_time: float = field(default_factory=time.monotonic)
+    seq: int = 0  # 提交顺序，退回队列后仍按原顺序排队
+
+
+class QueueFullError(Exception):
+    """调度队列已满"""
+
+
+class JobDeferred(Exception):
+    """任务暂时无法执行（例如磁盘空间不足），由调度器放回队列"""
+
+    def __init__(self, message: str, size: Optional[int] = None):
+        super().__init__(message)
+        self.size = size
+
+
+class DownloadScheduler:
+    """
+    有界优先级调度器
+
+    - 数值越大优先级越高，同优先级按提交顺序（FIFO）执行
+    - 同时运行的任务数不超过 concurrency
+    - 提供 limiter 时，每个站点（job.key）各自排队，只从未达到站点并发上限的队列中取任务，
+      某个站点的任务积压不会占住 worker 阻塞其他站点
+    - 队列中只保存轻量的 DownloadJob，不会为每个任务预先创建协程
+    - 入库前通过 reserve 预留排队名额，并发提交不会在写入数据库之后才发现队列已满
+    - runner 抛出 JobDeferred 时任务按原顺序放回队列；提供 admission 时，
+      已知大小（job.size）的队首任务只有在 admission(job) 为 True 时才会被取出，
+      期间每 recheck_interval 秒重新检查一次
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[DownloadJob], Awaitable[Any]],
+        concurrency: int,
+        max_queue_size: int = 0,
+        limiter: Optional[Any] = None,
+        admission: Optional[Callable[[DownloadJob], bool]] = None,
+        recheck_interval: float = 30.0
+    ):
+        """
+        Args:
+            runner: 执行单个任务的协程函数
+            concurrency: 最大并发数
+            max_queue_size: 最大排队数（0 表示不限制）
+            limiter: 站点并发限制器（HostLimiter），None 表示只限制总并发
+            admission: 被退回过的任务能否开始（例如磁盘空间检查）
+            recheck_interval: 有任务被 admission 挡住时重新检查的间隔（秒）
+        """
+        self._runner = runner
+        self._concurrency = max(1, concurrency)
+        self._max_queue_size = max_queue_size
+        self._limiter = limiter
+        self._admission = admission
+        self._recheck_interval = recheck_interval
+        self._blocked = False
+        self._deferred = 0
+        # 按站点分开的优先级队列
+        self._heaps: Dict[str, List[Tuple[int, int, DownloadJob]]] = {}
+        self._size = 0
+        self._reserved = 0  # 已预留但尚未提交的排队名额
+        self._counter = itertools.count()
+        self._queued_ids: Set[str] = set()
+        self._active: Dict[str, DownloadJob] = {}
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._completed = 0
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    @property
+    def max_queue_size(self) -> int:
+        return self._max_queue_size
+
+    @property
+    def queued(self) -> int:
+        return self._size
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    def _ensure_started(self) -> None:
+        """在当前事件循环中启动 worker（惰性启动）"""
+        if self._workers:
+            return
+        self._cond = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"download-worker-{i}")
+            for i in range(self._concurrency)
+        ]
+        logger.info("Download scheduler started", extra={
+            "concurrency": self._concurrency,
+            "max_queue_size": self._max_queue_size
+        })
+
+    @property
+    def reserved(self) -> int:
+        return self._reserved
+
+    def is_full(self) -> bool:
+        """排队数（含已预留的名额）是否已达到上限"""
+        return bool(self._max_queue_size) and self._size + self._reserved >= self._max_queue_size
+
+    def reserve(self, count: int) -> None:
+        """
+        为即将提交的 count 个任务预留排队名额
+
+        预留的名额由 submit(job, reserved=True) 消耗，未用完的必须通过 unreserve 归还
+
+        Raises:
+            QueueFullError: 剩余名额不足 count 个
+        """
+        if self._max_queue_size and self._size + self._reserved + count > self._max_queue_size:
+            raise QueueFullError(f"Download queue is full ({self._max_queue_size})")
+        self._reserved += count
+
+    def unreserve(self, count: int) -> None:
+        """归还未使用的预留名额"""
+        self._reserved = max(0, self._reserved - count)
+
+    def is_scheduled(self, task_id: str) -> bool:
+        """任务是否已在排队或执行中"""
+        return task_id in self._queued_ids or task_id in self._active
+
+    async def submit(self, job: DownloadJob, reserved: bool = False) -> bool:
+        """
+        提交任务
+
+        Args:
+            job: 下载任务
+            reserved: 使用之前 reserve 的名额（只有成功入队时才消耗一个名额）
+
+        Returns:
+            True 表示已入队，False 表示任务已在排队或执行中
+
+        Raises:
+            QueueFullError: 排队数达到 max_queue_size（reserved 为 False 时）
+        """
+        self._ensure_started()
+        async with self._cond:
+            # 在锁内检查和入队，等待锁期间其他提交不会占用同一个名额
+            if self.is_scheduled(job.task_id):
+                return False
+            if reserved:
+                self.unreserve(1)
+            elif self.is_full():
+                raise QueueFullError(f"Download queue is full ({self._max_queue_size})")
+            job.seq = next(self._counter)
+            self._push(job)
+            self._cond.notify()
+
+        logger.debug("Job enqueued", extra={
+            "task_id": job.task_id,
+            "priority": job.priority,
+            "key": job.key,
+            "queued": self._size
+        })
+        return True
+
+    def _push(self, job: DownloadJob) -> None:
+        heapq.heappush(self._heaps.setdefault(job.key, []), (-job.priority, job.seq, job))
+        self._size += 1
+        self._queued_ids.add(job.task_id)
+
+    def _admitted(self, job: DownloadJob) -> bool:
+        if self._admission is None or job.size is None:
+            return True
+        try:
+            return self._admission(job)
+        except Exception as e:
+            logger.error("Admission check failed", extra={"task_id": job.task_id, "error": str(e)})
+            return True
+
+    def _pick(self) -> Optional[str]:
+        """在有空闲名额的站点中选出队首优先级最高（同优先级最早提交）的站点"""
+        best = None
+        self._blocked = False
+        for key, heap in self._heaps.items():
+            if self._limiter is not None and not self._limiter.has_capacity(key):
+                continue
+            if not self._admitted(heap[0][2]):
+                self._blocked = True
+                continue
+            if best is None or heap[0][:2] < self._heaps[best][0][:2]:
+                best = key
+        return best
+
+    async def _next_job(self) -> DownloadJob:
+        async with self._cond:
+            while True:
+                key = self._pick()
+                if key is not None:
+                    break
+                if self._blocked:
+                    # 空间可能被外部释放，定期重新检查
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), self._recheck_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._cond.wait()
+            heap = self._heaps[key]
+            _, _, job = heapq.heappop(heap)
+            if not heap:
+                del self._heaps[key]
+            self._size -= 1
+            if self._limiter is not None:
+                self._limiter.acquire_nowait(key)
+            self._queued_ids.discard(job.task_id)
+            self._active[job.task_id] = job
+            QUEUE_WAIT.observe(time.monotonic() - job.enqueue_time)
+            return job
+
+    async def _release(self, job: DownloadJob, deferred: bool = False) -> None:
+        """任务结束或被退回：归还站点名额并唤醒等待的 worker"""
+        self._active.pop(job.task_id, None)
+        if self._limiter is not None:
+            self._limiter.release(job.key)
+        if deferred:
+            self._deferred += 1
+            async with self._cond:
+                self._push(job)
+                self._cond.notify_all()
+            return
+        self._completed += 1
+        if self._limiter is not None or self._admission is not None:
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._next_job()
+            deferred = False
+            try:
+                await self._runner(job)
+            except asyncio.CancelledError:
+                raise
+            except JobDeferred as e:
+                deferred = True
+                job.size = e.size or 0
+                job.enqueue_time = time.monotonic()
+                logger.info("Job deferred, back to queue", extra={
+                    "task_id": job.task_id,
+                    "reason": str(e)
+                })
+            except Exception as e:
+                logger.error("Scheduler runner raised", extra={
+                    "task_id": job.task_id,
+                    "worker": index,
+                    "error": str(e)
+                })
+            finally:
+                await self._release(job, deferred)
+
+    async def shutdown(self) -> None:
+        """停止所有 worker，排队中的任务会被丢弃（数据库中仍为 pending）"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Download scheduler stopped", extra={"dropped": self._size})
+        self._heaps.clear()
+        self._size = 0
+        self._queued_ids.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """队列状态"""
+        by_priority: Dict[int, int] = {}
+        by_key: Dict[str, int] = {}
+        oldest_wait = 0.0
+        now = time.monotonic()
+        for key, heap in self._heaps.items():
+            by_key[key] = len(heap)
+            for neg_priority, _, job in heap:
+                by_priority[-neg_priority] = by_priority.get(-neg_priority, 0) + 1
+                oldest_wait = max(oldest_wait, now - job.enqueue_time)
+        return {
+            "concurrency": self._concurrency,
+            "max_queue_size": self._max_queue_size,
+            "active": len(self._active),
+            "queued": self._size,
+            "reserved": self._reserved,
+            "queued_by_priority": {str(k): v for k, v in sorted(by_priority.items(), reverse=True)},
+            "queued_by_key": by_key,
+            "oldest_wait_seconds": round(oldest_wait, 3),
+            "completed": self._completed,
+            "deferred": self._deferred,
+        }
@@ -0,0 +1,180 @@
+"""
+任务状态缓存模块
+缓存本进程创建/更新的进行中任务，状态轮询无需访问数据库
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import settings
+from app.utils.logger import logger
+
+# 终止状态的任务不再缓存
+TERMINAL_STATUSES = ("completed", "failed")
+
+InvalidationListener = Callable[[str], None]
+
+
+class TaskCache:
+    """
+    有界的任务状态缓存（写穿透）
+
+    - 本进程写入数据库后同步更新缓存；读操作未命中时，只有本进程正在排队/执行的任务
+      （set_owner_check 注册的回调返回 True）才用数据库中的记录回填（fill），未注册时不回填
+    - 任务进入终止状态时立即移除，超过 ttl 未刷新的条目视为失效；
+      本进程正在下载的任务每次进度回调都会刷新（touch），下载期间的轮询不会因 ttl 回落到数据库
+    - 条目数超过 max_entries 时淘汰最久未更新的条目
+    - 多进程部署时，其他进程执行的任务不会被回填，缓存中只有本进程负责写入的任务；
+      add_listener 可把本进程的写入广播给其他进程（其他进程收到后调用 invalidate），目前没有内置的广播实现
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._listeners: List[InvalidationListener] = []
+        self._owner_check: Optional[Callable[[str], bool]] = None
+        self._version = 0  # 每次写入/移除递增，回填时据此判断读取期间是否有新的写入
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def get(self, task_id: str) -> Optional[Any]:
+        """读取未过期的任务，未命中时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is not None and time.monotonic() - entry[0] > self._ttl:
+                del self._entries[task_id]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry[1]
+
+    def get_many(self, task_ids: Iterable[str]) -> Dict[str, Any]:
+        """批量读取，只返回命中的任务"""
+        found = {}
+        for task_id in task_ids:
+            task = self.get(task_id)
+            if task is not None:
+                found[task_id] = task
+        return found
+
+    def put(self, task_id: str, task: Any) -> None:
+        """
+        写入任务的最新状态（写穿透，在数据库提交之后调用）
+
+        Args:
+            task_id: 任务ID
+            task: 带有 status 属性的任务对象（Task），终止状态会直接移除缓存条目
+        """
+        if not self.enabled:
+            return
+        if task.status in TERMINAL_STATUSES:
+            self.invalidate(task_id, notify=True)
+            return
+        with self._lock:
+            self._version += 1
+            self._store(task_id, task)
+        self._notify(task_id)
+
+    def _store(self, task_id: str, task: Any) -> None:
+        self._entries[task_id] = (time.monotonic(), task)
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    @property
+    def version(self) -> int:
+        """写入版本，读取数据库之前获取，回填时传给 fill"""
+        return self._version
+
+    def fill(self, task_id: str, task: Any, version: int) -> None:
+        """
+        读操作未命中时用数据库中的记录回填（不通知监听者）
+
+        只回填本进程正在排队/执行的任务：其他进程执行的任务在本进程没有写入，
+        回填后轮询会在 ttl 内一直返回旧状态
+
+        Args:
+            version: 读取数据库之前的 version；期间有过写入时放弃回填，避免用旧记录覆盖更新后的状态
+        """
+        if not self.enabled or task.status in TERMINAL_STATUSES:
+            return
+        if self._owner_check is None or not self._owner_check(task_id):
+            return
+        with self._lock:
+            if self._version != version:
+                return
+            self._store(task_id, task)
+
+    def touch(self, task_id: str) -> None:
+        """刷新条目的有效期（任务仍在本进程中执行，缓存的状态依然是最新的）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(task_id)
+            now = time.monotonic()
+            if entry is not None and now - entry[0] <= self._ttl:
+                self._entries[task_id] = (now, entry[1])
+
+    def invalidate(self, task_id: str, notify: bool = False) -> None:
+        """
+        移除缓存条目
+
+        Args:
+            task_id: 任务ID
+            notify: 是否通知监听者（本进程的写入为 True，处理其他进程广播时为 False，避免回环）
+        """
+        with self._lock:
+            self._version += 1
+            self._entries.pop(task_id, None)
+        if notify:
+            self._notify(task_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def set_owner_check(self, check: Callable[[str], bool]) -> None:
+        """注册判断任务是否由本进程执行的回调（调度器的 is_scheduled），fill 只回填这些任务"""
+        self._owner_check = check
+
+    def add_listener(self, listener: InvalidationListener) -> None:
+        """注册失效回调，本进程每次写入任务状态后以 task_id 调用（用于广播给其他进程）"""
+        self._listeners.append(listener)
+
+    def _notify(self, task_id: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(task_id)
+            except Exception as e:
+                logger.error("Task cache listener failed", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "ttl": self._ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+# 全局任务状态缓存
+# 分布式模式下任务由其他进程执行，API 进程不持有任何进行中任务的最新状态，因此禁用
+task_cache = TaskCache(
+    max_entries=settings.task_cache_size if settings.execution_mode == "local" else 0,
+    ttl=settings.task_cache_ttl
+)
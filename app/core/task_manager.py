@@ -1,13 +1,32 @@
 """
 任务管理模块 - 使用SQLAlchemy ORM重构
 """
+import os
+import time
 import uuid
 import json
-from typing import Dict, Any, Optional, List
+import base64
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal, TaskModel, init_database
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, insert, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import sqlite
+from app.db.database import (
+    AsyncSessionLocal, async_engine, TaskModel, TaskInfoModel, MediaFileModel, init_database, hash_url
+)
+from app.db.batch_writer import BatchWriter
+from app.config import settings
+from app.utils.compression import compress, decompress
+from app.core.canonical import VideoKey, canonical_video_key, canonical_video_keys
+from app.core.task_cache import task_cache
 from app.utils.logger import logger
+from app.utils.metrics import TASK_TRANSITIONS
+
+# IN (...) 查询每批的参数数量上限
+IN_CHUNK_SIZE = 500
 
 
 def NormalizeString(s: str) -> str:
@@ -29,6 +48,9 @@ class Task(BaseModel):
     output_path: str
     format: str
     status: str
+    priority: int = 0
+    options: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, float]] = None
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     create_time: str
@@ -38,91 +60,356 @@ class Task(BaseModel):
         from_attributes = True
 
 
-class State:
-    """任务状态管理类"""
+def _to_task(db_task: TaskModel) -> Task:
+    """将数据库记录转换为 Task"""
+    result = json.loads(db_task.result) if db_task.result else None
+    return Task(
+        id=db_task.id,
+        url=db_task.url,
+        video_title=db_task.video_title,
+        output_path=db_task.output_path,
+        format=db_task.format,
+        status=db_task.status,
+        priority=db_task.priority or 0,
+        options=json.loads(db_task.options) if db_task.options else None,
+        timings=json.loads(db_task.timings) if db_task.timings else None,
+        result=result,
+        error=db_task.error,
+        create_time=db_task.create_time.isoformat(),
+        update_time=db_task.update_time.isoformat()
+    )
 
-    def __init__(self):
-        """初始化数据库"""
-        logger.info("Initializing task manager")
-        init_database()
-        logger.info("Task manager initialized successfully")
 
-    def _get_db(self) -> Session:
-        """获取数据库会话"""
-        return SessionLocal()
+# 批量状态查询只读取这些列
+BRIEF_COLUMNS = (TaskModel.id, TaskModel.url, TaskModel.status, TaskModel.result, TaskModel.error)
 
-    def add_task(self, url: str, output_path: str, format: str) -> str:
-        """添加新任务"""
-        task_id = str(uuid.uuid4())
-        db = self._get_db()
-        try:
-            db_task = TaskModel(
-                id=task_id,
-                url=url,
-                output_path=output_path,
-                format=format,
-                status="pending"
+
+def _to_brief(row) -> Dict[str, Any]:
+    """将 BRIEF_COLUMNS 查询结果转换为精简的任务字典"""
+    task_id, url, status, result, error = row
+    brief = {"id": task_id, "url": url, "status": status}
+    if status == "completed" and result:
+        brief["result"] = json.loads(result)
+    elif status == "failed" and error:
+        brief["error"] = error
+    return brief
+
+
+def _brief_from_task(task: Task) -> Dict[str, Any]:
+    """从缓存的 Task 生成与 _to_brief 相同格式的精简字典"""
+    brief = {"id": task.id, "url": task.url, "status": task.status}
+    if task.status == "completed" and task.result:
+        brief["result"] = task.result
+    elif task.status == "failed" and task.error:
+        brief["error"] = task.error
+    return brief
+
+
+def _new_task(
+    task_id: str,
+    url: str,
+    output_path: str,
+    format: str,
+    now: datetime,
+    priority: int = 0,
+    options: Optional[Dict[str, Any]] = None
+) -> Task:
+    """构造新建任务的 Task（用于写穿透缓存，避免再查询一次数据库）"""
+    return Task(
+        id=task_id,
+        url=url,
+        output_path=output_path,
+        format=format,
+        status="pending",
+        priority=priority,
+        options=options,
+        create_time=now.isoformat(),
+        update_time=now.isoformat()
+    )
+
+
+def _dedup_filter(url: str, key: Optional[VideoKey]):
+    """去重条件：同一视频 (extractor, video_id) 或同一 URL"""
+    condition = TaskModel.url_hash == hash_url(url)
+    if key:
+        condition = or_(
+            and_(TaskModel.extractor == key[0], TaskModel.video_id == key[1]),
+            condition
+        )
+    return condition
+
+
+def _insert_ignore(dialect_name: str, model=TaskModel):
+    """
+    构造忽略唯一键冲突的 INSERT 语句
+
+    并发提交同一 URL 时由 url_hash 唯一索引保证只有一条记录写入成功，
+    调用方随后按 url_hash 读回实际的任务ID
+    """
+    if dialect_name == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect_name == "mysql":
+        return insert(model).prefix_with("IGNORE")
+    return insert(model)
+
+
+# /tasks 允许返回的字段
+LIST_FIELDS = (
+    "id", "url", "video_title", "output_path", "format", "status",
+    "result", "error", "create_time", "update_time",
+)
+
+
+def _to_fields(row, fields: List[str]) -> Dict[str, Any]:
+    """将投影查询结果转换为字典"""
+    data = {}
+    for field in fields:
+        value = row[field]
+        if field == "result":
+            value = json.loads(value) if value else None
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        data[field] = value
+    return data
+
+
+def _encode_cursor(update_time: datetime, task_id: str) -> str:
+    raw = json.dumps([update_time.isoformat(), task_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        update_time, task_id = json.loads(raw)
+        return datetime.fromisoformat(update_time), str(task_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def summarize_result(info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从 yt-dlp 的完整视频信息中提取保存在任务记录中的摘要
+
+    完整信息包含所有格式、缩略图、字幕链接和请求头，单条可达数百 KB，
+    只保存在 task_info 表中按需读取
+    """
+    downloads = info.get("requested_downloads") or [{}]
+    download = downloads[0]
+    summary = {
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "extractor": info.get("extractor_key") or info.get("extractor"),
+        "webpage_url": info.get("webpage_url"),
+        "duration": info.get("duration"),
+        "format_id": info.get("format_id"),
+        "format": info.get("format"),
+        "ext": download.get("ext") or info.get("ext"),
+        "resolution": info.get("resolution"),
+        "filepath": download.get("filepath") or info.get("filepath") or info.get("_filename"),
+        "filesize": (
+            download.get("filesize") or download.get("filesize_approx")
+            or info.get("filesize") or info.get("filesize_approx")
+        ),
+    }
+    if summary["filesize"] is None and summary["filepath"] and os.path.isfile(summary["filepath"]):
+        summary["filesize"] = os.path.getsize(summary["filepath"])
+    return {k: v for k, v in summary.items() if v is not None}
+
+
+def _prepare_result(task_id: str, result: Dict[str, Any]) -> Tuple[Dict[str, Any], TaskInfoModel]:
+    """生成摘要和压缩后的完整信息记录（CPU 密集，异步调用方应放到线程中执行）"""
+    raw = json.dumps(result, ensure_ascii=False).encode("utf-8")
+    codec, data = compress(raw, settings.info_compression)
+    info_row = TaskInfoModel(task_id=task_id, codec=codec, data=data, raw_size=len(raw))
+    return summarize_result(result), info_row
+
+
+def _load_info(info_row: Optional[TaskInfoModel]) -> Optional[Dict[str, Any]]:
+    if info_row is None:
+        return None
+    return json.loads(decompress(info_row.codec, info_row.data))
+
+
+def _apply_update(
+    db_task: TaskModel,
+    status: str,
+    result: Optional[Dict[str, Any]],
+    error: Optional[str],
+    update_time: bool,
+    timings: Optional[Dict[str, float]] = None
+) -> str:
+    """将状态更新应用到数据库记录上，返回旧状态（result 为摘要）"""
+    old_status = db_task.status
+    db_task.status = status
+    if timings:
+        # persisted_at 取提交前的时间，包含排队等待合并写入的时间
+        db_task.timings = json.dumps({**timings, "persisted_at": time.time()})
+    if result:
+        db_task.result = json.dumps(result)
+        # 从结果中提取视频标题
+        if 'title' in result:
+            db_task.video_title = result['title']
+    if error is not None:  # 允许清除错误信息
+        db_task.error = error
+
+    # 手动更新 update_time（失败重试时）
+    if update_time and status == "pending" and old_status == "failed":
+        db_task.update_time = datetime.now()
+    # 任务结束后释放租约
+    if status in ("completed", "failed"):
+        db_task.lease_owner = None
+        db_task.lease_expires = None
+    return old_status
+
+
+@dataclass
+class _TaskUpdate:
+    """待写入的任务状态更新（result 已转换为摘要和 task_info 记录）"""
+    task_id: str
+    status: str
+    summary: Optional[Dict[str, Any]]
+    info_row: Optional[TaskInfoModel]
+    error: Optional[str]
+    update_time: bool
+    timings: Optional[Dict[str, float]] = None
+    lease_owner: Optional[str] = None  # 只有租约仍属于该 worker 时才写入
+
+
+def _log_update(db_task: TaskModel, old_status: str, status: str, error: Optional[str]) -> None:
+    """记录状态更新日志和状态转换计数"""
+    TASK_TRANSITIONS.labels(old_status, status).inc()
+    log_extra = {
+        "task_id": db_task.id,
+        "old_status": old_status,
+        "new_status": status
+    }
+
+    if error:
+        logger.error("Task failed", extra={**log_extra, "error": error})
+    elif status == "completed":
+        logger.info("Task completed", extra={
+            **log_extra,
+            "video_title": db_task.video_title
+        })
+    elif status == "pending" and old_status == "failed":
+        logger.info("Task reset for retry", extra=log_extra)
+    else:
+        logger.info("Task status updated", extra=log_extra)
+
+
+class AsyncState:
+    """
+    异步任务状态管理类
+
+    使用 SQLAlchemy asyncio 扩展（aiomysql / aiosqlite），
+    供 FastAPI 的 async 处理函数调用，数据库往返不会阻塞事件循环
+    """
+
+    def __init__(self):
+        """创建实例时不连接数据库，由 initialize 建表和执行迁移（应用启动时调用）"""
+        self._count_cache: Dict[Optional[str], Tuple[float, int]] = {}
+        self._writer: Optional[BatchWriter] = None
+        self.initialized = False
+        if async_engine.dialect.name == "sqlite" and settings.sqlite_batch_writes:
+            # SQLite 同时只允许一个写事务，由单个写入协程合并各任务的状态更新
+            self._writer = BatchWriter(
+                self._write_updates,
+                interval=settings.write_batch_interval_ms / 1000,
+                max_batch_size=min(settings.write_batch_max_size, IN_CHUNK_SIZE)
             )
-            db.add(db_task)
-            db.commit()
-            logger.info("Task created", extra={
-                "task_id": task_id,
-                "url": url,
-                "output_path": output_path,
-                "format": format
-            })
-            return task_id
-        except Exception as e:
-            db.rollback()
-            logger.error("Failed to create task", extra={
-                "url": url,
-                "error": str(e)
-            })
-            raise
-        finally:
-            db.close()
 
-    def get_task(self, task_id: str) -> Optional[Task]:
-        """获取单个任务"""
-        db = self._get_db()
-        try:
-            db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-            if not db_task:
-                logger.debug("Task not found", extra={"task_id": task_id})
+    async def initialize(self) -> None:
+        """初始化数据库（建表、执行迁移）"""
+        if self.initialized:
+            return
+        logger.info("Initializing async task manager")
+        await asyncio.to_thread(init_database)
+        self.initialized = True
+        logger.info("Async task manager initialized successfully")
+
+    def _get_db(self) -> AsyncSession:
+        """获取异步数据库会话"""
+        return AsyncSessionLocal()
+
+    async def get_task(self, task_id: str) -> Optional[Task]:
+        """获取单个任务（本进程执行中的任务直接从缓存返回）"""
+        cached = task_cache.get(task_id)
+        if cached is not None:
+            return cached
+        version = task_cache.version
+        async with self._get_db() as db:
+            try:
+                db_task = await db.get(TaskModel, task_id)
+                if not db_task:
+                    logger.debug("Task not found", extra={"task_id": task_id})
+                    return None
+                task = _to_task(db_task)
+                task_cache.fill(task_id, task, version)
+                return task
+            except Exception as e:
+                logger.error("Failed to get task", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
                 return None
 
-            result = json.loads(db_task.result) if db_task.result else None
-            return Task(
-                id=db_task.id,
-                url=db_task.url,
-                video_title=db_task.video_title,
-                output_path=db_task.output_path,
-                format=db_task.format,
-                status=db_task.status,
-                result=result,
-                error=db_task.error,
-                create_time=db_task.create_time.isoformat(),
-                update_time=db_task.update_time.isoformat()
-            )
-        except Exception as e:
-            logger.error("Failed to get task", extra={
-                "task_id": task_id,
-                "error": str(e)
-            })
-            return None
-        finally:
-            db.close()
+    async def get_tasks(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取任务（IN 查询，按 IN_CHUNK_SIZE 分批，只读取 BRIEF_COLUMNS）
+
+        Returns:
+            task_id -> 精简任务字典，不存在的任务不包含在结果中
+        """
+        tasks = {
+            task_id: _brief_from_task(task)
+            for task_id, task in task_cache.get_many(dict.fromkeys(task_ids)).items()
+        }
+        ids = [task_id for task_id in dict.fromkeys(task_ids) if task_id not in tasks]
+        if not ids:
+            return tasks
+        async with self._get_db() as db:
+            try:
+                for i in range(0, len(ids), IN_CHUNK_SIZE):
+                    rows = (await db.execute(
+                        select(*BRIEF_COLUMNS).where(TaskModel.id.in_(ids[i:i + IN_CHUNK_SIZE]))
+                    )).all()
+                    for row in rows:
+                        tasks[row[0]] = _to_brief(row)
+                return tasks
+            except Exception as e:
+                logger.error("Failed to get tasks", extra={
+                    "count": len(task_ids),
+                    "error": str(e)
+                })
+                return {}
+
+    async def get_task_info(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务的完整视频信息（从 task_info 表解压）"""
+        async with self._get_db() as db:
+            try:
+                info_row = await db.get(TaskInfoModel, task_id)
+            except Exception as e:
+                logger.error("Failed to get task info", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
+                return None
+        return await asyncio.to_thread(_load_info, info_row)
 
-    def update_task(
+    async def update_task(
         self,
         task_id: str,
         status: str,
         result: Optional[Dict[str, Any]] = None,
         error: Optional[str] = None,
-        update_time: bool = True
+        update_time: bool = True,
+        timings: Optional[Dict[str, float]] = None,
+        lease_owner: Optional[str] = None
     ) -> None:
         """
-        更新任务状态
+        更新任务状态（SQLite 下与其他任务的更新合并提交）
 
         Args:
             task_id: 任务ID
@@ -130,179 +417,739 @@ class State:
             result: 结果数据
             error: 错误信息
             update_time: 是否更新 update_time（默认True，重复提交时为False）
+            timings: 本次执行各阶段的时间戳，写入时补充 persisted_at
+            lease_owner: 分布式 worker 的ID，提供时只有任务租约仍属于该 worker 才写入；
+                租约过期后任务已被其他 worker 领取时丢弃本次更新，避免两个 worker 都写入结果
+
+        完整的 result 压缩后写入 task_info 表，任务记录中只保存摘要
         """
-        db = self._get_db()
+        summary, info_row = (
+            await asyncio.to_thread(_prepare_result, task_id, result) if result else (None, None)
+        )
+        task_update = _TaskUpdate(task_id, status, summary, info_row, error, update_time, timings, lease_owner)
         try:
-            db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-            if db_task:
-                old_status = db_task.status
-                db_task.status = status
-                if result:
-                    db_task.result = json.dumps(result)
-                    # 从结果中提取视频标题
-                    if 'title' in result:
-                        db_task.video_title = result['title']
-                if error is not None:  # 允许清除错误信息
-                    db_task.error = error
-
-                # 手动更新 update_time（失败重试时）
-                if update_time and status == "pending" and old_status == "failed":
-                    from datetime import datetime
-                    db_task.update_time = datetime.now()
-
-                db.commit()
-
-                log_extra = {
-                    "task_id": task_id,
-                    "old_status": old_status,
-                    "new_status": status
-                }
-
-                if error:
-                    logger.error("Task failed", extra={**log_extra, "error": error})
-                elif status == "completed":
-                    logger.info("Task completed", extra={
-                        **log_extra,
-                        "video_title": db_task.video_title
-                    })
-                elif status == "pending" and old_status == "failed":
-                    logger.info("Task reset for retry", extra=log_extra)
-                else:
-                    logger.info("Task status updated", extra=log_extra)
+            if self._writer is not None:
+                await self._writer.submit(task_update)
+            else:
+                await self._write_updates([task_update])
         except Exception as e:
-            db.rollback()
             logger.error("Failed to update task", extra={
                 "task_id": task_id,
                 "status": status,
                 "error": str(e)
             })
-        finally:
-            db.close()
 
-    def list_tasks(
+    async def _write_updates(self, updates: List[_TaskUpdate]) -> None:
+        """在单个事务中写入一批状态更新（同一任务的多次更新按提交顺序应用）"""
+        applied = []
+        lost = set()
+        async with self._get_db() as db:
+            try:
+                for u in updates:
+                    if u.lease_owner is None:
+                        continue
+                    # 空更新：确认租约仍属于该 worker 并锁住记录（SQLite 下同时开始写事务），
+                    # 提交之前其他 worker 无法领取这个任务
+                    held = await db.execute(
+                        update(TaskModel)
+                        .where(TaskModel.id == u.task_id, TaskModel.lease_owner == u.lease_owner)
+                        .values(lease_expires=TaskModel.lease_expires, update_time=TaskModel.update_time)
+                        .execution_options(synchronize_session=False)
+                    )
+                    if held.rowcount == 0:
+                        lost.add(id(u))
+                        logger.warning("Task lease lost, discarding update", extra={
+                            "task_id": u.task_id,
+                            "worker_id": u.lease_owner,
+                            "status": u.status
+                        })
+                ids = list(dict.fromkeys(u.task_id for u in updates))
+                db_tasks = {
+                    db_task.id: db_task
+                    for db_task in (await db.execute(
+                        select(TaskModel).where(TaskModel.id.in_(ids))
+                    )).scalars()
+                }
+                for u in updates:
+                    db_task = db_tasks.get(u.task_id)
+                    if db_task is None or id(u) in lost:
+                        continue
+                    old_status = _apply_update(db_task, u.status, u.summary, u.error, u.update_time, u.timings)
+                    if u.info_row is not None:
+                        await db.merge(u.info_row)
+                    applied.append((db_task, old_status, u))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        for db_task, old_status, u in applied:
+            task_cache.put(db_task.id, _to_task(db_task))
+            _log_update(db_task, old_status, u.status, u.error)
+
+    def writer_stats(self) -> Optional[Dict[str, Any]]:
+        """合并写入统计（未启用时为 None）"""
+        return self._writer.stats() if self._writer is not None else None
+
+    async def shutdown(self) -> None:
+        """写完排队中的状态更新"""
+        if self._writer is not None:
+            await self._writer.shutdown()
+
+    async def count_tasks(self, status: Optional[str] = None) -> int:
+        """
+        统计任务数（按 TASK_COUNT_CACHE_TTL 缓存）
+
+        列表页每次翻页都执行 COUNT 会扫描整个索引，总数只需近似即可
+        """
+        cached = self._count_cache.get(status)
+        if cached and time.monotonic() - cached[0] < settings.task_count_cache_ttl:
+            return cached[1]
+        async with self._get_db() as db:
+            query = select(func.count()).select_from(TaskModel)
+            if status:
+                query = query.where(TaskModel.status == status)
+            total = (await db.execute(query)).scalar_one()
+        self._count_cache[status] = (time.monotonic(), total)
+        return total
+
+    async def list_tasks(
         self,
         status: Optional[str] = None,
         page: int = 1,
         page_size: int = 100,
-        order: str = "desc"
-    ) -> tuple[List[Task], int]:
+        order: str = "desc",
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
         """
-        列出任务（支持过滤、分页和排序）
+        列出任务
 
         Args:
-            status: 任务状态过滤 (pending/completed/failed)
-            page: 页码（从1开始）
+            status: 任务状态过滤
+            page: 页码（未提供 cursor 时使用 OFFSET 分页）
             page_size: 每页数量
-            order: 排序方向 (asc/desc)，按时间排序
+            order: 排序方向 (asc/desc)，按 (update_time, id) 排序
+            cursor: 上一页返回的 next_cursor，提供时使用键集分页，忽略 page
+            fields: 返回的字段（LIST_FIELDS 的子集），默认全部；不包含 result/error 时不会读取这两列
 
         Returns:
-            (tasks, total): 任务列表和总数
+            (tasks, total, next_cursor)：total 为缓存的近似总数，没有下一页时 next_cursor 为 None
         """
-        db = self._get_db()
+        fields = [f for f in (fields or LIST_FIELDS) if f in LIST_FIELDS]
+        # 键集分页需要 id 和 update_time 生成游标
+        columns = list(dict.fromkeys(["id", "update_time", *fields]))
         try:
-            # 构建查询
-            query = db.query(TaskModel)
+            async with self._get_db() as db:
+                query = select(*(getattr(TaskModel, c) for c in columns))
+                if status:
+                    query = query.where(TaskModel.status == status)
 
-            # 状态过滤
-            if status:
-                query = query.filter(TaskModel.status == status)
+                if cursor:
+                    cursor_time, cursor_id = _decode_cursor(cursor)
+                    if order == "asc":
+                        query = query.where(or_(
+                            TaskModel.update_time > cursor_time,
+                            and_(TaskModel.update_time == cursor_time, TaskModel.id > cursor_id)
+                        ))
+                    else:
+                        query = query.where(or_(
+                            TaskModel.update_time < cursor_time,
+                            and_(TaskModel.update_time == cursor_time, TaskModel.id < cursor_id)
+                        ))
+                else:
+                    query = query.offset((page - 1) * page_size)
+
+                if order == "asc":
+                    query = query.order_by(TaskModel.update_time.asc(), TaskModel.id.asc())
+                else:
+                    query = query.order_by(TaskModel.update_time.desc(), TaskModel.id.desc())
 
-            # 获取总数
-            total = query.count()
+                # 多取一行判断是否还有下一页
+                rows = (await db.execute(query.limit(page_size + 1))).all()
 
-            # 按更新时间排序
-            if order == "asc":
-                query = query.order_by(TaskModel.update_time.asc())
-            else:
-                query = query.order_by(TaskModel.update_time.desc())
-
-            # 分页
-            offset = (page - 1) * page_size
-            db_tasks = query.offset(offset).limit(page_size).all()
-
-            # 转换为 Task 对象
-            tasks = []
-            for db_task in db_tasks:
-                result = json.loads(db_task.result) if db_task.result else None
-                task = Task(
-                    id=db_task.id,
-                    url=db_task.url,
-                    video_title=db_task.video_title,
-                    output_path=db_task.output_path,
-                    format=db_task.format,
-                    status=db_task.status,
-                    result=result,
-                    error=db_task.error,
-                    create_time=db_task.create_time.isoformat(),
-                    update_time=db_task.update_time.isoformat()
-                )
-                tasks.append(task)
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            next_cursor = None
+            if has_more and rows:
+                last = rows[-1]._mapping
+                next_cursor = _encode_cursor(last["update_time"], last["id"])
 
+            tasks = [_to_fields(row._mapping, fields) for row in rows]
+            total = await self.count_tasks(status)
             logger.debug("Listed tasks", extra={
                 "count": len(tasks),
                 "total": total,
-                "page": page,
+                "page": None if cursor else page,
                 "page_size": page_size,
                 "status_filter": status
             })
-            return tasks, total
+            return tasks, total, next_cursor
+        except ValueError:
+            raise
         except Exception as e:
             logger.error("Failed to list tasks", extra={"error": str(e)})
-            return [], 0
-        finally:
-            db.close()
+            return [], 0, None
 
-    def task_exists(self, url: str) -> Optional[Task]:
+    async def task_exists(self, url: str) -> Optional[Task]:
         """检查任务是否已存在（只根据URL判断）"""
-        db = self._get_db()
-        try:
-            db_task = db.query(TaskModel).filter(
-                TaskModel.url == url
-            ).first()
+        key = await asyncio.to_thread(canonical_video_key, url)
+        async with self._get_db() as db:
+            try:
+                db_task = (await db.execute(
+                    select(TaskModel).where(_dedup_filter(url, key)).limit(1)
+                )).scalars().first()
+                if not db_task:
+                    return None
 
-            if not db_task:
+                logger.debug("Found existing task", extra={
+                    "task_id": db_task.id,
+                    "url": url,
+                    "status": db_task.status
+                })
+                return _to_task(db_task)
+            except Exception as e:
+                logger.error("Failed to check task existence", extra={
+                    "url": url,
+                    "error": str(e)
+                })
                 return None
 
-            logger.debug("Found existing task", extra={
-                "task_id": db_task.id,
+    async def _select_existing(
+        self,
+        db: AsyncSession,
+        hashes: List[str],
+        keys: List[VideoKey]
+    ) -> Tuple[Dict[str, Tuple[str, str]], Dict[VideoKey, Tuple[str, str]]]:
+        """
+        按 url_hash 和 (extractor, video_id) 批量查询已有任务
+
+        Returns:
+            (by_hash, by_key)，值均为 (task_id, status)
+        """
+        by_hash: Dict[str, Tuple[str, str]] = {}
+        by_key: Dict[VideoKey, Tuple[str, str]] = {}
+        columns = (TaskModel.id, TaskModel.status, TaskModel.url_hash, TaskModel.extractor, TaskModel.video_id)
+
+        conditions = []
+        for i in range(0, len(hashes), IN_CHUNK_SIZE):
+            conditions.append(TaskModel.url_hash.in_(hashes[i:i + IN_CHUNK_SIZE]))
+        video_ids_by_extractor: Dict[str, List[str]] = {}
+        for extractor, video_id in dict.fromkeys(keys):
+            video_ids_by_extractor.setdefault(extractor, []).append(video_id)
+        for extractor, video_ids in video_ids_by_extractor.items():
+            for i in range(0, len(video_ids), IN_CHUNK_SIZE):
+                conditions.append(and_(
+                    TaskModel.extractor == extractor,
+                    TaskModel.video_id.in_(video_ids[i:i + IN_CHUNK_SIZE])
+                ))
+
+        for condition in conditions:
+            for task_id, status, url_hash, extractor, video_id in (await db.execute(
+                select(*columns).where(condition)
+            )).all():
+                if url_hash:
+                    by_hash[url_hash] = (task_id, status)
+                if extractor and video_id:
+                    by_key[(extractor, video_id)] = (task_id, status)
+        return by_hash, by_key
+
+    @staticmethod
+    def _match(
+        by_hash: Dict[str, Tuple[str, str]],
+        by_key: Dict[VideoKey, Tuple[str, str]],
+        url_hash: str,
+        key: Optional[VideoKey]
+    ) -> Optional[Tuple[str, str]]:
+        """优先按视频匹配，其次按 URL 匹配"""
+        if key and key in by_key:
+            return by_key[key]
+        return by_hash.get(url_hash)
+
+    async def _claim_retry(self, db: AsyncSession, task_id: str) -> bool:
+        """
+        将失败任务原子地重置为 pending
+
+        Returns:
+            True 表示由本次调用完成重置（调用方负责重新调度）
+        """
+        return bool(await self._claim_retries(db, [task_id]))
+
+    async def _claim_retries(self, db: AsyncSession, task_ids: List[str]) -> List[str]:
+        """
+        将一批失败任务原子地重置为 pending（每 IN_CHUNK_SIZE 个任务一条 UPDATE）
+
+        - 支持 RETURNING 的数据库（SQLite）：UPDATE ... RETURNING 直接返回本次重置的任务
+        - MySQL：先 SELECT ... FOR UPDATE 锁住仍为 failed 的任务，再一次 UPDATE 这些任务
+
+        Returns:
+            由本次调用完成重置的任务ID（被并发请求抢先重置的不包含在内，由对方负责重新调度）
+        """
+        reset = {
+            "status": "pending", "error": "", "update_time": datetime.now(),
+            "lease_owner": None, "lease_expires": None, "attempts": 0,
+        }
+        claimed: List[str] = []
+        for i in range(0, len(task_ids), IN_CHUNK_SIZE):
+            chunk = task_ids[i:i + IN_CHUNK_SIZE]
+            failed = and_(TaskModel.id.in_(chunk), TaskModel.status == "failed")
+            if db.bind.dialect.update_returning:
+                claimed.extend((await db.execute(
+                    update(TaskModel)
+                    .where(failed)
+                    .values(**reset)
+                    .returning(TaskModel.id)
+                    .execution_options(synchronize_session=False)
+                )).scalars())
+                continue
+            ids = list((await db.execute(
+                select(TaskModel.id).where(failed).with_for_update()
+            )).scalars())
+            if ids:
+                await db.execute(
+                    update(TaskModel)
+                    .where(TaskModel.id.in_(ids))
+                    .values(**reset)
+                    .execution_options(synchronize_session=False)
+                )
+                claimed.extend(ids)
+        return claimed
+
+    async def _cache_tasks(self, db: AsyncSession, task_ids: List[str]) -> None:
+        """重新读取任务并写入缓存（失败重试等只更新了部分列的场景）"""
+        for i in range(0, len(task_ids), IN_CHUNK_SIZE):
+            rows = (await db.execute(
+                select(TaskModel).where(TaskModel.id.in_(task_ids[i:i + IN_CHUNK_SIZE]))
+            )).scalars()
+            for db_task in rows:
+                task_cache.put(db_task.id, _to_task(db_task))
+
+    async def create_or_get(
+        self,
+        url: str,
+        output_path: str,
+        format: str,
+        priority: int = 0,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """
+        原子地创建或获取任务
+
+        依赖 url_hash 和 (extractor, video_id) 唯一索引，
+        并发提交同一视频（包括不同的 URL 变体）只会产生一个任务；
+        priority 和 options 保存在任务记录中，供分布式 worker 和重启恢复使用
+
+        Returns:
+            (task_id, action)，action 为 created / retried / completed / pending
+        """
+        url_hash = hash_url(url)
+        key = await asyncio.to_thread(canonical_video_key, url)
+        task_id = str(uuid.uuid4())
+        now = datetime.now()
+        async with self._get_db() as db:
+            try:
+                await db.execute(_insert_ignore(db.bind.dialect.name).values(
+                    id=task_id,
+                    url=url,
+                    url_hash=url_hash,
+                    extractor=key[0] if key else None,
+                    video_id=key[1] if key else None,
+                    output_path=output_path,
+                    format=format,
+                    status="pending",
+                    priority=priority,
+                    options=json.dumps(options) if options else None,
+                    create_time=now,
+                    update_time=now
+                ))
+                by_hash, by_key = await self._select_existing(db, [url_hash], [key] if key else [])
+                existing_id, status = self._match(by_hash, by_key, url_hash, key)
+                if existing_id == task_id:
+                    action = "created"
+                elif status == "failed":
+                    action = "retried" if await self._claim_retry(db, existing_id) else "pending"
+                else:
+                    action = status
+                await db.commit()
+                if action == "created":
+                    TASK_TRANSITIONS.labels("new", "pending").inc()
+                    task_cache.put(task_id, _new_task(task_id, url, output_path, format, now, priority, options))
+                elif action == "retried":
+                    TASK_TRANSITIONS.labels("failed", "pending").inc()
+                    await self._cache_tasks(db, [existing_id])
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to create task", extra={
+                    "url": url,
+                    "error": str(e)
+                })
+                raise
+
+        if action == "created":
+            logger.info("Task created", extra={
+                "task_id": task_id,
                 "url": url,
-                "status": db_task.status
+                "output_path": output_path,
+                "format": format,
+                "video_key": key
             })
+        elif action == "retried":
+            logger.info("Task reset for retry", extra={"task_id": existing_id, "url": url})
+        return existing_id, action
+
+    async def bulk_create_or_get(
+        self,
+        entries: List[Tuple[str, str, str, int, Optional[Dict[str, Any]]]]
+    ) -> List[Tuple[str, str]]:
+        """
+        批量创建或获取任务（单个事务）
+
+        1. 按 url_hash 和 (extractor, video_id) 分批 IN 查询找出已存在的任务
+        2. 一次多行 INSERT（忽略唯一键冲突）创建新任务，并读回实际写入的记录
+        3. 一条条件 UPDATE 将失败任务重置为 pending（只有抢到的请求负责重新调度）
+
+        Args:
+            entries: (url, output_path, format, priority, options) 列表，同一批内重复的视频以第一次出现为准，
+                之后出现的条目作为重复提交返回 pending
+
+        Returns:
+            与 entries 一一对应的 (task_id, action) 列表，
+            action 为 created / retried / completed / pending
+        """
+        urls = list(dict.fromkeys(entry[0] for entry in entries))
+        hashes = {url: hash_url(url) for url in urls}
+        keys = dict(zip(urls, await asyncio.to_thread(canonical_video_keys, urls)))
+
+        def identity(url: str):
+            return keys[url] or hashes[url]
+
+        plan: Dict[object, Tuple[str, str]] = {}
+        now = datetime.now()
+
+        async with self._get_db() as db:
+            try:
+                by_hash, by_key = await self._select_existing(
+                    db, list(hashes.values()), [k for k in keys.values() if k]
+                )
+
+                new_rows = []
+                for url, output_path, format, priority, options in entries:
+                    if identity(url) in plan or self._match(by_hash, by_key, hashes[url], keys[url]):
+                        continue
+                    task_id = str(uuid.uuid4())
+                    plan[identity(url)] = (task_id, "created")
+                    key = keys[url]
+                    new_rows.append({
+                        "id": task_id,
+                        "url": url,
+                        "url_hash": hashes[url],
+                        "extractor": key[0] if key else None,
+                        "video_id": key[1] if key else None,
+                        "output_path": output_path,
+                        "format": format,
+                        "status": "pending",
+                        "priority": priority,
+                        "options": json.dumps(options) if options else None,
+                        "create_time": now,
+                        "update_time": now,
+                    })
+                if new_rows:
+                    await db.execute(_insert_ignore(db.bind.dialect.name), new_rows)
+                    # 读回新插入的记录，被并发请求抢先插入的视频使用对方的任务
+                    inserted_by_hash, inserted_by_key = await self._select_existing(
+                        db,
+                        [row["url_hash"] for row in new_rows],
+                        [(row["extractor"], row["video_id"]) for row in new_rows if row["extractor"]]
+                    )
+                    by_hash.update(inserted_by_hash)
+                    by_key.update(inserted_by_key)
+                    for row in new_rows:
+                        key = (row["extractor"], row["video_id"]) if row["extractor"] else None
+                        actual = self._match(inserted_by_hash, inserted_by_key, row["url_hash"], key)
+                        if actual is None or actual[0] != row["id"]:
+                            del plan[key or row["url_hash"]]
+                created = len(plan)
+
+                failed_ids = []
+                for url in urls:
+                    if identity(url) in plan:
+                        continue
+                    task_id, status = self._match(by_hash, by_key, hashes[url], keys[url])
+                    plan[identity(url)] = (task_id, status)
+                    if status == "failed":
+                        failed_ids.append(task_id)
+                claimed = set(await self._claim_retries(db, list(dict.fromkeys(failed_ids))))
+                retried = len(claimed)
+                for identity_key, (task_id, status) in plan.items():
+                    if status == "failed":
+                        plan[identity_key] = (task_id, "retried" if task_id in claimed else "pending")
+
+                await db.commit()
+                TASK_TRANSITIONS.labels("new", "pending").inc(created)
+                TASK_TRANSITIONS.labels("failed", "pending").inc(retried)
+                created_ids = {task_id for task_id, action in plan.values() if action == "created"}
+                for row in new_rows:
+                    if row["id"] in created_ids:
+                        task_cache.put(row["id"], _new_task(
+                            row["id"], row["url"], row["output_path"], row["format"], now, row["priority"],
+                            json.loads(row["options"]) if row["options"] else None
+                        ))
+                if retried:
+                    await self._cache_tasks(db, [
+                        task_id for task_id, action in plan.values() if action == "retried"
+                    ])
+                logger.info("Bulk tasks ingested", extra={
+                    "count": len(entries),
+                    "created": created,
+                    "retried": retried,
+                    "existing": len(plan) - created - retried
+                })
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to ingest bulk tasks", extra={
+                    "count": len(entries),
+                    "error": str(e)
+                })
+                raise
+
+        results = []
+        seen = set()
+        for entry in entries:
+            task_id, action = plan[identity(entry[0])]
+            if identity(entry[0]) in seen and action in ("created", "retried"):
+                # 同一视频在批内再次出现：只有第一次出现的条目负责调度
+                action = "pending"
+            seen.add(identity(entry[0]))
+            results.append((task_id, action))
+        return results
+
+    async def record_files(self, task_id: str, files: List[Dict[str, Any]]) -> None:
+        """
+        记录任务的输出文件（file_reuse.describe_files / materialize 的结果），同一路径只保留一条
+
+        记录失败不影响任务状态，只是之后无法复用这些文件
+        """
+        if not files:
+            return
+        now = datetime.now()
+        async with self._get_db() as db:
+            try:
+                await db.execute(_insert_ignore(db.bind.dialect.name, MediaFileModel), [
+                    {
+                        "task_id": task_id,
+                        "path": file["path"],
+                        "path_hash": hash_url(file["path"]),
+                        "size": file["size"],
+                        "checksum": file["checksum"],
+                        "method": file["method"],
+                        "create_time": now,
+                    }
+                    for file in files
+                ])
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to record task files", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
+
+    async def get_files(self, task_id: str) -> List[Dict[str, Any]]:
+        """任务已记录的输出文件（包括复用生成的副本）"""
+        async with self._get_db() as db:
+            try:
+                rows = (await db.execute(
+                    select(MediaFileModel)
+                    .where(MediaFileModel.task_id == task_id)
+                    .order_by(MediaFileModel.id)
+                )).scalars()
+                return [
+                    {
+                        "path": row.path,
+                        "size": row.size,
+                        "checksum": row.checksum,
+                        "method": row.method,
+                        "create_time": row.create_time.isoformat(),
+                    }
+                    for row in rows
+                ]
+            except Exception as e:
+                logger.error("Failed to get task files", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
+                return []
+
+    async def reopen_task(self, task_id: str, output_path: str) -> bool:
+        """
+        将已完成的任务原子地重新置为 pending，输出到新的 output_path
+
+        用于以新的 output_path 请求已完成的视频：由调度器执行的任务先从已有文件生成副本，
+        没有可用文件时才重新下载；重启恢复和分布式 worker 按记录中的 output_path 执行
+
+        Returns:
+            True 表示由本次调用重新打开（调用方负责调度），任务不是 completed 状态时为 False
+        """
+        async with self._get_db() as db:
+            try:
+                reopened = await db.execute(
+                    update(TaskModel)
+                    .where(TaskModel.id == task_id, TaskModel.status == "completed")
+                    .values(status="pending", output_path=output_path, update_time=datetime.now())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if reopened.rowcount == 0:
+                    return False
+                TASK_TRANSITIONS.labels("completed", "pending").inc()
+                await self._cache_tasks(db, [task_id])
+                logger.info("Task reopened for a new output path", extra={
+                    "task_id": task_id,
+                    "output_path": output_path
+                })
+                return True
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to reopen task", extra={
+                    "task_id": task_id,
+                    "error": str(e)
+                })
+                return False
+
+    async def get_pending_tasks(self, limit: int = 0) -> List[Task]:
+        """
+        获取所有 pending 任务（启动时恢复中断的任务），按优先级从高到低、创建时间从早到晚
 
-            result = json.loads(db_task.result) if db_task.result else None
-            return Task(
-                id=db_task.id,
-                url=db_task.url,
-                video_title=db_task.video_title,
-                output_path=db_task.output_path,
-                format=db_task.format,
-                status=db_task.status,
-                result=result,
-                error=db_task.error,
-                create_time=db_task.create_time.isoformat(),
-                update_time=db_task.update_time.isoformat()
+        Args:
+            limit: 最多返回的任务数（0 表示不限制）
+        """
+        async with self._get_db() as db:
+            try:
+                query = (
+                    select(TaskModel)
+                    .where(TaskModel.status == "pending")
+                    .order_by(TaskModel.priority.desc(), TaskModel.create_time)
+                )
+                if limit:
+                    query = query.limit(limit)
+                return [_to_task(db_task) for db_task in (await db.execute(query)).scalars()]
+            except Exception as e:
+                logger.error("Failed to get pending tasks", extra={"error": str(e)})
+                return []
+
+    async def claim_tasks(self, worker_id: str, limit: int, lease_ttl: float) -> List[Task]:
+        """
+        为 worker 领取待执行的任务（pending 且没有租约或租约已过期）
+
+        - MySQL：SELECT ... FOR UPDATE SKIP LOCKED，多个 worker 并发领取时互不等待
+        - SQLite：单条带子查询的 UPDATE，SQLite 同时只有一个写事务，本身即原子
+        - 被领取超过 LEASE_MAX_ATTEMPTS 次的任务（worker 反复在执行中失联）直接标记为失败
+
+        Returns:
+            本次领取到的任务，按优先级从高到低
+        """
+        now = datetime.now()
+        expires = now + timedelta(seconds=lease_ttl)
+        candidates = (
+            select(TaskModel.id)
+            .where(
+                TaskModel.status == "pending",
+                or_(TaskModel.lease_expires.is_(None), TaskModel.lease_expires < now)
             )
-        except Exception as e:
-            logger.error("Failed to check task existence", extra={
-                "url": url,
-                "error": str(e)
-            })
-            return None
-        finally:
-            db.close()
+            .order_by(TaskModel.priority.desc(), TaskModel.create_time)
+            .limit(limit)
+        )
+        lease = {
+            "lease_owner": worker_id,
+            "lease_expires": expires,
+            "attempts": TaskModel.attempts + 1,
+            # 领取不算任务状态变化，保持 update_time 不变
+            "update_time": TaskModel.update_time,
+        }
+        async with self._get_db() as db:
+            try:
+                if db.bind.dialect.name == "mysql":
+                    ids = list((await db.execute(candidates.with_for_update(skip_locked=True))).scalars())
+                    if not ids:
+                        await db.rollback()
+                        return []
+                    await db.execute(update(TaskModel).where(TaskModel.id.in_(ids)).values(**lease))
+                    claimed_filter = TaskModel.id.in_(ids)
+                else:
+                    await db.execute(
+                        update(TaskModel)
+                        .where(TaskModel.id.in_(candidates.scalar_subquery()))
+                        .values(**lease)
+                        .execution_options(synchronize_session=False)
+                    )
+                    claimed_filter = and_(
+                        TaskModel.lease_owner == worker_id,
+                        TaskModel.lease_expires == expires
+                    )
+                db_tasks = list((await db.execute(
+                    select(TaskModel)
+                    .where(claimed_filter, TaskModel.status == "pending")
+                    .order_by(TaskModel.priority.desc(), TaskModel.create_time)
+                )).scalars())
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to claim tasks", extra={"worker_id": worker_id, "error": str(e)})
+                return []
 
-    def clear_all_tasks(self) -> bool:
-        """清除所有任务"""
-        db = self._get_db()
-        try:
-            count = db.query(TaskModel).count()
-            db.query(TaskModel).delete()
-            db.commit()
-            logger.warning("All tasks cleared", extra={"count": count})
-            return True
-        except Exception as e:
-            db.rollback()
-            logger.error("Failed to clear tasks", extra={"error": str(e)})
-            return False
-        finally:
-            db.close()
+        tasks = []
+        for db_task in db_tasks:
+            if db_task.attempts > settings.lease_max_attempts:
+                await self.update_task(
+                    db_task.id, "failed",
+                    error=f"Task lease expired {db_task.attempts - 1} times, giving up"
+                )
+                continue
+            if db_task.attempts > 1:
+                logger.warning("Reclaimed task with expired lease", extra={
+                    "task_id": db_task.id,
+                    "worker_id": worker_id,
+                    "attempts": db_task.attempts
+                })
+            tasks.append(_to_task(db_task))
+        if tasks:
+            logger.info("Tasks claimed", extra={"worker_id": worker_id, "count": len(tasks)})
+        return tasks
+
+    async def renew_leases(self, worker_id: str, task_ids: List[str], lease_ttl: float) -> Optional[List[str]]:
+        """
+        续约 worker 正在执行的任务
+
+        Returns:
+            成功续约的任务ID（不在其中的任务租约已过期并被其他 worker 领取，或已经结束），
+            数据库出错时返回 None（无法判断租约状态）
+        """
+        if not task_ids:
+            return []
+        async with self._get_db() as db:
+            try:
+                await db.execute(
+                    update(TaskModel)
+                    .where(
+                        TaskModel.id.in_(task_ids),
+                        TaskModel.lease_owner == worker_id,
+                        TaskModel.status == "pending"
+                    )
+                    .values(
+                        lease_expires=datetime.now() + timedelta(seconds=lease_ttl),
+                        update_time=TaskModel.update_time
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                renewed = list((await db.execute(
+                    select(TaskModel.id).where(
+                        TaskModel.id.in_(task_ids),
+                        TaskModel.lease_owner == worker_id,
+                        TaskModel.status == "pending"
+                    )
+                )).scalars())
+                await db.commit()
+                return renewed
+            except Exception as e:
+                await db.rollback()
+                logger.error("Failed to renew leases", extra={"worker_id": worker_id, "error": str(e)})
+                return None
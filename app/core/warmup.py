@@ -0,0 +1,67 @@
+"""
+启动预热模块
+yt-dlp 的上千个提取器在第一次使用时才加载；服务开始监听后在后台线程中提前加载，
+完成前 /ready 返回 503，负载均衡可据此在预热完成后再把流量切过来
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.core.downloader import warm_up
+from app.utils.logger import logger
+
+
+class WarmUp:
+    """
+    后台预热任务
+
+    status：pending（尚未开始）/ running / done / failed / disabled（YTDLP_WARMUP=false）
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("done", "disabled")
+
+    def start(self) -> None:
+        """在事件循环中启动预热（不等待完成）"""
+        if not settings.ytdlp_warmup:
+            self.status = "disabled"
+            return
+        if self._task is None:
+            self.status = "running"
+            self._task = asyncio.create_task(self._run(), name="ytdlp-warmup")
+
+    async def wait(self) -> None:
+        """等待预热结束（未开始或已禁用时立即返回，预热失败不抛出异常）"""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error("yt-dlp warm-up failed", extra={"error": str(e)})
+            return
+        self.duration = time.perf_counter() - started
+        self.status = "done"
+        logger.info("yt-dlp warm-up finished", extra={"duration": round(self.duration, 3)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "duration": round(self.duration, 3) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+# 全局预热任务
+warmup = WarmUp()
@@ -0,0 +1,224 @@
+"""
+多进程下载执行模块
+在独立的 worker 进程中运行 yt-dlp，避免提取/解析等 CPU 密集操作争抢 GIL
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from app.utils.logger import logger, setup_logger
+
+# worker 进程内的事件队列（由 initializer 注入）
+_event_queue = None
+
+
+def _init_worker(event_queue) -> None:
+    """worker 进程初始化"""
+    global _event_queue
+    _event_queue = event_queue
+    setup_logger()
+
+
+def emit_event(task_id: str, kind: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """在 worker 进程中向 API 进程发送状态事件（非 worker 进程中调用时忽略）"""
+    if _event_queue is None:
+        return
+    try:
+        _event_queue.put_nowait((task_id, kind, data or {}))
+    except Exception:
+        pass
+
+
+class WorkerError(Exception):
+    """worker 进程中抛出的异常（yt-dlp 的异常携带 traceback，无法跨进程序列化）"""
+
+
+def _run_download(task_id: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """worker 进程入口：执行下载并返回结果"""
+    from app.core.downloader import download_video
+    from app.core.profiling import run_profiled
+
+    emit_event(task_id, "started", {"pid": os.getpid()})
+    # 带宽调度器在 API 进程中，worker 进程内只能按开始时分配到的速率（kwargs["rate_limit"]）静态限速
+    profile = kwargs.pop("profile_path", None)
+    try:
+        return run_profiled(profile, lambda: download_video(
+            progress_callback=lambda data: emit_event(task_id, "progress", data),
+            **kwargs
+        ))
+    except Exception as e:
+        raise WorkerError(str(e)) from None
+
+
+def _run_extract(url: str, format: Optional[str]) -> Dict[str, Any]:
+    """worker 进程入口：按下载使用的格式提取视频信息"""
+    from app.core.downloader import get_video_info
+
+    try:
+        return get_video_info(url, quiet=True, format=format)
+    except Exception as e:
+        raise WorkerError(str(e)) from None
+
+
+def _run_select(info: Dict[str, Any], format: str) -> Dict[str, Any]:
+    """worker 进程入口：基于已提取的信息按下载使用的格式重新选择格式"""
+    from app.core.downloader import select_formats
+
+    try:
+        return select_formats(info, format)
+    except Exception as e:
+        raise WorkerError(str(e)) from None
+
+
+EventHandler = Callable[[str, str, Dict[str, Any]], None]
+
+
+class ProcessDownloadPool:
+    """
+    进程池下载执行器
+
+    - 结果通过进程池的结果管道返回，状态事件通过独立的队列回传
+    - worker 崩溃时（BrokenProcessPool）自动重建进程池并重试一次
+    - 每个 worker 执行 max_jobs_per_worker 个任务后被替换，防止内存泄漏累积
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_jobs_per_worker: int = 0,
+        on_event: Optional[EventHandler] = None
+    ):
+        """
+        Args:
+            max_workers: worker 进程数
+            max_jobs_per_worker: 单个 worker 最多执行的任务数（0 表示不限制）
+            on_event: 状态事件回调，在后台线程中调用
+        """
+        self._max_workers = max(1, max_workers)
+        self._max_jobs_per_worker = max_jobs_per_worker
+        self._on_event = on_event
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._generation = 0
+        self._jobs_in_generation = 0
+        self._restarts = 0
+        self._listener = threading.Thread(target=self._listen, name="process-pool-events", daemon=True)
+        self._listener.start()
+
+    # Python 3.11+ 支持原生的 max_tasks_per_child，低版本按代整体替换进程池
+    _native_recycle = sys.version_info >= (3, 11)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        kwargs: Dict[str, Any] = {
+            "max_workers": self._max_workers,
+            "mp_context": self._ctx,
+            "initializer": _init_worker,
+            "initargs": (self._events,),
+        }
+        if self._native_recycle and self._max_jobs_per_worker:
+            kwargs["max_tasks_per_child"] = self._max_jobs_per_worker
+        self._generation += 1
+        self._jobs_in_generation = 0
+        logger.info("Process pool started", extra={
+            "generation": self._generation,
+            "max_workers": self._max_workers,
+            "max_jobs_per_worker": self._max_jobs_per_worker
+        })
+        return ProcessPoolExecutor(**kwargs)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            elif (
+                not self._native_recycle
+                and self._max_jobs_per_worker
+                and self._jobs_in_generation >= self._max_jobs_per_worker * self._max_workers
+            ):
+                # 旧进程池完成手头任务后自行退出
+                self._executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+            self._jobs_in_generation += 1
+            return self._executor
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> None:
+        """替换已损坏的进程池（多个任务同时发现时只替换一次）"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._restarts += 1
+            logger.warning("Process pool broken, restarting", extra={
+                "generation": self._generation,
+                "restarts": self._restarts
+            })
+            broken.shutdown(wait=False)
+            self._executor = self._new_executor()
+
+    def submit(self, task_id: str, **kwargs) -> Future:
+        """提交下载任务，kwargs 透传给 download_video（profile_path 除外，用于在 worker 中做性能分析）"""
+        return self._get_executor().submit(_run_download, task_id, kwargs)
+
+    async def run(self, task_id: str, **kwargs) -> Dict[str, Any]:
+        """在进程池中执行下载并等待结果，worker 崩溃时重试一次"""
+        return await self._call(task_id, _run_download, task_id, kwargs)
+
+    async def extract(self, task_id: str, url: str, format: Optional[str] = None) -> Dict[str, Any]:
+        """在进程池中提取视频信息（下载前估算大小），yt-dlp 的解析开销不占用调用方进程"""
+        return await self._call(task_id, _run_extract, url, format)
+
+    async def select_formats(self, task_id: str, info: Dict[str, Any], format: str) -> Dict[str, Any]:
+        """在进程池中基于已提取的信息重新选择格式（不访问网络）"""
+        return await self._call(task_id, _run_select, info, format)
+
+    async def _call(self, task_id: str, fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+        """在进程池中执行 fn 并等待结果，worker 崩溃时重试一次"""
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                self._replace_broken(executor)
+                if attempt:
+                    raise
+                logger.warning("Retrying task after worker crash", extra={"task_id": task_id})
+
+    def _listen(self) -> None:
+        """后台线程：读取 worker 进程发回的状态事件"""
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            task_id, kind, data = item
+            if kind == "started":
+                logger.debug("Task started in worker process", extra={"task_id": task_id, **data})
+            if self._on_event:
+                try:
+                    self._on_event(task_id, kind, data)
+                except Exception as e:
+                    logger.error("Process pool event handler failed", extra={
+                        "task_id": task_id,
+                        "kind": kind,
+                        "error": str(e)
+                    })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self._max_workers,
+            "max_jobs_per_worker": self._max_jobs_per_worker,
+            "generation": self._generation,
+            "restarts": self._restarts,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+        self._events.put(None)
@@ -0,0 +1,125 @@
+"""
+合并写入模块
+由单个写入协程把多个调用方提交的更新合并到一个事务中，
+SQLite 下写入吞吐取决于批大小而不是每次提交的 fsync / 写锁竞争
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from app.utils.logger import logger
+
+FlushHandler = Callable[[List[Any]], Awaitable[None]]
+
+# 放入队列通知写入协程退出，排在它之前的更新都会先写完
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    合并写入器
+
+    - submit 把更新放入队列并等待其所在批次提交完成
+    - 写入协程取到第一条更新后等待 interval 秒收集更多更新，最多 max_batch_size 条，
+      然后调用一次 flush 在单个事务中写入
+    - flush 整批失败时逐条重试，单条异常只返回给对应的调用方
+    - shutdown 向队列放入停止标记，写入协程写完手中的批次和标记之前的全部更新后退出
+    """
+
+    def __init__(self, flush: FlushHandler, interval: float, max_batch_size: int):
+        """
+        Args:
+            flush: 在单个事务中写入一批更新的协程函数
+            interval: 收集窗口（秒）
+            max_batch_size: 单批最多更新数
+        """
+        self._flush = flush
+        self._interval = interval
+        self._max_batch_size = max(1, max_batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._items = 0
+
+    def _ensure_started(self) -> None:
+        """在当前事件循环中启动写入协程（惰性启动）"""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="batch-writer")
+
+    async def submit(self, item: Any) -> None:
+        """提交一条更新，等待写入完成（写入失败时抛出对应的异常）"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        await future
+
+    async def _collect(self) -> Tuple[List[Tuple[Any, asyncio.Future]], bool]:
+        """收集一批更新，返回 (batch, stop)，stop 表示取到了停止标记"""
+        pair = await self._queue.get()
+        if pair[0] is _STOP:
+            return [], True
+        batch = [pair]
+        if self._queue.qsize() < self._max_batch_size - 1:
+            await asyncio.sleep(self._interval)
+        while len(batch) < self._max_batch_size and not self._queue.empty():
+            pair = self._queue.get_nowait()
+            if pair[0] is _STOP:
+                return batch, True
+            batch.append(pair)
+        return batch, False
+
+    async def _run(self) -> None:
+        while True:
+            batch, stop = await self._collect()
+            if batch:
+                await self._write(batch)
+            if stop:
+                return
+
+    async def _write(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            await self._flush([item for item, _ in batch])
+            self._batches += 1
+            self._items += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            return
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            logger.warning("Batched write failed, retrying items individually", extra={
+                "size": len(batch),
+                "error": str(e)
+            })
+        for pair in batch:
+            await self._write([pair])
+
+    async def shutdown(self) -> None:
+        """写完队列中剩余的更新后停止写入协程"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._queue.put_nowait((_STOP, None))
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # 停止标记之后才提交的更新
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for i in range(0, len(pending), self._max_batch_size):
+            await self._write(pending[i:i + self._max_batch_size])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+        }
@@ -2,40 +2,110 @@
 数据库模型定义
 使用SQLAlchemy ORM
 """
-from sqlalchemy import Column, String, Text, DateTime, create_engine, Index
+from sqlalchemy import (
+    Column, String, Text, DateTime, Integer, BigInteger, LargeBinary, create_engine, Index, event
+)
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime
 from app.config import settings
+from app.utils.metrics import instrument_engine
+import hashlib
 import sys
 
 Base = declarative_base()
 
 
+def hash_url(url: str) -> str:
+    """计算 URL 的定长摘要（SHA-256 十六进制），用于唯一索引去重"""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
 class TaskModel(Base):
     """任务数据库模型"""
     __tablename__ = "tasks"
 
     id = Column(String(36), primary_key=True)
     url = Column(Text, nullable=False)  # TEXT 类型，不直接索引
+    url_hash = Column(String(64), nullable=True)  # url 的 SHA-256，唯一索引
+    extractor = Column(String(64), nullable=True)  # yt-dlp 提取器（ie_key）
+    video_id = Column(String(255), nullable=True)  # 提取器识别出的视频ID，与 extractor 组成唯一键
     video_title = Column(String(500), nullable=True)
     output_path = Column(String(500), nullable=False)
     format = Column(String(100), nullable=False)
+    options = Column(Text, nullable=True)  # 请求中的传输参数（JSON），恢复/分布式执行时沿用
+    timings = Column(Text, nullable=True)  # 最近一次执行各阶段的时间戳（JSON）
     status = Column(String(20), nullable=False, index=True)
     result = Column(Text, nullable=True)
     error = Column(Text, nullable=True)
     create_time = Column(DateTime, nullable=False, default=datetime.now, index=True)
     update_time = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, index=True)
+    # 分布式执行：worker 领取任务时写入租约，定期续约，过期后可被其他 worker 重新领取
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # 被领取的次数
 
     # 为 TEXT 类型的 url 列创建前缀索引（MySQL 限制）
     __table_args__ = (
         Index('ix_tasks_url_prefix', url, mysql_length=255),
+        Index('ux_tasks_url_hash', url_hash, unique=True),
+        Index('ux_tasks_video_key', extractor, video_id, unique=True),
+        # 列表页的键集分页：按状态过滤并按 (update_time, id) 排序
+        Index('ix_tasks_status_update_time_id', status, update_time, id),
+        Index('ix_tasks_update_time_id', update_time, id),
+        # worker 领取 pending 且租约为空或已过期的任务
+        Index('ix_tasks_status_lease_expires', status, lease_expires),
     )
 
     def __repr__(self):
         return f"<Task(id={self.id}, url={self.url[:50] if self.url else ''}..., title={self.video_title}, status={self.status})>"
 
 
+class TaskInfoModel(Base):
+    """任务完整视频信息（压缩存储，只在明确请求时读取）"""
+    __tablename__ = "task_info"
+
+    task_id = Column(String(36), primary_key=True)
+    codec = Column(String(10), nullable=False)  # zstd 或 gzip
+    data = Column(LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"), nullable=False)
+    raw_size = Column(Integer, nullable=False)  # 压缩前的字节数
+    create_time = Column(DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return f"<TaskInfo(task_id={self.task_id}, codec={self.codec}, raw_size={self.raw_size})>"
+
+
+class MediaFileModel(Base):
+    """
+    已完成任务的输出文件
+
+    下载完成时记录最终文件，之后以其他 output_path 请求同一视频时通过硬链接/reflink/复制生成，
+    生成的副本同样记录在这里（method 区分来源）
+    """
+    __tablename__ = "media_files"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task_id = Column(String(36), nullable=False)
+    path = Column(String(1024), nullable=False)  # 绝对路径
+    path_hash = Column(String(64), nullable=False)  # path 的 SHA-256，唯一索引
+    size = Column(BigInteger, nullable=False)
+    checksum = Column(String(64), nullable=False)  # 文件内容的 SHA-256
+    method = Column(String(10), nullable=False)  # download / hardlink / reflink / copy
+    create_time = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_media_files_task_id', task_id),
+        Index('ux_media_files_path_hash', path_hash, unique=True),
+        Index('ix_media_files_checksum', checksum),
+    )
+
+    def __repr__(self):
+        return f"<MediaFile(task_id={self.task_id}, path={self.path}, method={self.method})>"
+
+
 # 创建数据库引擎
 try:
     engine = create_engine(
@@ -53,14 +123,70 @@ except Exception as e:
     print(f"数据库URL: {settings.get_database_url()}")
     sys.exit(1)
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    SQLite 连接参数（每个新连接执行一次）
+
+    - WAL：读操作不会被写事务阻塞，写入只追加日志
+    - synchronous=NORMAL：WAL 模式下只在检查点 fsync，掉电最多丢失最近的事务，不会损坏数据库
+    - busy_timeout：写锁被占用时等待而不是立即报 "database is locked"
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        if settings.sqlite_wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_mb) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+instrument_engine(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎（供事件循环中的请求处理使用，避免阻塞）
+try:
+    async_engine = create_async_engine(
+        settings.get_async_database_url(),
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=False,
+        connect_args={
+            "connect_timeout": 10
+        } if settings.database_type == "mysql" else {}
+    )
+except Exception as e:
+    print(f"错误: 无法创建异步数据库引擎: {e}")
+    print(f"数据库URL: {settings.get_async_database_url()}")
+    print("请确认已安装 aiomysql / aiosqlite")
+    sys.exit(1)
+
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+instrument_engine(async_engine.sync_engine)
+
+# 创建异步会话工厂
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
 def init_database():
     """初始化数据库，创建所有表"""
+    from app.db.migrations import run_migrations
+
     try:
         Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
     except Exception as e:
         print(f"错误: 无法初始化数据库: {e}")
         print(f"请检查数据库连接配置")
@@ -0,0 +1,262 @@
+"""
+数据库结构迁移
+create_all 只会创建缺失的表，已有表新增的列和索引在这里以幂等的方式补齐
+"""
+from datetime import datetime
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Engine
+from app.utils.logger import logger
+
+# 回填时每批处理的行数
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _columns(engine: Engine, table: str) -> set:
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def _indexes(engine: Engine, table: str) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def _add_url_hash(engine: Engine) -> None:
+    """新增 tasks.url_hash 列，回填已有数据并创建唯一索引"""
+    from app.db.database import hash_url
+
+    if "url_hash" not in _columns(engine, "tasks"):
+        logger.info("Migrating: adding tasks.url_hash")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN url_hash VARCHAR(64) NULL"))
+
+    if "ux_tasks_url_hash" in _indexes(engine, "tasks"):
+        return
+
+    # 回填：同一 URL 存在多条记录时（历史上的并发重复提交），
+    # 只有最早的一条获得 url_hash，其余保持 NULL，不参与去重
+    seen = set()
+    backfilled = 0
+    last = None
+    with engine.begin() as conn:
+        for row in conn.execute(text("SELECT url_hash FROM tasks WHERE url_hash IS NOT NULL")):
+            seen.add(row[0])
+        while True:
+            # 按 (create_time, id) 做键集分页，被跳过的重复记录不会被重复读取
+            if last is None:
+                rows = conn.execute(text(
+                    "SELECT id, url, create_time FROM tasks WHERE url_hash IS NULL "
+                    "ORDER BY create_time, id LIMIT :limit"
+                ), {"limit": BACKFILL_BATCH_SIZE}).all()
+            else:
+                rows = conn.execute(text(
+                    "SELECT id, url, create_time FROM tasks WHERE url_hash IS NULL "
+                    "AND (create_time > :t OR (create_time = :t AND id > :id)) "
+                    "ORDER BY create_time, id LIMIT :limit"
+                ), {"t": last[0], "id": last[1], "limit": BACKFILL_BATCH_SIZE}).all()
+            if not rows:
+                break
+            last = (rows[-1][2], rows[-1][0])
+
+            updates = []
+            for task_id, url, _ in rows:
+                digest = hash_url(url)
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                updates.append({"id": task_id, "url_hash": digest})
+            if updates:
+                conn.execute(text("UPDATE tasks SET url_hash = :url_hash WHERE id = :id"), updates)
+                backfilled += len(updates)
+    logger.info("Migrating: creating unique index on tasks.url_hash", extra={"backfilled": backfilled})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE UNIQUE INDEX ux_tasks_url_hash ON tasks (url_hash)"))
+
+
+def _add_video_key(engine: Engine) -> None:
+    """新增 tasks.extractor / tasks.video_id 列，离线识别回填并创建唯一索引"""
+    from app.core.canonical import canonical_video_key
+
+    columns = _columns(engine, "tasks")
+    with engine.begin() as conn:
+        if "extractor" not in columns:
+            logger.info("Migrating: adding tasks.extractor")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN extractor VARCHAR(64) NULL"))
+        if "video_id" not in columns:
+            logger.info("Migrating: adding tasks.video_id")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN video_id VARCHAR(255) NULL"))
+
+    if "ux_tasks_video_key" in _indexes(engine, "tasks"):
+        return
+
+    # 回填：同一视频的多条记录中只有最早的一条获得 (extractor, video_id)
+    seen = set()
+    backfilled = 0
+    last = None
+    with engine.begin() as conn:
+        while True:
+            if last is None:
+                rows = conn.execute(text(
+                    "SELECT id, url, create_time FROM tasks "
+                    "ORDER BY create_time, id LIMIT :limit"
+                ), {"limit": BACKFILL_BATCH_SIZE}).all()
+            else:
+                rows = conn.execute(text(
+                    "SELECT id, url, create_time FROM tasks "
+                    "WHERE create_time > :t OR (create_time = :t AND id > :id) "
+                    "ORDER BY create_time, id LIMIT :limit"
+                ), {"t": last[0], "id": last[1], "limit": BACKFILL_BATCH_SIZE}).all()
+            if not rows:
+                break
+            last = (rows[-1][2], rows[-1][0])
+
+            updates = []
+            for task_id, url, _ in rows:
+                key = canonical_video_key(url)
+                if key is None or key in seen:
+                    continue
+                seen.add(key)
+                updates.append({"id": task_id, "extractor": key[0], "video_id": key[1]})
+            if updates:
+                conn.execute(text(
+                    "UPDATE tasks SET extractor = :extractor, video_id = :video_id WHERE id = :id"
+                ), updates)
+                backfilled += len(updates)
+    logger.info("Migrating: creating unique index on tasks (extractor, video_id)", extra={
+        "backfilled": backfilled
+    })
+    with engine.begin() as conn:
+        conn.execute(text("CREATE UNIQUE INDEX ux_tasks_video_key ON tasks (extractor, video_id)"))
+
+
+def _compact_results(engine: Engine) -> None:
+    """将历史任务中完整的 result 压缩移入 task_info 表，任务记录中只保留摘要"""
+    import json
+    from app.config import settings
+    from app.core.task_manager import summarize_result
+    from app.utils.compression import compress
+
+    compacted = 0
+    last_id = ""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, result FROM tasks WHERE result IS NOT NULL AND id > :last_id "
+                "ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            infos = []
+            summaries = []
+            for task_id, result in rows:
+                try:
+                    info = json.loads(result)
+                except ValueError:
+                    continue
+                # 已经是摘要（没有 formats 等完整字段）的记录跳过
+                if not isinstance(info, dict) or "formats" not in info and "requested_downloads" not in info:
+                    continue
+                raw = result.encode("utf-8")
+                codec, data = compress(raw, settings.info_compression)
+                infos.append({
+                    "task_id": task_id, "codec": codec, "data": data,
+                    "raw_size": len(raw), "create_time": datetime.now()
+                })
+                summaries.append({"id": task_id, "result": json.dumps(summarize_result(info))})
+            if infos:
+                conn.execute(text("DELETE FROM task_info WHERE task_id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ), {"ids": [info["task_id"] for info in infos]})
+                conn.execute(text(
+                    "INSERT INTO task_info (task_id, codec, data, raw_size, create_time) "
+                    "VALUES (:task_id, :codec, :data, :raw_size, :create_time)"
+                ), infos)
+                conn.execute(text("UPDATE tasks SET result = :result WHERE id = :id"), summaries)
+                compacted += len(infos)
+    logger.info("Migrating: compacted task results", extra={"compacted": compacted})
+
+
+def _add_list_indexes(engine: Engine) -> None:
+    """新增 /tasks 键集分页使用的复合索引"""
+    indexes = _indexes(engine, "tasks")
+    with engine.begin() as conn:
+        if "ix_tasks_status_update_time_id" not in indexes:
+            logger.info("Migrating: creating index ix_tasks_status_update_time_id")
+            conn.execute(text(
+                "CREATE INDEX ix_tasks_status_update_time_id ON tasks (status, update_time, id)"
+            ))
+        if "ix_tasks_update_time_id" not in indexes:
+            logger.info("Migrating: creating index ix_tasks_update_time_id")
+            conn.execute(text("CREATE INDEX ix_tasks_update_time_id ON tasks (update_time, id)"))
+
+
+def _add_task_leases(engine: Engine) -> None:
+    """新增分布式执行使用的 priority / lease_owner / lease_expires / attempts 列"""
+    columns = _columns(engine, "tasks")
+    with engine.begin() as conn:
+        if "priority" not in columns:
+            logger.info("Migrating: adding tasks.priority")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"))
+        if "lease_owner" not in columns:
+            logger.info("Migrating: adding tasks.lease_owner")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN lease_owner VARCHAR(64) NULL"))
+        if "lease_expires" not in columns:
+            logger.info("Migrating: adding tasks.lease_expires")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN lease_expires DATETIME NULL"))
+        if "attempts" not in columns:
+            logger.info("Migrating: adding tasks.attempts")
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+    if "ix_tasks_status_lease_expires" not in _indexes(engine, "tasks"):
+        logger.info("Migrating: creating index ix_tasks_status_lease_expires")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX ix_tasks_status_lease_expires ON tasks (status, lease_expires)"
+            ))
+
+
+def _add_download_options(engine: Engine) -> None:
+    """新增 tasks.options 列（请求中的传输参数）"""
+    if "options" not in _columns(engine, "tasks"):
+        logger.info("Migrating: adding tasks.options")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN options TEXT NULL"))
+
+
+def _add_task_timings(engine: Engine) -> None:
+    """新增 tasks.timings 列（各阶段时间戳）"""
+    if "timings" not in _columns(engine, "tasks"):
+        logger.info("Migrating: adding tasks.timings")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN timings TEXT NULL"))
+
+
+# 按顺序执行，已执行的迁移记录在 schema_migrations 表中；每一步也都必须是幂等的
+MIGRATIONS = [
+    _add_url_hash,
+    _add_video_key,
+    _compact_results,
+    _add_list_indexes,
+    _add_task_leases,
+    _add_download_options,
+    _add_task_timings,
+]
+
+
+def run_migrations(engine: Engine) -> None:
+    """执行所有未执行过的迁移"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "name VARCHAR(100) NOT NULL PRIMARY KEY, applied_time DATETIME NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+
+    for migration in MIGRATIONS:
+        name = migration.__name__.lstrip("_")
+        if name in applied:
+            continue
+        migration(engine)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO schema_migrations (name, applied_time) VALUES (:name, :now)"
+            ), {"name": name, "now": datetime.now()})
@@ -1,21 +1,64 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 import uvicorn
 import os
-from app.api.router import router
+import time
+from app.api.router import router, readiness, shutdown, startup
 from app.config import settings
-from app.utils.logger import logger
+from app.utils.logger import logger, setup_logger
+from app.utils import metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 导入模块时不做初始化；日志、数据库在这里初始化，yt-dlp 在开始监听后于后台预热
+    started = time.perf_counter()
+    setup_logger()
+    logger.info("Starting yt-dlp API server", extra={
+        "host": settings.app_host,
+        "port": settings.app_port,
+        "database_type": settings.database_type,
+        "database_url": settings.get_database_url(),
+        "log_level": settings.log_level,
+        "log_format": settings.log_format,
+        "frontend_enabled": os.path.exists(FRONTEND_BUILD_PATH),
+    })
+    # 初始化数据库；未完成的任务在 yt-dlp 预热完成后于后台重新调度
+    await startup()
+    logger.info("Startup complete", extra={"duration": round(time.perf_counter() - started, 3)})
+    yield
+    await shutdown()
+    logger.info("yt-dlp API server stopped")
+
 
 app = FastAPI(
     title="yt-dlp API",
     description="API for downloading videos using yt-dlp",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # API 路由（添加 /api 前缀）
 app.include_router(router, prefix="/api")
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus 抓取接口"""
+    rendered = metrics.render()
+    if rendered is None:
+        return PlainTextResponse("prometheus_client is not installed\n", status_code=503)
+    content, content_type = rendered
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """就绪检查：数据库已初始化且 yt-dlp 预热完成时返回 200，否则返回 503"""
+    data = readiness()
+    return JSONResponse(data, status_code=200 if data["ready"] else 503)
+
 # 前端静态文件路径
 FRONTEND_BUILD_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "yt-dlp-api-front", "build")
 
@@ -42,16 +85,6 @@ if os.path.exists(FRONTEND_BUILD_PATH):
 
 def start_api():
     """启动API服务器"""
-    logger.info("Starting yt-dlp API server", extra={
-        "host": settings.app_host,
-        "port": settings.app_port,
-        "database_type": settings.database_type,
-        "database_url": settings.get_database_url(),
-        "log_level": settings.log_level,
-        "log_format": settings.log_format,
-        "frontend_enabled": os.path.exists(FRONTEND_BUILD_PATH),
-    })
-
     uvicorn.run(
         app,
         host=settings.app_host,
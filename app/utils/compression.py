@@ -0,0 +1,37 @@
+"""
+压缩工具
+优先使用 zstd，未安装 zstandard 时回退到 gzip；读取时按记录中的编码解压
+"""
+import gzip
+from typing import Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+CODEC_ZSTD = "zstd"
+CODEC_GZIP = "gzip"
+
+
+def compress(data: bytes, codec: str = CODEC_ZSTD, level: int = 3) -> Tuple[str, bytes]:
+    """
+    压缩数据
+
+    Returns:
+        (实际使用的编码, 压缩后的数据)
+    """
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=level).compress(data)
+    return CODEC_GZIP, gzip.compress(data, compresslevel=min(max(level, 1), 9))
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """按编码解压数据"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_GZIP:
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
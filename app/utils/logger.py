@@ -1,13 +1,39 @@
 """
 结构化日志配置模块
 使用 loguru 实现结构化日志
+
+默认由后台线程格式化和写入日志：调用方只生成记录并放入队列，不在下载线程和事件循环上做序列化和文件 I/O
 """
-import sys
+import atexit
+import json
 import os
+import queue
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
 from loguru import logger
 from app.config import settings
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+# 后台写入模式下，由后台线程重新发出的记录带有此标记，只有真正输出的处理器接收
+_REPLAY = "_replay"
+# json_formatter 保存序列化结果的 extra 键（同一条记录写入多个文件时只序列化一次）
+_SERIALIZED = "serialized"
+_INTERNAL_KEYS = (_REPLAY, _SERIALIZED)
+_DEBUG = 10
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
 
 def serialize_record(record):
     """序列化日志记录为JSON格式"""
@@ -21,8 +47,9 @@ def serialize_record(record):
     }
 
     # 添加额外的上下文信息
-    if record["extra"]:
-        subset["extra"] = record["extra"]
+    extra = {key: value for key, value in record["extra"].items() if key not in _INTERNAL_KEYS}
+    if extra:
+        subset["extra"] = extra
 
     # 添加异常信息
     if record["exception"]:
@@ -36,8 +63,8 @@ def serialize_record(record):
 
 def json_formatter(record):
     """JSON格式化器"""
-    import json
-    record["extra"]["serialized"] = json.dumps(serialize_record(record), ensure_ascii=False)
+    if _SERIALIZED not in record["extra"]:
+        record["extra"][_SERIALIZED] = _dumps(serialize_record(record))
     return "{extra[serialized]}\n"
 
 
@@ -52,8 +79,128 @@ def text_formatter(record):
     )
 
 
+class DebugSampler:
+    """
+    DEBUG 日志采样（loguru filter）
+
+    同一调用位置的 DEBUG 及以下级别日志每 interval 秒最多输出一条，
+    期间丢弃的条数记在下一条输出记录的 extra["sampled_out"] 中；interval 为 0 时不采样
+    """
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._sites: Dict[Tuple[str, int], list] = {}  # 调用位置 -> [下次允许输出的时间, 已丢弃条数]
+        self._local = threading.local()
+
+    def __call__(self, record) -> bool:
+        if self._interval <= 0 or record["level"].no > _DEBUG:
+            return True
+        # 同步写入时每个处理器都会调用 filter，同一条记录复用第一次的结果
+        local = self._local
+        if getattr(local, "record", None) is record:
+            return local.allowed
+        allowed = self._sample(record)
+        local.record, local.allowed = record, allowed
+        return allowed
+
+    def _sample(self, record) -> bool:
+        site = (record["name"], record["line"])
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is not None and now < state[0]:
+                state[1] += 1
+                return False
+            dropped = state[1] if state is not None else 0
+            self._sites[site] = [now + self._interval, 0]
+        if dropped:
+            record["extra"]["sampled_out"] = dropped
+        return True
+
+
+_replaying = threading.local()
+
+
+def _restore_record(record) -> None:
+    """patcher：用队列中的原始记录替换重新发出的记录（时间、调用位置、异常等保持不变）"""
+    original = _replaying.record
+    record.update(original)
+    record["extra"] = {**original["extra"], _REPLAY: True}
+
+
+class BackgroundWriter:
+    """
+    后台日志写入线程
+
+    调用方只把 loguru 生成的记录放入进程内队列；后台线程按顺序把记录重新发给真正的处理器，
+    格式化、JSON 序列化和文件 I/O 都在后台线程中进行。进程退出时写完队列中剩余的记录
+    """
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._replay_logger = logger.patch(_restore_record)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def restart_after_fork(self) -> None:
+        """fork 出的子进程中没有后台线程，重新创建队列和线程"""
+        self._queue = queue.SimpleQueue()
+        self.start()
+
+    def sink(self, message) -> None:
+        self._queue.put(message.record)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            _replaying.record = item
+            self._replay_logger.log(item["level"].name, item["message"])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前放入队列的记录全部写出"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+
+def _no_format(record) -> str:
+    # 入队的处理器不需要格式化消息，后台线程中的处理器负责格式化
+    return ""
+
+
+def _is_replayed(record) -> bool:
+    return _REPLAY in record["extra"]
+
+
+# 当前的后台写入线程（LOG_BACKGROUND=false 时为 None）
+_writer: Optional[BackgroundWriter] = None
+
+
 def setup_logger():
     """配置日志系统"""
+    global _writer
+
+    # 先写完旧的后台线程中的记录，再移除处理器
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
     # 移除默认的处理器
     logger.remove()
 
@@ -63,14 +210,21 @@ def setup_logger():
     else:
         formatter = text_formatter
 
+    # 生产环境不在异常日志中输出变量值（可能包含敏感信息，且开销较大）
+    diagnose = settings.app_env != "production"
+    sampler = DebugSampler(settings.log_debug_sample_interval)
+    # 后台写入时，真正输出的处理器只接收后台线程重新发出的记录（采样已在入队前完成）
+    output_filter = _is_replayed if settings.log_background else sampler
+
     # 控制台输出（彩色文本格式）
     logger.add(
         sys.stderr,
         format=text_formatter,
         level=settings.log_level,
+        filter=output_filter,
         colorize=True,
         backtrace=True,
-        diagnose=True,
+        diagnose=diagnose,
     )
 
     # 文件输出
@@ -79,41 +233,74 @@ def setup_logger():
 
     logger.add(
         settings.log_file,
-        format=formatter if settings.log_format == "json" else text_formatter,
+        format=formatter,
         level=settings.log_level,
+        filter=output_filter,
         rotation=settings.log_rotation,
         retention=settings.log_retention,
         compression=settings.log_compression,
         encoding="utf-8",
         backtrace=True,
-        diagnose=True,
+        diagnose=diagnose,
     )
 
     # 错误日志单独文件
     error_log_file = str(log_path.parent / f"{log_path.stem}_error{log_path.suffix}")
     logger.add(
         error_log_file,
-        format=formatter if settings.log_format == "json" else text_formatter,
+        format=formatter,
         level="ERROR",
+        filter=output_filter,
         rotation=settings.log_rotation,
         retention=settings.log_retention,
         compression=settings.log_compression,
         encoding="utf-8",
         backtrace=True,
-        diagnose=True,
+        diagnose=diagnose,
     )
 
+    if settings.log_background:
+        _writer = BackgroundWriter()
+        _writer.start()
+        logger.add(
+            _writer.sink,
+            format=_no_format,
+            level=settings.log_level,
+            filter=lambda record: not _is_replayed(record) and sampler(record),
+            backtrace=False,
+            diagnose=False,
+        )
+
     logger.info("Logger initialized", extra={
         "log_level": settings.log_level,
         "log_format": settings.log_format,
         "log_file": settings.log_file,
+        "log_background": settings.log_background,
+        "json_encoder": "orjson" if orjson is not None else "json",
     })
 
     return logger
 
 
-# 初始化日志
-setup_logger()
+def flush_logs(timeout: Optional[float] = None) -> bool:
+    """等待后台线程写完已产生的日志（同步写入时直接返回）"""
+    return _writer.flush(timeout) if _writer is not None else True
+
+
+def _stop_writer() -> None:
+    if _writer is not None:
+        _writer.stop()
+
+
+def _restart_writer_in_child() -> None:
+    if _writer is not None:
+        _writer.restart_after_fork()
+
+
+atexit.register(_stop_writer)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_writer_in_child)
 
-# 导出logger供其他模块使用
-__all__ = ["logger"]
+# 导出logger供其他模块使用（导入时不配置处理器，由入口调用 setup_logger：
+# API 在 lifespan 中，分布式 worker 在 main 中，下载 worker 进程在 initializer 中）
+__all__ = ["logger", "setup_logger", "flush_logs"]
@@ -0,0 +1,153 @@
+"""
+Prometheus 监控指标
+热路径上只做计数器自增和直方图观测；队列长度等状态类指标在抓取时才计算。
+未安装 prometheus_client 时所有指标为空操作，/metrics 返回 503
+"""
+import time
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client 为可选依赖
+    prometheus_client = None
+
+# 下载各阶段耗时的分桶（秒），覆盖短视频到数小时的长视频
+PHASE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+# 数据库耗时的分桶（秒）
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+# 语句类型标签，其余归为 OTHER（PRAGMA、建表等），限制标签基数
+DB_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+class _NoopMetric:
+    """prometheus_client 未安装时的替身，接口与 Counter / Gauge / Histogram 一致"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def set_function(self, f: Callable[[], float]) -> None:
+        pass
+
+    def observe(self, amount: float) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+TASK_TRANSITIONS = _metric(
+    "Counter", "ytdlp_task_transitions_total", "Task status transitions", ("from_status", "to_status")
+)
+QUEUE_WAIT = _metric(
+    "Histogram", "ytdlp_queue_wait_seconds", "Time from enqueue until a download slot is taken",
+    buckets=PHASE_BUCKETS
+)
+EXTRACT_DURATION = _metric(
+    "Histogram", "ytdlp_extract_duration_seconds", "Info extraction time", ("extractor",),
+    buckets=PHASE_BUCKETS
+)
+DOWNLOAD_DURATION = _metric(
+    "Histogram", "ytdlp_download_duration_seconds", "Network download time", ("extractor",),
+    buckets=PHASE_BUCKETS
+)
+POSTPROCESS_DURATION = _metric(
+    "Histogram", "ytdlp_postprocess_duration_seconds", "Post-processing (merge/fixup) time", ("extractor",),
+    buckets=PHASE_BUCKETS
+)
+DOWNLOADED_BYTES = _metric(
+    "Counter", "ytdlp_downloaded_bytes_total", "Bytes of completed downloads", ("extractor",)
+)
+DOWNLOAD_SPEED = _metric("Gauge", "ytdlp_download_speed_bytes", "Current aggregate download speed (bytes/s)")
+ACTIVE_DOWNLOADS = _metric("Gauge", "ytdlp_active_downloads", "Downloads currently running")
+QUEUED_DOWNLOADS = _metric("Gauge", "ytdlp_queued_downloads", "Downloads waiting in the scheduler queue")
+EXECUTOR_BUSY = _metric("Gauge", "ytdlp_executor_busy_threads", "Thread pool threads running a job")
+EXECUTOR_SIZE = _metric("Gauge", "ytdlp_executor_threads", "Thread pool size")
+DB_QUERY_DURATION = _metric(
+    "Histogram", "ytdlp_db_query_duration_seconds", "Database statement execution time", ("operation",),
+    buckets=DB_BUCKETS
+)
+DB_SESSION_DURATION = _metric(
+    "Histogram", "ytdlp_db_session_duration_seconds", "Time a database connection is checked out",
+    buckets=DB_BUCKETS
+)
+
+
+def observe_phases(extractor: Optional[str], timings: Dict[str, float]) -> None:
+    """
+    按任务的阶段时间戳（progress.task_timings）记录提取、下载、后处理耗时
+
+    Args:
+        extractor: 提取器名称（标签）
+        timings: started_at / extracted_at / downloaded_at / postprocessed_at / finished_at
+    """
+    extractor = extractor or "unknown"
+    started = timings.get("started_at")
+    extracted = timings.get("extracted_at")
+    downloaded = timings.get("downloaded_at")
+    postprocessed = timings.get("postprocessed_at")
+    if started is not None and extracted is not None:
+        EXTRACT_DURATION.labels(extractor).observe(extracted - started)
+    if extracted is not None and downloaded is not None:
+        DOWNLOAD_DURATION.labels(extractor).observe(downloaded - extracted)
+    if downloaded is not None and postprocessed is not None:
+        POSTPROCESS_DURATION.labels(extractor).observe(postprocessed - downloaded)
+
+
+def instrument_engine(engine: Any) -> None:
+    """为同步引擎（异步引擎传入 async_engine.sync_engine）注册语句和连接耗时的事件"""
+    if prometheus_client is None:
+        return
+    from sqlalchemy import event
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        operation = statement[:6].upper()
+        if operation not in DB_OPERATIONS:
+            operation = "OTHER"
+        DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+    def handle_error(context):
+        # 执行失败时不会触发 after_cursor_execute
+        if context.connection is not None and context.connection.info.get("query_start"):
+            context.connection.info["query_start"].pop()
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_time"] = time.perf_counter()
+
+    def checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checkout_time", None)
+        if started is not None:
+            DB_SESSION_DURATION.observe(time.perf_counter() - started)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    event.listen(engine, "after_cursor_execute", after_execute)
+    event.listen(engine, "handle_error", handle_error)
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "checkin", checkin)
+
+
+def render() -> Optional[tuple]:
+    """
+    生成抓取内容
+
+    Returns:
+        (内容, Content-Type)，未安装 prometheus_client 时为 None
+    """
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,157 @@
+"""
+分布式下载 worker
+从数据库领取 pending 任务（租约 + 心跳）并执行下载，可在多台机器上运行多个实例
+
+用法：
+    EXECUTION_MODE=distributed python -m app.worker
+"""
+import asyncio
+import os
+import signal
+import socket
+from datetime import datetime
+from typing import Dict
+from app.api import router as api
+from app.config import settings
+from app.core.disk_space import disk_space
+from app.core.host_limiter import host_limiter, limit_key
+from app.core.scheduler import JobDeferred
+from app.core.task_manager import Task
+from app.utils.logger import logger, setup_logger
+from app.utils import metrics
+
+
+class LeaseWorker:
+    """
+    租约 worker
+
+    - 同时执行的任务数不超过 concurrency，有空闲时按优先级领取任务
+    - 每 heartbeat_interval 秒为执行中的任务续约；进程失联时租约过期，任务被其他 worker 重新领取
+    - 续约失败（租约已被其他 worker 领取）的任务在本地取消，结束状态也只在仍持有租约时写入
+    - 收到 SIGINT/SIGTERM 后停止领取，等待执行中的任务完成后退出
+    """
+
+    def __init__(self, worker_id: str, concurrency: int):
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self._active: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+        self._slot_freed = asyncio.Event()
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info("Worker stopping, waiting for active tasks", extra={
+                "worker_id": self.worker_id,
+                "active": len(self._active)
+            })
+        self._stopping.set()
+        self._slot_freed.set()
+
+    async def _execute(self, task: Task) -> None:
+        key = None
+        # 从入库（或失败重试）到被领取的等待时间
+        metrics.QUEUE_WAIT.observe(
+            max(0.0, (datetime.now() - datetime.fromisoformat(task.update_time)).total_seconds())
+        )
+        try:
+            if host_limiter is not None:
+                # 站点并发已满时等待（等待期间心跳照常续约）
+                key = await asyncio.to_thread(limit_key, task.url)
+                await host_limiter.acquire(key)
+            while True:
+                try:
+                    await api.process_download_task(
+                        task_id=task.id,
+                        url=task.url,
+                        output_path=task.output_path,
+                        format=task.format,
+                        quiet=False,
+                        options=task.options,
+                        priority=task.priority,
+                        lease_owner=self.worker_id
+                    )
+                    break
+                except JobDeferred:
+                    # 磁盘空间不足：保持租约，等本机其他下载释放空间后重试
+                    await disk_space.wait(settings.disk_recheck_interval)
+        finally:
+            if key is not None:
+                host_limiter.release(key)
+            self._active.pop(task.id, None)
+            self._slot_freed.set()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(settings.lease_heartbeat_interval)
+            task_ids = list(self._active)
+            renewed = await api.state.renew_leases(self.worker_id, task_ids, settings.lease_ttl)
+            if renewed is None:
+                # 数据库暂时不可用，租约可能仍有效；结束状态的写入由租约校验兜底
+                continue
+            renewed = set(renewed)
+            for task_id in task_ids:
+                execution = self._active.get(task_id)
+                if task_id in renewed or execution is None:
+                    continue
+                # 租约已过期并被其他 worker 领取：停止本地执行，不再写入结果
+                logger.warning("Task lease lost, cancelling local execution", extra={
+                    "worker_id": self.worker_id,
+                    "task_id": task_id
+                })
+                execution.cancel()
+
+    async def run(self) -> None:
+        logger.info("Worker started", extra={
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "lease_ttl": settings.lease_ttl
+        })
+        heartbeat = asyncio.create_task(self._heartbeat(), name="lease-heartbeat")
+        try:
+            while not self._stopping.is_set():
+                free = self.concurrency - len(self._active)
+                claimed = []
+                if free > 0:
+                    claimed = await api.state.claim_tasks(self.worker_id, free, settings.lease_ttl)
+                    for task in claimed:
+                        self._active[task.id] = asyncio.create_task(
+                            self._execute(task), name=f"task-{task.id}"
+                        )
+                if claimed and len(self._active) < self.concurrency:
+                    # 可能还有更多任务，立即继续领取
+                    continue
+                # 没有可领取的任务时轮询，已满时等待有任务结束
+                self._slot_freed.clear()
+                timeout = settings.worker_poll_interval if free > 0 else None
+                try:
+                    await asyncio.wait_for(self._slot_freed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            if self._active:
+                await asyncio.gather(*self._active.values(), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            await api.state.shutdown()
+            logger.info("Worker stopped", extra={"worker_id": self.worker_id})
+
+
+async def main() -> None:
+    setup_logger()
+    await api.state.initialize()
+    worker_id = settings.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    worker = LeaseWorker(worker_id, settings.max_concurrent_downloads)
+    if settings.worker_metrics_port and metrics.prometheus_client is not None:
+        metrics.ACTIVE_DOWNLOADS.set_function(lambda: len(worker._active))
+        metrics.prometheus_client.start_http_server(settings.worker_metrics_port)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:  # Windows
+            pass
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
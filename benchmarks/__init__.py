@@ -0,0 +1,5 @@
+"""
+端到端性能基准测试
+fixtures 提供离线可下载的合成媒体，loadgen 按设定速率压测 API 并输出 JSON 报告，compare 对比两次报告，
+logging_overhead 测量日志调用的开销，startup 测量导入和启动耗时
+"""
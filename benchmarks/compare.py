@@ -0,0 +1,101 @@
+"""
+对比两次基准测试报告（benchmarks.loadgen 的 JSON 输出）
+
+    python -m benchmarks.compare base.json head.json --threshold 15
+
+按数据库和接口列出吞吐量和延迟分位数的变化；延迟上升或吞吐量下降超过阈值（百分比）的项标记为回退，
+指定 --fail-on-regression 时有回退则以状态码 1 退出（用于 CI）
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LATENCY_KEYS = ("p50", "p95", "p99")
+
+
+def _change(base: Optional[float], head: Optional[float]) -> Optional[float]:
+    """相对变化（百分比），base 为 0 或缺失时为 None"""
+    if not base or head is None:
+        return None
+    return (head - base) / base * 100
+
+
+def _metrics(run: Dict[str, Any]) -> Iterator[Tuple[str, Optional[float], bool]]:
+    """(指标名, 值, 是否越大越好)"""
+    for name, endpoint in run.get("endpoints", {}).items():
+        yield f"{name}.throughput_rps", endpoint.get("throughput_rps"), True
+        for key in LATENCY_KEYS:
+            yield f"{name}.latency_ms.{key}", endpoint.get("latency_ms", {}).get(key), False
+    tasks = run.get("tasks", {})
+    yield "tasks.throughput_tps", tasks.get("throughput_tps"), True
+    for key in LATENCY_KEYS:
+        yield f"tasks.end_to_end_s.{key}", tasks.get("end_to_end_s", {}).get(key), False
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """逐项对比两份报告中都存在的数据库"""
+    rows = []
+    for db in base.get("runs", {}):
+        if db not in head.get("runs", {}):
+            continue
+        head_metrics = {name: value for name, value, _ in _metrics(head["runs"][db])}
+        for name, base_value, higher_is_better in _metrics(base["runs"][db]):
+            if name not in head_metrics:
+                continue
+            head_value = head_metrics[name]
+            change = _change(base_value, head_value)
+            regression = change is not None and (-change if higher_is_better else change) > threshold
+            rows.append({
+                "db": db,
+                "metric": name,
+                "base": base_value,
+                "head": head_value,
+                "change_pct": round(change, 1) if change is not None else None,
+                "regression": regression,
+            })
+    return rows
+
+
+def _format(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base", help="report of the baseline commit")
+    parser.add_argument("head", help="report of the commit under test")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    rows = compare(base, head, args.threshold)
+
+    if args.json:
+        print(json.dumps({
+            "base": base.get("meta", {}).get("commit"),
+            "head": head.get("meta", {}).get("commit"),
+            "threshold": args.threshold,
+            "rows": rows,
+        }, indent=2))
+    else:
+        print(f"base {base.get('meta', {}).get('commit')}  head {head.get('meta', {}).get('commit')}")
+        for row in rows:
+            change = "-" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            marker = "  REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['db']:7} {row['metric']:34} {_format(row['base']):>12} -> {_format(row['head']):>12}"
+                f"  {change:>8}{marker}"
+            )
+
+    if args.fail_on_regression and any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
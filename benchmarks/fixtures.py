@@ -0,0 +1,197 @@
+"""
+本地媒体 fixture 服务器
+提供合成的渐进式 MP4 和 HLS 播放列表/分片，yt-dlp 的 generic 提取器可以离线下载。
+路径中的名称即视频ID，不同名称在服务端被视为不同视频（避免去重）：
+
+- /mp4/{name}.mp4              渐进式 MP4（支持 Range / HEAD）
+- /hls/{name}.m3u8             HLS 媒体播放列表
+- /hls/{name}/{index}.ts       HLS 分片
+"""
+import argparse
+import re
+import struct
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+_TS_PACKET_SIZE = 188
+
+
+@lru_cache(maxsize=8)
+def synthetic_mp4(size: int) -> bytes:
+    """ftyp + mdat 结构的合成 MP4（内容为确定性的伪随机字节，不可播放，只用于下载）"""
+    ftyp = struct.pack(">I4s4sI", 24, b"ftyp", b"isom", 0x200) + b"isommp41"
+    payload_size = max(size - len(ftyp) - 8, 0)
+    pattern = bytes((i * 131 + 7) % 251 for i in range(4096))
+    payload = (pattern * (payload_size // len(pattern) + 1))[:payload_size]
+    return ftyp + struct.pack(">I4s", payload_size + 8, b"mdat") + payload
+
+
+@lru_cache(maxsize=8)
+def synthetic_ts(size: int) -> bytes:
+    """由 188 字节 TS 包（0x47 同步字节）组成的合成分片"""
+    packets = max(size // _TS_PACKET_SIZE, 1)
+    packet = b"\x47\x1f\xff\x10" + b"\xff" * (_TS_PACKET_SIZE - 4)
+    return packet * packets
+
+
+def hls_playlist(name: str, segments: int, duration: float) -> str:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{int(duration + 0.999)}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for index in range(segments):
+        lines += [f"#EXTINF:{duration:.3f},", f"{name}/{index}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: "FixtureServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head: bool) -> None:
+        path = self.path.split("?", 1)[0]
+        if re.fullmatch(r"/mp4/[\w.-]+\.mp4", path):
+            body, content_type = synthetic_mp4(self.server.mp4_size), "video/mp4"
+        elif re.fullmatch(r"/hls/[\w.-]+\.m3u8", path):
+            name = path[len("/hls/"):-len(".m3u8")]
+            body = hls_playlist(name, self.server.hls_segments, self.server.hls_segment_duration).encode()
+            content_type = "application/vnd.apple.mpegurl"
+        elif re.fullmatch(r"/hls/[\w.-]+/\d+\.ts", path):
+            index = int(path.rsplit("/", 1)[1][:-3])
+            if index >= self.server.hls_segments:
+                return self._send_error(404)
+            body, content_type = synthetic_ts(self.server.hls_segment_size), "video/mp2t"
+        else:
+            return self._send_error(404)
+
+        byte_range = self._parse_range(len(body))
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        status = 200
+        if byte_range:
+            start, end = byte_range
+            status = 206
+        else:
+            start, end = 0, len(body) - 1
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.end_headers()
+        if not head:
+            try:
+                self.wfile.write(body[start:end + 1])
+            except ConnectionError:
+                # generic 提取器探测时只读取开头部分就关闭连接
+                self.close_connection = True
+
+    def _parse_range(self, length: int):
+        """返回 (start, end)；没有 Range 头时为 None，无法满足时为 False"""
+        header = self.headers.get("Range")
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header or "")
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+        if match.group(1) == "":
+            start, end = max(length - int(match.group(2)), 0), length - 1
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), length - 1) if match.group(2) else length - 1
+        if start >= length or start > end:
+            return False
+        return start, end
+
+    def _send_error(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """在后台线程中运行的 fixture 服务器"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        mp4_size: int = 2 * 1024 * 1024,
+        hls_segments: int = 4,
+        hls_segment_size: int = 256 * 1024,
+        hls_segment_duration: float = 4.0
+    ):
+        super().__init__((host, port), FixtureHandler)
+        self.mp4_size = mp4_size
+        self.hls_segments = hls_segments
+        self.hls_segment_size = hls_segment_size
+        self.hls_segment_duration = hls_segment_duration
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server_address[0], self.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def mp4_url(self, name: str) -> str:
+        return f"{self.base_url}/mp4/{name}.mp4"
+
+    def hls_url(self, name: str) -> str:
+        return f"{self.base_url}/hls/{name}.m3u8"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve synthetic MP4 / HLS media for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mp4-size", type=int, default=2 * 1024 * 1024, help="MP4 size in bytes")
+    parser.add_argument("--hls-segments", type=int, default=4)
+    parser.add_argument("--hls-segment-size", type=int, default=256 * 1024, help="segment size in bytes")
+    args = parser.parse_args()
+    server = FixtureServer(args.host, args.port, args.mp4_size, args.hls_segments, args.hls_segment_size)
+    print(f"Serving fixtures on {server.base_url} (e.g. {server.mp4_url('demo')}, {server.hls_url('demo')})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
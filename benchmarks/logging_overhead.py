@@ -0,0 +1,155 @@
+"""
+日志开销基准测试
+对比同步写入 / 后台线程写入、标准库 json / orjson 下每次日志调用在调用方线程上的耗时，
+以及高频 DEBUG 日志采样前后的耗时，输出 JSON 报告
+
+    python -m benchmarks.logging_overhead --calls 20000 --threads 4 --output logging.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.loadgen import environment, percentiles
+
+# 一次下载请求在 API 进程中产生的 INFO 日志条数（接收请求、开始下载、下载完成、状态更新）
+LOGS_PER_REQUEST = 4
+MODES = (
+    # (名称, 后台写入, 使用 orjson)
+    ("sync_json", False, False),
+    ("sync_orjson", False, True),
+    ("background_json", True, False),
+    ("background_orjson", True, True),
+)
+
+
+def _measure(logger_module, threads: int, calls: int, level: str) -> Dict[str, Any]:
+    """threads 个线程各调用 calls 次日志，返回调用方耗时分布和写完全部日志的总耗时"""
+    logger = logger_module.logger
+    log = getattr(logger, level)
+    samples: List[List[float]] = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int) -> None:
+        durations = samples[index]
+        barrier.wait()
+        for i in range(calls):
+            started = time.perf_counter()
+            log("Video download completed", extra={
+                "task_id": "2758f856-c21a-4238-bfb2-b07f43c51b96",
+                "url": "https://example.com/watch?v=benchmark",
+                "title": "示例视频",
+                "filesize": 52428800,
+                "index": i,
+            })
+            durations.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    caller_done = time.perf_counter() - started
+    logger_module.flush_logs()
+    drained = time.perf_counter() - started
+
+    durations = [value for values in samples for value in values]
+    return {
+        "calls": len(durations),
+        "caller_us": percentiles(durations, scale=1e6),
+        "caller_wall_s": round(caller_done, 3),
+        "drain_wall_s": round(drained, 3),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.config import settings
+    from app.utils import logger as logger_module
+
+    orjson = logger_module.orjson
+    original = {key: getattr(settings, key) for key in ("log_file", "log_level", "log_background",
+                                                         "log_debug_sample_interval", "log_format")}
+    original_stderr = sys.stderr
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="ytdlp-log-bench-") as workdir, \
+            open(os.devnull, "w") as devnull:
+        try:
+            # 控制台输出写到 /dev/null，只测量格式化和写文件的开销
+            if not args.stderr:
+                sys.stderr = devnull
+            settings.log_format = "json"
+            for name, background, use_orjson in MODES:
+                if use_orjson and orjson is None:
+                    continue
+                logger_module.orjson = orjson if use_orjson else None
+                settings.log_file = os.path.join(workdir, name, "app.log")
+                settings.log_level = "INFO"
+                settings.log_background = background
+                logger_module.setup_logger()
+                results[name] = _measure(logger_module, args.threads, args.calls, "info")
+
+            # 高频 DEBUG 日志：同一调用位置连续输出，对比采样前后
+            for name, interval in (("debug_unsampled", 0.0), ("debug_sampled", 1.0)):
+                logger_module.orjson = orjson
+                settings.log_file = os.path.join(workdir, name, "app.log")
+                settings.log_level = "DEBUG"
+                settings.log_background = True
+                settings.log_debug_sample_interval = interval
+                logger_module.setup_logger()
+                results[name] = _measure(logger_module, args.threads, args.calls, "debug")
+        finally:
+            logger_module.orjson = orjson
+            for key, value in original.items():
+                setattr(settings, key, value)
+            sys.stderr = original_stderr
+            logger_module.setup_logger()
+
+    baseline = results["sync_json"]["caller_us"]["mean"]
+    modes = [name for name, _, _ in MODES if name in results]
+    best = min(modes, key=lambda name: results[name]["caller_us"]["mean"])
+    saving = baseline - results[best]["caller_us"]["mean"]
+    return {
+        "meta": {**environment(), "config": {"calls": args.calls, "threads": args.threads}},
+        "modes": results,
+        "summary": {
+            "baseline": "sync_json",
+            "best": best,
+            "saving_us_per_call": round(saving, 3),
+            "logs_per_request": LOGS_PER_REQUEST,
+            "saving_us_per_request": round(saving * LOGS_PER_REQUEST, 3),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure per-call logging overhead")
+    parser.add_argument("--calls", type=int, default=20000, help="log calls per thread")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent logging threads")
+    parser.add_argument("--stderr", action="store_true", help="keep console output instead of /dev/null")
+    parser.add_argument("--output", help="write the JSON report to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for name, result in report["modes"].items():
+        caller = result["caller_us"]
+        print(
+            f"{name:18} mean {caller['mean']}us  p50 {caller['p50']}us  p99 {caller['p99']}us  "
+            f"drain {result['drain_wall_s']}s",
+            file=sys.stderr
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+启动耗时基准测试
+测量 import app.main 的耗时（多次取中位数）、python -X importtime 中耗时最多的模块，
+以及 API 服务从启动进程到端口可用、到 /ready 返回 200（yt-dlp 预热完成）的时间和第一个 /api/info 请求的延迟
+
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fixtures import FixtureServer
+from benchmarks.loadgen import REPO_ROOT, ApiServer, environment
+
+_IMPORT_SCRIPT = (
+    "import time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def _python_env(workdir: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+        "SQLITE_DB_FILE": os.path.join(workdir, "startup.db"),
+        "LOG_FILE": os.path.join(workdir, "logs", "app.log"),
+    }
+
+
+def measure_import(workdir: str, repeat: int) -> Dict[str, Any]:
+    """import app.main 的耗时（每次在新进程中，秒）"""
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT],
+            cwd=workdir, env=_python_env(workdir), capture_output=True, text=True, check=True
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return {
+        "median_s": round(statistics.median(samples), 3),
+        "min_s": round(min(samples), 3),
+        "samples_s": [round(sample, 3) for sample in samples],
+    }
+
+
+def import_profile(workdir: str, top: int) -> List[Dict[str, Any]]:
+    """python -X importtime 中累计耗时最多的模块"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=workdir, env=_python_env(workdir), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if not parts[0].strip().isdigit():
+            continue  # 表头
+        modules.append({
+            "module": parts[2].strip(),
+            "self_ms": round(int(parts[0]) / 1000, 1),
+            "cumulative_ms": round(int(parts[1]) / 1000, 1),
+        })
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+def measure_server(workdir: str, timeout: float) -> Dict[str, Any]:
+    """启动 API 服务，测量端口可用、/ready 返回 200 的时间和第一个 /api/info 请求的延迟"""
+    fixtures = FixtureServer().start()
+    server = ApiServer(workdir, {"SQLITE_DB_FILE": os.path.join(workdir, "server.db")}, startup_timeout=timeout)
+    started = time.perf_counter()
+    try:
+        port_open = server.start()
+        ready: Optional[float] = None
+        ready_body = None
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            response = httpx.get(f"{server.base_url}/ready", timeout=5.0)
+            if response.status_code == 404:
+                break  # 没有 /ready 接口的版本
+            if response.status_code == 200:
+                ready = time.perf_counter() - started
+                ready_body = response.json()
+                break
+            time.sleep(0.05)
+        request_started = time.perf_counter()
+        response = httpx.get(
+            f"{server.base_url}/api/info", params={"url": fixtures.mp4_url("startup")}, timeout=timeout
+        )
+        first_info = time.perf_counter() - request_started
+    finally:
+        server.stop()
+        fixtures.stop()
+    return {
+        "port_open_s": round(port_open, 3),
+        "ready_s": round(ready, 3) if ready is not None else None,
+        "ready": ready_body,
+        "first_info_ms": round(first_info * 1000, 1),
+        "first_info_status": response.status_code,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and server startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh-process imports to time")
+    parser.add_argument("--top", type=int, default=15, help="modules to list from -X importtime")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write the JSON report to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="ytdlp-startup-") as workdir:
+        report = {
+            "meta": {**environment(), "config": {"repeat": args.repeat}},
+            "import": measure_import(workdir, args.repeat),
+            "import_profile": import_profile(workdir, args.top),
+            "server": measure_server(workdir, args.timeout),
+        }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    server = report["server"]
+    print(
+        f"import app.main {report['import']['median_s']}s (median of {args.repeat})  "
+        f"port open {server['port_open_s']}s  ready {server['ready_s'] or '-'}s  "
+        f"first /api/info {server['first_info_ms']}ms",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
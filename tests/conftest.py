@@ -0,0 +1,56 @@
+"""
+测试环境
+settings 和数据库引擎在导入 app 时创建，因此在导入之前通过环境变量指定临时目录中的 SQLite 数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+TMP_DIR = tempfile.mkdtemp(prefix="yt-dlp-api-tests-")
+os.environ.update({
+    "DATABASE_TYPE": "sqlite",
+    "SQLITE_DB_FILE": os.path.join(TMP_DIR, "tasks.db"),
+    "LOG_FILE": os.path.join(TMP_DIR, "app.log"),
+    "LOG_LEVEL": "WARNING",
+    "EXECUTION_MODE": "local",
+    "DISK_ADMISSION": "false",
+    "RESUME_ON_STARTUP": "false",
+    "YTDLP_WARMUP": "false",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app.db.database import async_engine, engine, init_database  # noqa: E402
+from app.core.task_cache import task_cache  # noqa: E402
+from app.core.task_manager import AsyncState  # noqa: E402
+
+
+@pytest.fixture
+def run_state():
+    """
+    在新的事件循环中以全新的 AsyncState 执行协程函数（清空任务表和缓存）
+
+    用法：run_state(lambda state: ...)，每个测试只调用一次；结束时写完合并写入并关闭连接池
+    （连接池中的 aiosqlite 连接属于创建它的事件循环）
+    """
+    init_database()
+    with engine.begin() as conn:
+        for table in ("tasks", "task_info", "media_files"):
+            conn.execute(text(f"DELETE FROM {table}"))
+    task_cache.clear()
+
+    def run(fn):
+        async def main():
+            state = AsyncState()
+            await state.initialize()
+            try:
+                return await fn(state)
+            finally:
+                await state.shutdown()
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
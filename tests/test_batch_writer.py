@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.db.batch_writer import BatchWriter
+from app.db.database import SessionLocal, TaskModel
+
+
+# shutdown 时写入协程尚未启动 / 正在收集批次 / 正在提交批次
+@pytest.mark.parametrize("delay", [0, 0.005, 0.03])
+def test_shutdown_writes_every_submitted_update(delay):
+    async def main():
+        written = []
+
+        async def flush(items):
+            await asyncio.sleep(0.02)
+            written.extend(items)
+
+        writer = BatchWriter(flush, interval=0.01, max_batch_size=2)
+        submits = [asyncio.create_task(writer.submit(i)) for i in range(5)]
+        await asyncio.sleep(delay)
+        await writer.shutdown()
+        await asyncio.wait_for(asyncio.gather(*submits), timeout=1)
+        return written
+
+    assert sorted(asyncio.run(main())) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("delay", [0, 0.002])
+def test_state_shutdown_persists_queued_updates(run_state, delay):
+    async def main(state):
+        task_ids = [
+            (await state.create_or_get(f"https://example.com/video/shutdown-{i}", "/downloads", "best"))[0]
+            for i in range(3)
+        ]
+        updates = [
+            asyncio.create_task(state.update_task(task_id, "failed", error="boom"))
+            for task_id in task_ids
+        ]
+        await asyncio.sleep(delay)
+        # run_state 结束时立即 shutdown
+        return task_ids, updates
+
+    task_ids, updates = run_state(main)
+    assert all(update.done() for update in updates)
+    with SessionLocal() as db:
+        statuses = db.execute(select(TaskModel.status).where(TaskModel.id.in_(task_ids))).scalars().all()
+    assert statuses == ["failed"] * 3
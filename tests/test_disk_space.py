@@ -0,0 +1,21 @@
+from app.core.disk_space import DiskSpaceGuard, estimate_size
+
+
+def test_estimate_size_doubles_merged_formats():
+    assert estimate_size({"requested_formats": [{"filesize": 300}, {"filesize_approx": 100}]}) == 800
+    assert estimate_size({"filesize": 500}) == 500
+    assert estimate_size({"requested_formats": [{"filesize": 300}, {}]}) is None
+
+
+def test_reservation_shrinks_with_downloaded_bytes(tmp_path):
+    guard = DiskSpaceGuard(headroom=0)
+    assert guard.try_reserve("t1", str(tmp_path), 1000)
+    assert guard.stats()["reserved"] == 1000
+
+    guard.progress("t1", {"phase": "downloading", "filename": "video.f137.mp4", "downloaded_bytes": 300})
+    guard.progress("t1", {"phase": "downloading", "filename": "video.f140.m4a", "downloaded_bytes": 200})
+    guard.progress("t1", {"phase": "downloading", "filename": "video.f137.mp4", "downloaded_bytes": 400})
+    assert guard.stats()["reserved"] == 400
+
+    guard.release("t1")
+    assert guard.stats() == {"headroom": 0, "reserved": 0, "reservations": 0, "deferred": 0}
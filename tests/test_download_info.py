@@ -0,0 +1,50 @@
+from app.api import router as api
+from app.core.disk_space import DiskSpaceGuard
+
+URL = "https://example.com/media/clip.mp4"
+
+
+def extracted_info():
+    """get_video_info 的结果（只有一个可下载格式的直链视频）"""
+    return {
+        "id": "clip", "title": "Clip", "extractor": "generic", "extractor_key": "Generic",
+        "webpage_url": URL, "original_url": URL,
+        "formats": [{
+            "format_id": "mp4", "url": URL, "ext": "mp4", "filesize": 4096,
+            "vcodec": "h264", "acodec": "aac", "protocol": "https",
+        }],
+    }
+
+
+def test_download_after_info_reuses_extracted_info(monkeypatch, tmp_path, run_state):
+    calls = {"extract": 0}
+    downloads = []
+
+    def get_video_info(url, quiet=False, format=None):
+        calls["extract"] += 1
+        return extracted_info()
+
+    def download_video(**kwargs):
+        downloads.append(kwargs)
+        return {**kwargs["info"], "filepath": None}
+
+    monkeypatch.setattr(api, "get_video_info", get_video_info)
+    monkeypatch.setattr(api, "download_video", download_video)
+    # 默认配置 DISK_ADMISSION=true：下载前按下载格式估算大小
+    monkeypatch.setattr(api, "disk_space", DiskSpaceGuard(headroom=0))
+
+    async def main(state):
+        await api.state.initialize()
+        try:
+            await api.api_video_info(URL)
+            task_id, _ = await api.state.create_or_get(URL, str(tmp_path), "best")
+            await api.process_download_task(task_id, URL, str(tmp_path), "best", quiet=True)
+            return await api.state.get_task(task_id)
+        finally:
+            await api.state.shutdown()
+
+    task = run_state(main)
+    assert task.status == "completed", task.error
+    # /info 之后的下载只在本地重新选择格式，不再调用 get_video_info
+    assert calls["extract"] == 1
+    assert downloads[0]["info"]["format_id"] == "mp4"
@@ -0,0 +1,46 @@
+import asyncio
+import os
+
+from app.core.file_reuse import describe_files, materialize, needs_reuse
+
+
+def downloaded(tmp_path, content: bytes = b"video" * 1000):
+    source_dir = tmp_path / "downloads"
+    source_dir.mkdir()
+    path = source_dir / "video.mp4"
+    path.write_bytes(content)
+    return describe_files({"filepath": str(path)})
+
+
+def test_materialize_links_verified_files(tmp_path):
+    files = downloaded(tmp_path)
+    target_dir = tmp_path / "other"
+    assert needs_reuse(files, str(target_dir))
+
+    placed = materialize(files, str(target_dir))
+    assert [file["method"] for file in placed] == ["hardlink"]
+    assert (target_dir / "video.mp4").read_bytes() == open(files[0]["path"], "rb").read()
+    # 目标已有内容一致的文件时不再生成
+    assert materialize(files, str(target_dir)) == []
+    assert not needs_reuse(files + placed, str(target_dir))
+
+
+def test_materialize_rejects_checksum_mismatch(tmp_path):
+    files = downloaded(tmp_path)
+    # 源文件被替换为同样大小的其他内容
+    with open(files[0]["path"], "r+b") as f:
+        f.write(b"XXXXX")
+    assert materialize(files, str(tmp_path / "other")) is None
+    assert not os.path.exists(tmp_path / "other" / "video.mp4")
+
+
+def test_completed_task_is_reopened_once(run_state):
+    async def main(state):
+        task_id, _ = await state.create_or_get("https://example.com/video/reuse", "/downloads", "best")
+        await state.update_task(task_id, "completed", result={"title": "done"})
+        reopened = await asyncio.gather(*(state.reopen_task(task_id, "/other") for _ in range(5)))
+        return reopened, await state.get_task(task_id)
+
+    reopened, task = run_state(main)
+    assert sorted(reopened) == [False] * 4 + [True]
+    assert task.status == "pending" and task.output_path == "/other"
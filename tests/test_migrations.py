@@ -0,0 +1,107 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.database import Base
+from app.db.migrations import MIGRATIONS, run_migrations
+
+# 加入 url_hash 等列之前的 tasks 表
+LEGACY_TASKS = """
+CREATE TABLE tasks (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    url TEXT NOT NULL,
+    video_title VARCHAR(500),
+    output_path VARCHAR(500) NOT NULL,
+    format VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    result TEXT,
+    error TEXT,
+    create_time DATETIME NOT NULL,
+    update_time DATETIME NOT NULL
+)
+"""
+
+LEGACY_ROWS = [
+    ("t1", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "completed"),
+    # 历史上的并发重复提交：同一 URL、同一视频的另一个 URL 变体
+    ("t2", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "completed"),
+    ("t3", "https://youtu.be/dQw4w9WgXcQ", "failed"),
+    ("t4", "https://example.com/video.mp4", "pending"),
+]
+
+
+def legacy_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    base = datetime(2025, 1, 1)
+    full_result = json.dumps({"id": "dQw4w9WgXcQ", "title": "Video", "formats": [{"format_id": "18"}]})
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_TASKS))
+        for i, (task_id, url, status) in enumerate(LEGACY_ROWS):
+            conn.execute(text(
+                "INSERT INTO tasks (id, url, output_path, format, status, result, create_time, update_time) "
+                "VALUES (:id, :url, '/downloads', 'best', :status, :result, :t, :t)"
+            ), {
+                "id": task_id, "url": url, "status": status,
+                "result": full_result if status == "completed" else None,
+                "t": base + timedelta(seconds=i),
+            })
+    return engine
+
+
+def snapshot(engine):
+    """表结构和全部数据（task_info 只比较行数，create_time 每次迁移都不同）"""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        return {
+            "columns": sorted(column["name"] for column in inspector.get_columns("tasks")),
+            "indexes": sorted(index["name"] for index in inspector.get_indexes("tasks")),
+            "tasks": conn.execute(text("SELECT * FROM tasks ORDER BY id")).all(),
+            "task_info": conn.execute(text("SELECT COUNT(*) FROM task_info")).scalar_one(),
+        }
+
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    engine = legacy_engine(tmp_path / "legacy.db")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    state = snapshot(engine)
+    for column in ("url_hash", "extractor", "video_id", "priority", "lease_owner", "attempts", "options", "timings"):
+        assert column in state["columns"]
+    for index in ("ux_tasks_url_hash", "ux_tasks_video_key", "ix_tasks_update_time_id",
+                  "ix_tasks_status_lease_expires"):
+        assert index in state["indexes"]
+
+    with engine.connect() as conn:
+        rows = {row.id: row for row in conn.execute(text(
+            "SELECT id, url_hash, extractor, video_id, result FROM tasks"
+        ))}
+    # 重复记录中只有最早的一条获得去重键
+    assert rows["t1"].url_hash and rows["t1"].video_id == "dQw4w9WgXcQ"
+    assert rows["t2"].url_hash is None and rows["t2"].video_id is None
+    assert rows["t3"].url_hash and rows["t3"].video_id is None
+    assert rows["t4"].url_hash and rows["t4"].extractor is None
+    # 完整结果被移入 task_info，任务记录只保留摘要
+    assert "formats" not in json.loads(rows["t1"].result)
+    assert state["task_info"] == 2
+
+
+def test_migrations_are_idempotent(tmp_path):
+    engine = legacy_engine(tmp_path / "idempotent.db")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    migrated = snapshot(engine)
+
+    # 再次启动：已记录的迁移被跳过
+    run_migrations(engine)
+    assert snapshot(engine) == migrated
+
+    # 迁移记录丢失（例如中途失败）时，每一步重新执行也不会改变结果
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migrations"))
+    run_migrations(engine)
+    assert snapshot(engine) == migrated
+    for migration in MIGRATIONS:
+        migration(engine)
+    assert snapshot(engine) == migrated
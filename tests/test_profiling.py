@@ -0,0 +1,44 @@
+import threading
+
+from app.core.profiling import NEXT_TASK, ProfileRequests, run_profiled
+
+
+def test_one_profile_at_a_time():
+    requests = ProfileRequests()
+    assert requests.request()
+    # 请求等待执行时拒绝新的请求
+    assert not requests.request("t2")
+
+    path = requests.take("t1")
+    assert path and path.endswith("t1.prof")
+    assert requests.running == "t1" and requests.pending() == []
+    # 正在分析时同样拒绝
+    assert not requests.request(NEXT_TASK)
+    assert requests.take("t2") is None
+
+    requests.finish("t1")
+    assert requests.running is None
+    assert requests.request("t2")
+
+
+def test_concurrent_run_profiled_does_not_fail(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+    results = {}
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "first"
+
+    thread = threading.Thread(target=lambda: results.update(first=run_profiled(str(tmp_path / "a.prof"), slow)))
+    thread.start()
+    started.wait(5)
+    # 第一个分析仍在运行：第二个不做分析直接执行，而不是抛出 ValueError
+    results["second"] = run_profiled(str(tmp_path / "b.prof"), lambda: "second")
+    release.set()
+    thread.join(5)
+
+    assert results == {"first": "first", "second": "second"}
+    assert (tmp_path / "a.prof").is_file()
+    assert not (tmp_path / "b.prof").exists()
@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from app.core.scheduler import DownloadJob, DownloadScheduler, JobDeferred, QueueFullError
+
+
+def job(task_id: str, priority: int = 0, key: str = "") -> DownloadJob:
+    return DownloadJob(task_id=task_id, url=f"https://example.com/{task_id}", output_path="/tmp",
+                       format="best", priority=priority, key=key)
+
+
+class Recorder:
+    """runner：记录开始顺序和并发峰值，在 release 之前一直阻塞"""
+
+    def __init__(self):
+        self.started = []
+        self.running = 0
+        self.peak = 0
+        self.gate = asyncio.Event()
+
+    async def __call__(self, job: DownloadJob) -> None:
+        self.started.append(job.task_id)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await self.gate.wait()
+        finally:
+            self.running -= 1
+
+
+async def settle() -> None:
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_concurrency_limit_and_priority_order():
+    async def main():
+        recorder = Recorder()
+        scheduler = DownloadScheduler(recorder, concurrency=2)
+        for task_id in ("a", "b"):
+            assert await scheduler.submit(job(task_id))
+        await settle()
+        # worker 都在执行时提交的任务按优先级排队
+        for task_id, priority in (("low", 0), ("high", 10), ("mid", 5)):
+            assert await scheduler.submit(job(task_id, priority))
+        await settle()
+        assert recorder.started == ["a", "b"]
+        assert scheduler.active == 2 and scheduler.queued == 3
+
+        recorder.gate.set()
+        while scheduler.stats()["completed"] < 5:
+            await asyncio.sleep(0.01)
+        await scheduler.shutdown()
+        return recorder
+
+    recorder = asyncio.run(main())
+    assert recorder.started[2:] == ["high", "mid", "low"]
+    assert recorder.peak == 2
+
+
+def test_duplicate_submit_is_ignored():
+    async def main():
+        recorder = Recorder()
+        scheduler = DownloadScheduler(recorder, concurrency=1)
+        assert await scheduler.submit(job("a"))
+        assert await scheduler.submit(job("b"))
+        await settle()
+        # 执行中和排队中的任务都不会被重复提交
+        assert not await scheduler.submit(job("a"))
+        assert not await scheduler.submit(job("b"))
+        assert scheduler.queued == 1
+        await scheduler.shutdown()
+
+    asyncio.run(main())
+
+
+def test_queue_full_error():
+    async def main():
+        scheduler = DownloadScheduler(Recorder(), concurrency=1, max_queue_size=2)
+        await scheduler.submit(job("running"))
+        await settle()
+        await scheduler.submit(job("q1"))
+        await scheduler.submit(job("q2"))
+        assert scheduler.is_full()
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(job("q3"))
+        assert scheduler.queued == 2
+        await scheduler.shutdown()
+
+    asyncio.run(main())
+
+
+def test_reserved_slots_are_admitted_and_count_towards_capacity():
+    async def main():
+        scheduler = DownloadScheduler(Recorder(), concurrency=1, max_queue_size=3)
+        scheduler.reserve(2)
+        assert scheduler.reserved == 2
+        # 预留的名额对其他提交者不可用
+        with pytest.raises(QueueFullError):
+            scheduler.reserve(2)
+        await scheduler.submit(job("other"))
+        assert scheduler.is_full()
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(job("rejected"))
+
+        # 持有预留的提交者在队列已满时仍能入队，每次入队消耗一个名额
+        assert await scheduler.submit(job("r1"), reserved=True)
+        assert scheduler.reserved == 1
+        # 没有入队（重复提交）时不消耗名额，由调用方归还
+        assert not await scheduler.submit(job("r1"), reserved=True)
+        assert scheduler.reserved == 1
+        scheduler.unreserve(1)
+        assert scheduler.reserved == 0
+        assert scheduler.queued + scheduler.active == 2
+        assert not scheduler.is_full()
+        await scheduler.shutdown()
+
+    asyncio.run(main())
+
+
+def test_concurrent_reservations_never_exceed_capacity():
+    async def main():
+        scheduler = DownloadScheduler(Recorder(), concurrency=1, max_queue_size=5)
+        accepted = []
+
+        async def submit_batch(name: str, size: int):
+            try:
+                scheduler.reserve(size)
+            except QueueFullError:
+                return
+            # 模拟入库期间让出事件循环
+            await asyncio.sleep(0.01)
+            for i in range(size):
+                await scheduler.submit(job(f"{name}-{i}"), reserved=True)
+                accepted.append(f"{name}-{i}")
+
+        await asyncio.gather(*(submit_batch(f"batch{n}", 2) for n in range(5)))
+        # 5 个名额只够两批，第三批起在入库之前就被拒绝
+        assert len(accepted) == 4
+        assert scheduler.queued + scheduler.active == 4
+        assert scheduler.reserved == 0
+        await scheduler.shutdown()
+
+    asyncio.run(main())
+
+
+def test_deferred_job_waits_for_admission():
+    async def main():
+        attempts = []
+        space = {"free": False}
+
+        async def runner(job: DownloadJob) -> None:
+            attempts.append(job.task_id)
+            if not space["free"]:
+                raise JobDeferred("Not enough disk space", size=100)
+
+        scheduler = DownloadScheduler(
+            runner, concurrency=1,
+            admission=lambda job: space["free"], recheck_interval=0.05
+        )
+        await scheduler.submit(job("big"))
+        await asyncio.sleep(0.2)
+        # 退回队列后带有大小，admission 为 False 期间不会再次执行
+        assert attempts == ["big"]
+        assert scheduler.queued == 1 and scheduler.stats()["deferred"] == 1
+
+        space["free"] = True
+        await asyncio.sleep(0.2)
+        assert attempts == ["big", "big"]
+        assert scheduler.queued == 0 and scheduler.stats()["completed"] == 1
+        await scheduler.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+from app.api import router as api
+from app.core import warmup as warmup_module
+
+
+def test_recovery_waits_for_warmup(monkeypatch, run_state):
+    release = threading.Event()
+    scheduled = []
+
+    async def schedule_task(task_id, request, reserved=False):
+        scheduled.append(task_id)
+        return True
+
+    monkeypatch.setattr(api.settings, "resume_on_startup", True)
+    monkeypatch.setattr(api.settings, "ytdlp_warmup", True)
+    monkeypatch.setattr(warmup_module, "warm_up", lambda: release.wait(5))
+    monkeypatch.setattr(api, "warmup", warmup_module.WarmUp())
+    monkeypatch.setattr(api, "schedule_task", schedule_task)
+
+    async def main(state):
+        task_id, _ = await state.create_or_get("https://example.com/video/recover", "/downloads", "best")
+        await api.startup()
+        try:
+            # startup 不等待预热和恢复
+            await asyncio.sleep(0.05)
+            assert api.warmup.status == "running" and scheduled == []
+
+            release.set()
+            await asyncio.wait_for(api.recovery_task, timeout=5)
+            assert api.warmup.status == "done"
+            return task_id
+        finally:
+            release.set()
+            api.recovery_task.cancel()
+            await api.state.shutdown()
+
+    task_id = run_state(main)
+    assert scheduled == [task_id]
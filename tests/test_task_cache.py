@@ -0,0 +1,50 @@
+import time
+from types import SimpleNamespace
+
+from app.core.task_cache import TaskCache
+
+
+def task(status: str = "pending"):
+    return SimpleNamespace(status=status)
+
+
+def test_progress_keeps_in_flight_entry_alive():
+    cache = TaskCache(max_entries=10, ttl=0.1)
+    cache.put("t1", task())
+    for _ in range(4):
+        time.sleep(0.05)
+        cache.touch("t1")
+    assert cache.get("t1") is not None
+
+    time.sleep(0.15)
+    # 过期的条目不会被进度刷新重新启用
+    cache.touch("t1")
+    assert cache.get("t1") is None
+
+
+def test_fill_on_read_miss():
+    cache = TaskCache(max_entries=10, ttl=30)
+    local = {"t1", "t2"}
+    # 未注册 owner check 时不回填
+    cache.fill("t1", task(), cache.version)
+    assert cache.get("t1") is None
+
+    cache.set_owner_check(lambda task_id: task_id in local)
+    cache.fill("t1", task(), cache.version)
+    assert cache.get("t1") is not None
+    # 终止状态不回填
+    cache.fill("t2", task("completed"), cache.version)
+    assert cache.get("t2") is None
+    # 其他进程执行的任务不回填，轮询总是读到数据库中的最新状态
+    cache.fill("t3", task(), cache.version)
+    assert cache.get("t3") is None
+
+
+def test_fill_does_not_overwrite_concurrent_write():
+    cache = TaskCache(max_entries=10, ttl=30)
+    cache.set_owner_check(lambda task_id: True)
+    version = cache.version
+    # 读取数据库期间任务完成（终止状态移除条目）
+    cache.put("t1", task("completed"))
+    cache.fill("t1", task("pending"), version)
+    assert cache.get("t1") is None
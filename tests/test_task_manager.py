@@ -0,0 +1,156 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.database import SessionLocal, TaskModel, hash_url
+
+
+def entry(url: str, output_path: str = "/downloads"):
+    return (url, output_path, "best", 0, None)
+
+
+def count_tasks() -> int:
+    with SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(TaskModel)).scalar_one()
+
+
+def test_concurrent_create_or_get_creates_one_task(run_state):
+    async def main(state):
+        return await asyncio.gather(*(
+            state.create_or_get("https://example.com/video/1", "/downloads", "best")
+            for _ in range(20)
+        ))
+
+    results = run_state(main)
+    assert len({task_id for task_id, _ in results}) == 1
+    assert sorted(action for _, action in results) == ["created"] + ["pending"] * 19
+    assert count_tasks() == 1
+
+
+def test_url_variants_of_one_video_share_a_task(run_state):
+    async def main(state):
+        return await asyncio.gather(
+            state.create_or_get("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "/downloads", "best"),
+            state.create_or_get("https://youtu.be/dQw4w9WgXcQ", "/downloads", "best"),
+            state.create_or_get("https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=30", "/downloads", "best"),
+        )
+
+    results = run_state(main)
+    assert len({task_id for task_id, _ in results}) == 1
+    assert count_tasks() == 1
+
+
+def test_failed_task_is_claimed_for_retry_once(run_state):
+    async def main(state):
+        task_id, _ = await state.create_or_get("https://example.com/video/2", "/downloads", "best")
+        await state.update_task(task_id, "failed", error="boom")
+        results = await asyncio.gather(*(
+            state.create_or_get("https://example.com/video/2", "/downloads", "best")
+            for _ in range(10)
+        ))
+        return task_id, results, await state.get_task(task_id)
+
+    task_id, results, task = run_state(main)
+    assert {result_id for result_id, _ in results} == {task_id}
+    assert sorted(action for _, action in results) == ["pending"] * 9 + ["retried"]
+    assert task.status == "pending" and not task.error
+
+
+def test_bulk_create_or_get(run_state):
+    async def main(state):
+        first = await state.bulk_create_or_get([
+            entry("https://example.com/video/a"),
+            entry("https://example.com/video/b"),
+            # 同一视频在批内以另一个 output_path 再次出现
+            entry("https://example.com/video/a", "/other"),
+        ])
+        for task_id, _ in first[:2]:
+            await state.update_task(task_id, "failed", error="boom")
+        # 两批并发重试同一个失败任务，只有一批负责重新调度
+        second = await asyncio.gather(
+            state.bulk_create_or_get([entry("https://example.com/video/a"), entry("https://example.com/video/b")]),
+            state.bulk_create_or_get([entry("https://example.com/video/b"), entry("https://example.com/video/c")]),
+        )
+        return first, second
+
+    first, (left, right) = run_state(main)
+    (a_id, a_action), (b_id, b_action), (dup_id, dup_action) = first
+    assert (a_action, b_action) == ("created", "created")
+    assert dup_id == a_id and dup_action == "pending"
+
+    assert left[0] == (a_id, "retried")
+    b_results = [left[1], right[0]]
+    assert {task_id for task_id, _ in b_results} == {b_id}
+    assert sorted(action for _, action in b_results) == ["pending", "retried"]
+    assert right[1][1] == "created"
+    assert count_tasks() == 3
+
+
+def insert_tasks(count: int, base: datetime) -> list:
+    """插入任务，每三条共用一个 update_time（检验 id 作为第二排序键）"""
+    rows = [
+        TaskModel(
+            id=f"task-{i:03d}", url=f"https://example.com/list/{i}",
+            url_hash=hash_url(f"https://example.com/list/{i}"),
+            output_path="/downloads", format="best", status="completed" if i % 2 else "pending",
+            create_time=base, update_time=base + timedelta(seconds=i // 3)
+        )
+        for i in range(count)
+    ]
+    expected = sorted((row.update_time, row.id, row.status) for row in rows)
+    with SessionLocal() as db:
+        db.add_all(rows)
+        db.commit()
+    return expected
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("status", [None, "completed"])
+def test_cursor_pagination_visits_every_task_once(run_state, order, status):
+    expected = insert_tasks(25, datetime(2026, 1, 1))
+    expected_ids = [task_id for _, task_id, task_status in expected if status in (None, task_status)]
+    if order == "desc":
+        expected_ids.reverse()
+
+    async def main(state):
+        seen, cursor = [], None
+        while True:
+            tasks, _, cursor = await state.list_tasks(
+                status=status, page_size=4, order=order, cursor=cursor, fields=["id", "status"]
+            )
+            seen.extend(task["id"] for task in tasks)
+            assert all(set(task) == {"id", "status"} for task in tasks)
+            if cursor is None:
+                return seen
+
+    assert run_state(main) == expected_ids
+
+
+def test_invalid_cursor_is_rejected(run_state):
+    async def main(state):
+        with pytest.raises(ValueError):
+            await state.list_tasks(cursor="not-a-cursor")
+
+    run_state(main)
+
+
+def test_lost_lease_fences_terminal_update(run_state):
+    async def main(state):
+        task_id, _ = await state.create_or_get("https://example.com/video/lease", "/downloads", "best")
+        assert [task.id for task in await state.claim_tasks("w1", 5, lease_ttl=0.01)] == [task_id]
+        await asyncio.sleep(0.05)
+        # w1 的租约过期后被 w2 领取，w1 续约失败
+        assert [task.id for task in await state.claim_tasks("w2", 5, lease_ttl=60)] == [task_id]
+        assert await state.renew_leases("w1", [task_id], 60) == []
+        assert await state.renew_leases("w2", [task_id], 60) == [task_id]
+
+        await state.update_task(task_id, "failed", error="stale worker", lease_owner="w1")
+        after_stale = await state.get_task(task_id)
+        await state.update_task(task_id, "completed", result={"title": "done"}, lease_owner="w2")
+        return after_stale, await state.get_task(task_id)
+
+    after_stale, final = run_state(main)
+    assert after_stale.status == "pending" and not after_stale.error
+    assert final.status == "completed" and final.video_title == "done"